@@ -0,0 +1,624 @@
+"""
+Benchmarks for the Critter simulation engine.
+
+The synthetic critters live here rather than next to the real ones so that critter_run.import_critters never picks them up. Run from anywhere:
+
+  python benchmarks/critter_bench.py update --width 500 --height 500 --counts 1000 10000 40000
+"""
+import argparse
+import asyncio
+import glob
+import multiprocessing
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import constants
+import critter
+import critter_metrics
+import critter_remote
+import critter_shard
+import critter_sim
+import critter_table
+import critter_vector
+
+
+class Walker(critter.Critter):
+  """Wanders randomly and attacks randomly."""
+
+  def get_char(self):
+    return 'W'
+
+  def get_color(self):
+    return constants.BLACK
+
+  def get_move(self, self_info):
+    return random.choice(constants.VALID_MOVES)
+
+  def fight(self, opp_info):
+    return random.choice(constants.VALID_ATTACKS)
+
+
+class Walker2(Walker):
+  """A second walker class, so that there is someone to fight."""
+
+  def get_char(self):
+    return 'V'
+
+
+class Statue(critter.Critter):
+  """Never moves, always scratches."""
+  pure = True
+
+  def get_char(self):
+    return 'S'
+
+  def get_color(self):
+    return constants.GRAY
+
+  def get_move(self, self_info):
+    return constants.CENTER
+
+  def fight(self, opp_info):
+    return constants.SCRATCH
+
+
+class Lookout(critter.Critter):
+  """Stays put unless a neighborhood looks crowded, in which case it moves away from it. Exercises CritterInfo.get_neighbor."""
+  pure = True
+
+  def get_char(self):
+    return 'L'
+
+  def get_color(self):
+    return constants.BLUE
+
+  def get_move(self, self_info):
+    for direction, away in ((constants.NORTH, constants.SOUTH), (constants.EAST, constants.WEST), (constants.SOUTH, constants.NORTH), (constants.WEST, constants.EAST)):
+      if self.neighbor_threat(self_info, direction) > 1:
+        return away
+    return constants.CENTER
+
+  def fight(self, opp_info):
+    return constants.POUNCE
+
+
+class TableWalker(critter_table.TableCritter):
+  """Walker as a table critter: random moves, attacks from a skewed distribution."""
+  char = 'w'
+  move_policy = critter_table.RandomMove()
+  attack_policy = critter_table.RandomAttack({constants.ROAR: 2, constants.POUNCE: 1, constants.SCRATCH: 1})
+
+
+class TablePatrol(critter_table.TableCritter):
+  """Walks a square, always pouncing."""
+  char = 'p'
+  color = constants.RED
+  move_policy = critter_table.CycleMove(constants.NORTH, constants.NORTH, constants.EAST, constants.EAST, constants.SOUTH, constants.SOUTH, constants.WEST, constants.WEST)
+  attack_policy = critter_table.FixedAttack(constants.POUNCE)
+
+
+class TableRock(critter_table.TableCritter):
+  """Never moves, always roars."""
+  char = 'r'
+  color = constants.BLUE
+  move_policy = critter_table.FixedMove(constants.CENTER)
+  attack_policy = critter_table.FixedAttack(constants.ROAR)
+
+
+TABLE_CRITTERS = (TableWalker, TablePatrol, TableRock)
+
+
+def build_sim(width, height, classes, num, seed=None):
+  """Returns a CritterSim of the given size with num critters of each class."""
+  sim = critter_sim.CritterSim(width, height, threading.Lock(), seed)
+  for critter_class in classes:
+    sim.add(critter_class, num)
+  return sim
+
+
+def time_ticks(sim, ticks):
+  """Runs ticks updates on sim and returns the elapsed wall-clock time in seconds."""
+  start = time.perf_counter()
+  for i in range(ticks):
+    sim.update()
+  return time.perf_counter() - start
+
+
+def bench_update(args):
+  """Ticks/sec of CritterSim.update versus the number of critters on the board."""
+  print('%-10s %10s %12s' % ('Critters', 'Ticks/sec', 'ms/tick'))
+  for count in args.counts:
+    random.seed(args.seed)
+    sim = build_sim(args.width, args.height, (Walker, Walker2), count // 2)
+    elapsed = time_ticks(sim, args.ticks)
+    print('%-10d %10.2f %12.3f' % (count, args.ticks / elapsed, 1000 * elapsed / args.ticks))
+
+
+def bench_info(args):
+  """Time and allocated memory blocks per get_move call, including getting hold of the CritterInfo."""
+  random.seed(args.seed)
+  sim = build_sim(args.width, args.height, (Lookout,), args.counts[-1])
+  critters = list(sim.critters)
+
+  start = time.perf_counter()
+  for i in range(args.ticks):
+    for c in critters:
+      c.get_move(sim.critter_infos[c])
+  elapsed = time.perf_counter() - start
+  calls = args.ticks * len(critters)
+
+  # keep every info alive so that the blocks allocated to build them show up in the snapshot diff
+  infos = [None] * len(critters)
+  tracemalloc.start()
+  before = tracemalloc.take_snapshot()
+  for i, c in enumerate(critters):
+    infos[i] = sim.critter_infos[c]
+  after = tracemalloc.take_snapshot()
+  tracemalloc.stop()
+  blocks = sum(stat.count_diff for stat in after.compare_to(before, 'filename') if stat.count_diff > 0)
+
+  print('%-10s %14s %16s' % ('Calls', 'us/get_move', 'blocks/get_move'))
+  print('%-10d %14.3f %16.2f' % (calls, 1e6 * elapsed / calls, blocks / len(infos)))
+
+
+def bench_grid(args):
+  """Memory per cell and full-board scan time of the flat Grid, against the list of lists it replaced."""
+  random.seed(args.seed)
+  width, height = args.width, args.height
+  cells = width * height
+  sim = build_sim(width, height, (Walker, Walker2), args.counts[-1] // 2)
+
+  tracemalloc.start()
+  start = tracemalloc.get_traced_memory()[0]
+  lists = [[None for y in range(height)] for x in range(width)]
+  list_bytes = tracemalloc.get_traced_memory()[0] - start
+  start = tracemalloc.get_traced_memory()[0]
+  grid = critter_sim.Grid(width, height)
+  grid_bytes = tracemalloc.get_traced_memory()[0] - start
+  tracemalloc.stop()
+  for c, pos in sim.critter_positions.items():
+    lists[pos.x][pos.y] = c
+  del grid
+
+  # count the occupied cells
+  start = time.perf_counter()
+  occupied = 0
+  for column in lists:
+    for c in column:
+      if c is not None:
+        occupied += 1
+  list_count = time.perf_counter() - start
+
+  start = time.perf_counter()
+  occupied = sim.grid.occupancy.count(1)
+  grid_count = time.perf_counter() - start
+
+  # a stats-style scan: count the critters of each class on the board
+  start = time.perf_counter()
+  counts = {}
+  for column in lists:
+    for c in column:
+      if c is not None:
+        counts[c.__class__] = counts.get(c.__class__, 0) + 1
+  list_census = time.perf_counter() - start
+
+  start = time.perf_counter()
+  counts = {}
+  critters = sim.grid.critters
+  for critter_id in filter(None, sim.grid.ids):
+    c = critters[critter_id]
+    counts[c.__class__] = counts.get(c.__class__, 0) + 1
+  grid_census = time.perf_counter() - start
+
+  print('%-14s %12s %12s %12s' % ('', 'bytes/cell', 'count (ms)', 'census (ms)'))
+  print('%-14s %12.2f %12.3f %12.3f' % ('list of lists', list_bytes / cells, 1000 * list_count, 1000 * list_census))
+  print('%-14s %12.2f %12.3f %12.3f' % ('Grid', grid_bytes / cells, 1000 * grid_count, 1000 * grid_census))
+
+
+def chain_move(sim, direction, pos):
+  """The if/elif chain CritterSim.move used before the neighbor table, as a baseline."""
+  if direction == constants.NORTH:
+    return critter_sim.Point(pos.x, (pos.y - 1) % sim.height)
+  elif direction == constants.SOUTH:
+    return critter_sim.Point(pos.x, (pos.y + 1) % sim.height)
+  elif direction == constants.EAST:
+    return critter_sim.Point((pos.x + 1) % sim.width, pos.y)
+  elif direction == constants.WEST:
+    return critter_sim.Point((pos.x - 1) % sim.width, pos.y)
+  elif direction == constants.NORTHEAST:
+    return critter_sim.Point((pos.x + 1) % sim.width, (pos.y - 1) % sim.height)
+  elif direction == constants.NORTHWEST:
+    return critter_sim.Point((pos.x - 1) % sim.width, (pos.y - 1) % sim.height)
+  elif direction == constants.SOUTHEAST:
+    return critter_sim.Point((pos.x + 1) % sim.width, (pos.y + 1) % sim.height)
+  elif direction == constants.SOUTHWEST:
+    return critter_sim.Point((pos.x - 1) % sim.width, (pos.y + 1) % sim.height)
+  else:
+    return pos
+
+
+def bench_neighbors(args):
+  """Time per neighbor lookup with the if/elif chain versus the NeighborTable, per get_neighbor call, per all-8 lookup and per neighbor_threat call."""
+  random.seed(args.seed)
+  sim = build_sim(args.width, args.height, (Lookout,), args.counts[-1])
+  critters = list(sim.critters)
+  infos = [sim.critter_infos[c] for c in critters]
+  cells = [sim.critter_cells[c] for c in critters]
+  lookups = args.ticks * len(critters) * 8
+
+  def timed(f):
+    start = time.perf_counter()
+    for i in range(args.ticks):
+      f()
+    return 1e9 * (time.perf_counter() - start) / lookups
+
+  def chain():
+    for c in critters:
+      pos = sim.critter_positions[c]
+      for d in constants.VALID_DIRECTIONS:
+        chain_move(sim, d, pos)
+
+  def table():
+    around = sim.neighbors.around
+    slots = critter_sim.NeighborTable.SLOTS
+    for cell in cells:
+      for d in constants.VALID_DIRECTIONS:
+        around[8 * cell + slots[d]]
+
+  def get_neighbor():
+    for info in infos:
+      for d in constants.VALID_DIRECTIONS:
+        info.get_neighbor(d)
+
+  def get_neighbors():
+    for info in infos:
+      info.get_neighbors()
+
+  def neighbor_threat():
+    for c, info in zip(critters, infos):
+      for d in (constants.NORTH, constants.EAST, constants.SOUTH, constants.WEST):
+        c.neighbor_threat(info, d)
+
+  start = time.perf_counter()
+  around = critter_sim.NeighborTable(args.width, args.height).around
+  build = time.perf_counter() - start
+  table_bytes = around.itemsize * len(around)
+
+  print('table for %dx%d: %.1f ms to build, %.2f bytes/cell' % (args.width, args.height, 1000 * build, table_bytes / (args.width * args.height)))
+  print('%-18s %12s' % ('', 'ns/neighbor'))
+  print('%-18s %12.1f' % ('if/elif chain', timed(chain)))
+  print('%-18s %12.1f' % ('table', timed(table)))
+  print('%-18s %12.1f' % ('get_neighbor', timed(get_neighbor)))
+  print('%-18s %12.1f' % ('get_neighbors', timed(get_neighbors)))
+  # neighbor_threat looks at 3 neighbors per call and is called 4 times per critter, 12 lookups instead of 8
+  print('%-18s %12.1f' % ('neighbor_threat', timed(neighbor_threat) * 8 / 12))
+
+
+def bench_vector(args):
+  """
+  Ticks/sec of the vectorized engine against CritterSim on the same table critters. That the two engines agree is checked by tests/test_vector.py.
+  """
+  print('%-10s %-12s %14s %14s' % ('Critters', 'Board', 'CritterSim', 'VectorSim'))
+  for count in args.counts:
+    random.seed(args.seed)
+    sim = build_sim(args.width, args.height, TABLE_CRITTERS, count // len(TABLE_CRITTERS))
+    reference = args.ticks / time_ticks(sim, args.ticks) if count <= 100000 else None
+    vector = critter_vector.VectorSim(args.width, args.height, args.seed)
+    for critter_class in TABLE_CRITTERS:
+      vector.add(critter_class, count // len(TABLE_CRITTERS))
+    vectorized = args.ticks / time_ticks(vector, args.ticks)
+    print('%-10d %-12s %14s %14.2f' % (count, '%dx%d' % (args.width, args.height), '%.2f' % reference if reference else 'skipped', vectorized))
+
+
+CRITTER_MODULE = """import random
+import constants
+import critter
+
+
+class Submitted%d(critter.Critter):
+  def get_char(self):
+    return 'S'
+
+  def get_color(self):
+    return constants.BLACK
+
+  def get_move(self, self_info):
+    return random.choice(constants.VALID_MOVES)
+
+  def fight(self, opp_info):
+    return random.choice(constants.VALID_ATTACKS)
+"""
+
+IMPORT_ALL = """import importlib, inspect, os, sys
+sys.path.insert(0, sys.argv[1])
+for file in os.listdir(sys.argv[1]):
+  if file.endswith('.py'):
+    importlib.import_module(inspect.getmodulename(file))
+"""
+
+INDEX_ALL = """import sys
+sys.path.insert(0, sys.argv[1])
+import critter_index
+critter_index.CritterIndex(sys.argv[1]).load_all()
+"""
+
+INDEX_ONE = """import sys
+sys.path.insert(0, sys.argv[1])
+import critter_index
+critter_index.CritterIndex(sys.argv[1]).load('Submitted0')
+"""
+
+
+def bench_discovery(args):
+  """
+  Startup time of finding the critters of a directory holding the engine's modules and args.files submitted critters, each in a fresh interpreter: importing every module as import_critters used to, then critter_index cold (no index yet) and warm, loading every critter or just one.
+  """
+  repo = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+  root = tempfile.mkdtemp()
+  try:
+    for path in glob.glob(os.path.join(repo, '*.py')):
+      shutil.copy(path, root)
+    for i in range(args.files):
+      with open(os.path.join(root, 'submitted%d.py' % i), 'w') as f:
+        f.write(CRITTER_MODULE % i)
+
+    def launch(script, cold=False):
+      if cold:
+        for path in glob.glob(os.path.join(root, '.critter_index.json')) + glob.glob(os.path.join(root, '__pycache__', '*')):
+          os.remove(path)
+      start = time.perf_counter()
+      subprocess.run([sys.executable, '-c', script, root], check=True)
+      return time.perf_counter() - start
+
+    baseline = launch('pass')
+    print('%d submitted critters, interpreter startup %.0f ms not included' % (args.files, 1000 * baseline))
+    print('%-34s %12s' % ('', 'ms'))
+    print('%-34s %12.0f' % ('import every module, cold', 1000 * (launch(IMPORT_ALL, cold=True) - baseline)))
+    print('%-34s %12.0f' % ('import every module, warm', 1000 * (launch(IMPORT_ALL) - baseline)))
+    print('%-34s %12.0f' % ('index, all critters, cold', 1000 * (launch(INDEX_ALL, cold=True) - baseline)))
+    print('%-34s %12.0f' % ('index, all critters, warm', 1000 * (launch(INDEX_ALL) - baseline)))
+    print('%-34s %12.0f' % ('index, one critter, warm', 1000 * (launch(INDEX_ONE) - baseline)))
+  finally:
+    shutil.rmtree(root)
+
+
+def bench_reset(args):
+  """Time to populate (add) and repopulate (reset) a board, versus how full it ends up."""
+  cells = args.width * args.height
+  print('%-10s %12s %12s' % ('Density', 'add (ms)', 'reset (ms)'))
+  for density in args.densities:
+    random.seed(args.seed)
+    num = int(cells * density) // 2
+    start = time.perf_counter()
+    sim = build_sim(args.width, args.height, (Walker, Walker2), num)
+    added = time.perf_counter() - start
+    start = time.perf_counter()
+    sim.reset()
+    reset = time.perf_counter() - start
+    print('%-10.2f %12.3f %12.3f' % (density, 1000 * added, 1000 * reset))
+
+
+def bench_metrics(args):
+  """Ticks/sec with metrics streamed every tick and every 100 ticks, next to none, on a board that keeps changing (walkers only) for --ticks ticks."""
+  directory = tempfile.mkdtemp()
+  try:
+    print('%-10s %-10s %10s %10s %10s' % ('Critters', 'Metrics', 'Ticks/sec', 'overhead', 'dropped'))
+    for count in args.counts:
+      base = None
+      for name, interval in (('none', None), ('jsonl/100', 100), ('jsonl/1', 1), ('csv/1', 1)):
+        random.seed(args.seed)
+        sim = build_sim(args.width, args.height, (Walker, Walker2), count // 2)
+        metrics = None
+        if interval is not None:
+          metrics = critter_metrics.Metrics(os.path.join(directory, 'metrics.' + name.split('/')[0]), sim, interval)
+        start = time.perf_counter()
+        for i in range(args.ticks):
+          sim.update()
+          if metrics is not None:
+            metrics.tick()
+        elapsed = time.perf_counter() - start
+        if metrics is not None:
+          metrics.close()
+        base = base or elapsed
+        print('%-10d %-10s %10.2f %9.1f%% %10s' % (count, name, args.ticks / elapsed, 100 * (elapsed / base - 1), metrics.dropped if metrics else '-'))
+  finally:
+    shutil.rmtree(directory)
+
+
+def bench_shard(args):
+  """
+  Ticks/sec of a board run in one process, in shuffled order (CritterSim) and in tile order (TileOrder), and across each number of worker processes in --shards (ShardedSim), all on the same tiles. Every sharded run is checked to end with exactly the board of the TileOrder run. Each engine runs one untimed tick first, in which the workers unpack their critters and build their boards.
+  """
+  classes = (Walker, Walker2, Statue, Lookout)
+  side = critter_shard.default_tiles(max(args.shards))
+  print('%dx%d tiles, %d ticks' % (side, side, args.ticks))
+  print('%-10s %-16s %10s %10s %10s %8s' % ('Critters', 'Engine', 'setup (s)', 'Ticks/sec', 'speedup', 'match'))
+  for count in args.counts:
+    def build():
+      random.seed(args.seed)
+      return build_sim(args.width, args.height, classes, count // len(classes), args.seed)
+
+    sim = build()
+    sim.update()
+    print('%-10d %-16s %10s %10.3f %10s %8s' % (count, 'CritterSim', '-', args.ticks / time_ticks(sim, args.ticks), '-', '-'))
+
+    sim = build()
+    critter_shard.TileOrder(sim, side, side).install()
+    sim.update()
+    print('%-10d %-16s %10s %10.3f %10s %8s' % (count, 'TileOrder', '-', args.ticks / time_ticks(sim, args.ticks), '-', '-'))
+    expected = sorted((cell, c.__class__.__name__) for c, cell in sim.critter_cells.items())
+
+    single = None
+    for workers in args.shards:
+      sim = build()
+      start = time.perf_counter()
+      sharded = critter_shard.ShardedSim(sim, side, side, workers)
+      sharded.update()
+      setup = time.perf_counter() - start
+      rate = args.ticks / time_ticks(sharded, args.ticks)
+      single = single or rate
+      match = sharded.cells() == expected
+      sharded.close()
+      print('%-10d %-16s %10.2f %10.3f %9.2fx %8s' % (count, 'Sharded x%d' % workers, setup, rate, rate / single, 'yes' if match else 'NO'))
+
+
+def bench_memo(args):
+  """
+  Ticks/sec with the decisions of pure critters (Statue and Lookout, next to unmemoized walkers) cached and not, the cache's hit rates, and a check that both runs end the same, as they must.
+  """
+  print('%-10s %-10s %10s %12s %10s %12s %8s' % ('Critters', 'Density', 'No memo', 'Memo', 'speedup', 'move hits', 'same'))
+  for count in args.counts:
+    results = []
+    for memo_size in (0, critter_sim.MEMO_SIZE):
+      random.seed(args.seed)
+      sim = critter_sim.CritterSim(args.width, args.height, threading.Lock(), args.seed)
+      sim.memo_size = memo_size
+      for critter_class in (Walker, Statue, Lookout, Lookout):
+        sim.add(critter_class, count // 4)
+      elapsed = time_ticks(sim, args.ticks)
+      board = sorted((cell, c.__class__.__name__) for c, cell in sim.critter_cells.items())
+      results.append((args.ticks / elapsed, board, sim.memo))
+    (plain, board1, none), (memoized, board2, memo) = results
+    hits, misses = memo.stats[Lookout][:2]
+    print('%-10d %-10.2f %10.2f %12.2f %9.2fx %11.1f%% %8s' % (count, count / (args.width * args.height), plain, memoized, memoized / plain, 100 * hits / (hits + misses), 'yes' if board1 == board2 else 'NO'))
+
+  # fights, on their own: pure critters only ever see a handful of opponent looks
+  random.seed(args.seed)
+  sim = build_sim(args.width, args.height, (Statue, Lookout), min(args.counts) // 2, args.seed)
+  critters = list(sim.critters)
+  pairs = list(zip(critters[::2], critters[1::2]))
+  for label, memo in (('No memo', None), ('Memo', sim.memo)):
+    sim.memo = memo
+    start = time.perf_counter()
+    for critter1, critter2 in pairs:
+      sim.fight(critter1, critter2)
+    print('%-10s %.3f us/fight' % (label, 1e6 * (time.perf_counter() - start) / len(pairs)))
+  print()
+  print(sim.memo)
+
+
+def serve_bench_critters(address):
+  """A critter service running this module's critters, for bench_remote."""
+  asyncio.run(critter_remote.StubServer(lambda name: globals().get(name)).serve(address))
+
+
+def bench_remote(args):
+  """
+  ms/tick and round trips/tick of a board whose Lookouts and Statues run in stub critter services on unix sockets, by number of services (endpoints) and connections to each, next to asking for every remote critter's move in a round trip of its own, as an unbatched protocol would. Every round trip that is not for a fight is for a tick's moves.
+  """
+  directory = tempfile.mkdtemp()
+  addresses = ['unix:%s' % os.path.join(directory, 'critters%d.sock' % i) for i in range(2)]
+  servers = [multiprocessing.Process(target=serve_bench_critters, args=(address,), daemon=True) for address in addresses]
+  for server in servers:
+    server.start()
+  while not all(os.path.exists(address[len('unix:'):]) for address in addresses):
+    time.sleep(0.01)
+
+  print('%-10s %-10s %-12s %10s %14s %10s' % ('Critters', 'Endpoints', 'Connections', 'ms/tick', 'round trips', 'fights'))
+  try:
+    for count in args.counts:
+      for endpoints, connections in ((1, 1), (1, 2), (1, 4), (2, 2)):
+        random.seed(args.seed)
+        sim = critter_sim.CritterSim(args.width, args.height, threading.Lock(), args.seed)
+        remote = critter_remote.Remote(sim, pool_size=connections)
+        sim.add(Walker, count // 3)
+        sim.add(remote.remote('Lookout', addresses[0]), count // 3)
+        sim.add(remote.remote('Statue', addresses[endpoints - 1]), count // 3)
+        remote.install()
+        sim.update()
+        before = [sum(counts) for counts in zip(*remote.round_trips().values())]
+        elapsed = time_ticks(sim, args.ticks)
+        round_trips, fights = [sum(counts) - start for counts, start in zip(zip(*remote.round_trips().values()), before)]
+        print('%-10d %-10d %-12d %10.2f %14.1f %10.1f' % (count, endpoints, connections, 1000 * elapsed / args.ticks, round_trips / args.ticks, fights / args.ticks))
+
+        if (endpoints, connections) == (1, 1):
+          # the same moves, one critter per round trip
+          endpoint = remote.endpoints[addresses[0]]
+          connection = endpoint.connections[0]
+          critters = [c for c in sim.critters if isinstance(c, critter_remote.ServiceCritter)]
+          start = time.perf_counter()
+          for c in critters:
+            remote.run(endpoint.exchange([(connection, (critter_remote.MOVES, [[c.id] + connection.info(sim.critter_infos[c], looks=False)]))]))
+          print('%-10d %-10s %-12s %10.2f %14d %10s' % (count, 'unbatched', '-', 1000 * (time.perf_counter() - start), len(critters), '-'))
+        remote.close()
+  finally:
+    for server in servers:
+      server.kill()
+    shutil.rmtree(directory)
+
+
+def bench_store(args):
+  """Memory per cell of an empty board and per critter of the board's critter store, from tracemalloc, for --counts critters (half Walkers, half Statues), and ms/tick once they are on it. Try --width 2000 --height 2000 --counts 1000000."""
+  print('%-10s %12s %14s %14s %14s %10s' % ('Critters', 'B/cell', 'B/critter', 'of which own', 'peak MB', 'ms/tick'))
+  for count in args.counts:
+    random.seed(args.seed)
+    # so that the neighbor table is counted every time
+    critter_sim.neighbor_table.cache_clear()
+    tracemalloc.start()
+    sim = critter_sim.CritterSim(args.width, args.height, threading.Lock(), args.seed)
+    board = tracemalloc.get_traced_memory()[0]
+    for critter_class in (Walker, Statue):
+      sim.add(critter_class, count // 2)
+    store = tracemalloc.get_traced_memory()[0] - board
+    # what the critter objects themselves take, which is up to whoever wrote them
+    own = [Walker() for i in range(count // 2)] + [Statue() for i in range(count // 2)]
+    own_size = tracemalloc.get_traced_memory()[0] - board - store - sys.getsizeof(own)
+    del own
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    if sim.census() != {critter_class: stats.alive for critter_class, stats in sim.critter_class_stats.items()}:
+      raise AssertionError("the critter store does not agree with the class stats")
+    elapsed = time_ticks(sim, args.ticks)
+    print('%-10d %12.1f %14.1f %14.1f %14.1f %10.1f' % (count, board / (args.width * args.height), store / count, own_size / count, peak / 2**20, 1000 * elapsed / args.ticks))
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Benchmarks the Critter simulation engine.")
+  parser.add_argument('bench', choices=['update', 'info', 'grid', 'neighbors', 'reset', 'vector', 'discovery', 'metrics', 'shard', 'memo', 'remote', 'store'], help="which benchmark to run.")
+  parser.add_argument('--width', default=500, type=int, metavar='', help="width of the game board.")
+  parser.add_argument('--height', default=500, type=int, metavar='', help="height of the game board.")
+  parser.add_argument('--ticks', default=10, type=int, metavar='', help="number of ticks to time.")
+  parser.add_argument('--counts', default=[1000, 10000, 40000], type=int, nargs='+', metavar='', help="total numbers of critters to benchmark.")
+  parser.add_argument('--densities', default=[0.1, 0.5, 0.9, 0.99], type=float, nargs='+', metavar='', help="fractions of the board to fill.")
+  parser.add_argument('--files', default=200, type=int, metavar='', help="number of submitted critter modules for the discovery benchmark.")
+  parser.add_argument('--shards', default=[1, 2, 4, 8], type=int, nargs='+', metavar='', help="numbers of worker processes for the shard benchmark.")
+  parser.add_argument('--seed', default=0, type=int, metavar='', help="random seed.")
+  args = parser.parse_args()
+
+  if args.bench == 'update':
+    bench_update(args)
+  elif args.bench == 'info':
+    bench_info(args)
+  elif args.bench == 'grid':
+    bench_grid(args)
+  elif args.bench == 'neighbors':
+    bench_neighbors(args)
+  elif args.bench == 'reset':
+    bench_reset(args)
+  elif args.bench == 'vector':
+    bench_vector(args)
+  elif args.bench == 'discovery':
+    bench_discovery(args)
+  elif args.bench == 'metrics':
+    bench_metrics(args)
+  elif args.bench == 'shard':
+    bench_shard(args)
+  elif args.bench == 'memo':
+    bench_memo(args)
+  elif args.bench == 'remote':
+    bench_remote(args)
+  elif args.bench == 'store':
+    bench_store(args)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,267 @@
+"""
+Benchmark suite for the Critter simulation engine.
+
+Times every part of the engine (update, fight, CritterInfo construction, reset and the GUI's startup and display, on a stub Tk) across board sizes and densities, with the synthetic critters of critter_bench, and saves the results as a JSON baseline that later runs can be compared against:
+
+  python benchmarks/critter_suite.py run --out baseline.json
+  python benchmarks/critter_suite.py compare baseline.json --threshold 0.1
+
+compare reruns the suite with the baseline's settings, prints every case side by side and exits with status 1 if any got slower, used more memory or left more blocks allocated by more than the threshold. The blocks an update leaves allocated are the objects a tick creates per critter, like positions, so a tick loop that starts allocating again shows up there even when it is not yet measurably slower.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import critter_bench
+import critter_sim
+
+# A random walker, a stationary critter and a neighbor_threat-heavy one, in equal numbers.
+CRITTERS = (critter_bench.Walker, critter_bench.Statue, critter_bench.Lookout)
+
+SIZES = ['38x35', '100x100', '250x250', '500x500', '1000x1000']
+DENSITIES = [0.05, 0.25]
+CASES = ['update', 'fight', 'info', 'reset', 'startup', 'display', 'display_changes']
+
+# Stop timing a case after this many calls, however fast it is.
+MAX_CALLS = 1000
+
+# Differences in blocks left allocated smaller than this are noise (interned strings, caches warming up), not regressions.
+MIN_BLOCKS = 256
+
+
+class StubWidget():
+  """Stands in for every Tk widget and variable CritterGUI uses, doing nothing."""
+
+  def __init__(self, *args, **kwargs):
+    self.value = None
+    # images make their Tcl calls through it
+    self.tk = self
+
+  def __getattr__(self, name):
+    return lambda *args, **kwargs: None
+
+  def set(self, value):
+    self.value = value
+
+  def get(self):
+    return self.value
+
+
+class StubCanvas(StubWidget):
+  """A canvas that hands out item ids and counts the items it is asked to change."""
+
+  def __init__(self, *args, **kwargs):
+    super().__init__()
+    self.items = 0
+    self.changes = 0
+
+  def create_text(self, *args, **kwargs):
+    self.items += 1
+    return self.items
+
+  create_rectangle = create_text
+
+  def itemconfig(self, *args, **kwargs):
+    self.changes += 1
+
+
+class StubTk():
+  """What CritterGUI finds in place of the tkinter module, so its display can be timed without a screen."""
+  Tk = Label = Button = Scale = IntVar = PhotoImage = StubWidget
+  Canvas = StubCanvas
+
+
+def stub_gui(sim):
+  """Returns a CritterGUI for sim drawing on a StubCanvas, or None if tkinter is not installed."""
+  try:
+    import critter_gui
+  except ImportError:
+    return None
+  tk = critter_gui.tk
+  critter_gui.tk = StubTk
+  try:
+    return critter_gui.CritterGUI(sim)
+  finally:
+    critter_gui.tk = tk
+
+
+def build(width, height, density, seed):
+  """Returns a seeded CritterSim of the given size, with density of its cells filled evenly with CRITTERS."""
+  random.seed(seed)
+  sim = critter_sim.CritterSim(width, height, threading.Lock(), seed)
+  for critter_class in CRITTERS:
+    sim.add(critter_class, max(1, int(width * height * density) // len(CRITTERS)))
+  return sim
+
+
+def case(name, sim):
+  """
+  Returns what to time for a case on sim, as (prepare, call, operations): prepare (or None) runs untimed before every call, and operations is how many of the thing being measured one call does.
+  """
+  if name == 'update':
+    return None, sim.update, 1
+  elif name == 'fight':
+    critters = list(sim.critters)
+    pairs = list(zip(critters[::2], critters[1::2]))
+    def fight():
+      for critter1, critter2 in pairs:
+        sim.fight(critter1, critter2)
+    return None, fight, len(pairs)
+  elif name == 'info':
+    critter_ids = [sim.grid.critter_ids[c] for c in sim.critters]
+    def info():
+      for critter_id in critter_ids:
+        critter_sim.CritterInfo(sim, critter_id)
+    return None, info, len(critter_ids)
+  elif name == 'reset':
+    return None, sim.reset, 1
+  elif name == 'startup':
+    if stub_gui(sim) is None:
+      return None
+    return None, lambda: stub_gui(sim), 1
+  elif name == 'display':
+    gui = stub_gui(sim)
+    if gui is None:
+      return None
+    def display():
+      # forget what was drawn, so every cell is drawn again
+      gui.drawn = [None] * len(gui.drawn)
+      gui.display()
+    return None, display, 1
+  elif name == 'display_changes':
+    gui = stub_gui(sim)
+    if gui is None:
+      return None
+    return sim.update, gui.display_changes, 1
+
+
+def measure(prepare, call, operations, min_time):
+  """
+  Times call until min_time seconds of calls (at least one, at most MAX_CALLS) have run, then runs it once more under tracemalloc. Returns a dict of the median time per call, per operation and calls per second, the peak memory one call allocated in KB, and the blocks left allocated by it.
+  """
+  times = []
+  while not times or sum(times) < min_time and len(times) < MAX_CALLS:
+    if prepare:
+      prepare()
+    start = time.perf_counter()
+    call()
+    times.append(time.perf_counter() - start)
+  median = statistics.median(times)
+
+  if prepare:
+    prepare()
+  tracemalloc.start()
+  before = tracemalloc.take_snapshot()
+  current = tracemalloc.get_traced_memory()[0]
+  call()
+  peak = tracemalloc.get_traced_memory()[1] - current
+  after = tracemalloc.take_snapshot()
+  tracemalloc.stop()
+  blocks = sum(stat.count_diff for stat in after.compare_to(before, 'filename'))
+
+  return {
+    'calls': len(times),
+    'ms_per_call': 1000 * median,
+    'us_per_operation': 1e6 * median / operations,
+    'calls_per_sec': 1 / median if median else float('inf'),
+    'peak_kb': peak / 1024,
+    'blocks': blocks,
+  }
+
+
+def run(settings):
+  """Runs every case of the suite with settings and returns {case key: measurements}, printing each as it finishes."""
+  results = {}
+  print('%-36s %8s %12s %12s %12s %10s %9s' % ('Case', 'Calls', 'ms/call', 'us/op', 'calls/sec', 'peak KB', 'blocks'))
+  for size in settings['sizes']:
+    width, height = (int(n) for n in size.split('x'))
+    for density in settings['densities']:
+      for name in settings['cases']:
+        # every case gets a fresh simulation, so no case sees the board another one left behind
+        sim = build(width, height, density, settings['seed'])
+        timed = case(name, sim)
+        key = '%s %s %.2f' % (name, size, density)
+        if timed is None:
+          print('%-36s skipped, tkinter is not installed' % key)
+          continue
+        results[key] = measure(*timed, settings['min_time'])
+        result = results[key]
+        print('%-36s %8d %12.3f %12.3f %12.1f %10.1f %9d' % (key, result['calls'], result['ms_per_call'], result['us_per_operation'], result['calls_per_sec'], result['peak_kb'], result['blocks']))
+  return results
+
+
+def compare(baseline, results, threshold):
+  """
+  Prints every case of results next to the baseline's and returns the keys of those that regressed: took more than threshold longer per call, allocated more than threshold more peak memory (ignoring differences under 64 KB), or left more than threshold more blocks allocated (ignoring differences under MIN_BLOCKS).
+  """
+  regressions = []
+  print('\n%-36s %12s %12s %8s %10s %10s %10s %10s %8s' % ('Case', 'base ms', 'now ms', 'time', 'base KB', 'now KB', 'base blk', 'now blk', ''))
+  for key, result in results.items():
+    base = baseline.get(key)
+    if base is None:
+      print('%-36s %12s %12.3f' % (key, 'new', result['ms_per_call']))
+      continue
+    time_change = result['ms_per_call'] / base['ms_per_call'] - 1 if base['ms_per_call'] else 0
+    slower = time_change > threshold
+    bigger = result['peak_kb'] > base['peak_kb'] * (1 + threshold) and result['peak_kb'] - base['peak_kb'] > 64
+    allocating = result['blocks'] > base['blocks'] * (1 + threshold) and result['blocks'] - base['blocks'] > MIN_BLOCKS
+    flags = ' '.join(flag for flag, raised in (('SLOWER', slower), ('MEMORY', bigger), ('ALLOCS', allocating)) if raised)
+    if flags:
+      regressions.append(key)
+    print('%-36s %12.3f %12.3f %+7.1f%% %10.1f %10.1f %10d %10d %s' % (key, base['ms_per_call'], result['ms_per_call'], 100 * time_change, base['peak_kb'], result['peak_kb'], base['blocks'], result['blocks'], flags))
+  return regressions
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Benchmark suite for the Critter simulation engine.")
+  parser.add_argument('mode', choices=['run', 'compare'], help="run the suite, or run it again and compare with a baseline.")
+  parser.add_argument('baseline', nargs='?', default=None, help="in compare mode, the JSON file written by run --out.")
+  parser.add_argument('--out', default=None, type=str, metavar='', help="write the results to this JSON file.")
+  parser.add_argument('--sizes', default=SIZES, nargs='+', metavar='', help="board sizes, as WIDTHxHEIGHT.")
+  parser.add_argument('--densities', default=DENSITIES, type=float, nargs='+', metavar='', help="fractions of the board to fill.")
+  parser.add_argument('--cases', default=CASES, choices=CASES, nargs='+', metavar='', help="which parts of the engine to time: %s." % ', '.join(CASES))
+  parser.add_argument('--min-time', default=0.5, type=float, metavar='', help="seconds to spend timing each case.")
+  parser.add_argument('--threshold', default=0.1, type=float, metavar='', help="in compare mode, the relative slowdown, memory growth or growth in blocks left allocated that counts as a regression.")
+  parser.add_argument('--seed', default=0, type=int, metavar='', help="random seed.")
+  args = parser.parse_args()
+
+  if args.mode == 'compare':
+    if args.baseline is None:
+      parser.error("compare needs the baseline file to compare with.")
+    with open(args.baseline) as f:
+      baseline = json.load(f)
+    # run exactly what the baseline ran
+    settings = baseline['settings']
+  else:
+    settings = {'sizes': args.sizes, 'densities': args.densities, 'cases': args.cases, 'min_time': args.min_time, 'seed': args.seed}
+
+  results = run(settings)
+  if args.out:
+    with open(args.out, 'w') as f:
+      json.dump({
+        'settings': settings,
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(), 'date': datetime.datetime.now().isoformat(timespec='seconds')},
+        'results': results,
+      }, f, indent=2)
+
+  if args.mode == 'compare':
+    regressions = compare(baseline['results'], results, args.threshold)
+    if regressions:
+      print('\n%d of %d cases regressed by more than %d%%.' % (len(regressions), len(results), 100 * args.threshold))
+      sys.exit(1)
+    print('\nNo regressions beyond %d%%.' % (100 * args.threshold))
+
+
+if __name__ == '__main__':
+  main()
@@ -3,6 +3,9 @@ import constants
 class Critter():
   """Defines a generic critter."""
 
+  # Set to True in a subclass whose get_move depends only on the classes of its 8 neighbors (not on its position, the tick or anything it remembers) and whose fight depends only on the opponent's char and color, and which uses no randomness in either. The simulation then calls them only the first time a critter of the class is in a situation and replays the decision from then on.
+  pure = False
+
   def __init__(self):
     """Constructor"""
     pass
@@ -84,8 +87,7 @@ class Critter():
 
     relevant_directions = constants.MAP_DIRECTIONS[direction]
     result = 0
-    for d in relevant_directions:
-        neighbor_info = self_info.get_neighbor(d)
+    for neighbor_info in self_info.get_neighbors(relevant_directions):
         if neighbor_info != '.': #baddie
             result += 1
                 
@@ -0,0 +1,137 @@
+import concurrent.futures
+import math
+import os
+import random
+import statistics
+import threading
+import critter_checkpoint
+import critter_sim
+
+# z-score for a two-sided 95% confidence interval.
+Z_95 = 1.96
+
+
+def run_match(contenders, width, height, num, iterations, seed, checkpoint=None):
+  """
+  Runs one headless match and returns its results as a dict mapping each critter class name to a (kills, alive) pair. This runs in a worker process, so everything it is given has to be picklable; critter classes pickle by reference.
+
+  With checkpoint, the path of a file written by critter_checkpoint, the match is not set up from scratch but forked from the checkpoint with seed and played on until it reaches iterations ticks in all.
+  """
+  if checkpoint is not None:
+    sim = critter_checkpoint.load(checkpoint, seed)
+  else:
+    # the simulation has its own generator; the global one is only seeded for critters that use the random module themselves
+    random.seed(seed)
+    sim = critter_sim.CritterSim(width, height, threading.Lock(), seed)
+    for critter in contenders:
+      sim.add(critter, num)
+  for i in range(iterations - sim.move_count):
+    sim.update()
+  return {critter.__name__: (stats.kills, stats.alive) for critter, stats in sim.critter_class_stats.items()}
+
+
+def confidence_interval(samples, z=Z_95):
+  """
+  Returns the mean of samples and the half-width of its confidence interval, using the normal approximation. The half-width is infinite until there are at least two samples.
+  """
+  mean = statistics.fmean(samples)
+  if len(samples) < 2:
+    return mean, math.inf
+  return mean, z * statistics.stdev(samples) / math.sqrt(len(samples))
+
+
+class BatchResults():
+  """
+  Per-class wins, alive counts and totals collected over many matches.
+  """
+  def __init__(self, names, z=Z_95):
+    self.z = z
+    self.matches = 0
+    self.wins = {name: [] for name in names}
+    self.alive = {name: [] for name in names}
+
+  def add(self, result):
+    """Adds the result of one match, as returned by run_match."""
+    self.matches += 1
+    for name, (kills, alive) in result.items():
+      self.wins[name].append(kills)
+      self.alive[name].append(alive)
+
+  def totals(self, name):
+    return [kills + alive for kills, alive in zip(self.wins[name], self.alive[name])]
+
+  def ranking(self):
+    """
+    Returns the critter class names sorted by mean total (wins + alive), best first, each paired with the (mean, half-width) confidence interval of that total.
+    """
+    intervals = [(name, confidence_interval(self.totals(name), self.z)) for name in self.wins]
+    return sorted(intervals, key=lambda item: -item[1][0])
+
+  def is_settled(self):
+    """
+    Whether the ranking is statistically settled: the confidence intervals of the totals of every two neighbors in the ranking are disjoint.
+    """
+    ranking = self.ranking()
+    for (name1, (mean1, half1)), (name2, (mean2, half2)) in zip(ranking, ranking[1:]):
+      if mean1 - half1 <= mean2 + half2:
+        return False
+    return True
+
+  def __str__(self):
+    """
+    Returns a formatted table of mean wins, alive and totals with their confidence intervals, sorted like CritterSim's table.
+    """
+    header = "-" * 65 + '\n'
+    header += "%-20s %13s  %13s  %13s\n" % ("Critter", "Wins", "Alive", "Total")
+    header += "-" * 65 + '\n'
+
+    rows = []
+    for name, total in self.ranking():
+      wins = confidence_interval(self.wins[name], self.z)
+      alive = confidence_interval(self.alive[name], self.z)
+      rows.append('%-20s %s  %s  %s' % (name, format_interval(wins), format_interval(alive), format_interval(total)))
+    return header + '\n'.join(rows)
+
+
+def format_interval(interval):
+  mean, half = interval
+  return '%6.1f +- %-4.1f' % (mean, half) if half != math.inf else '%6.1f +- ?   ' % mean
+
+
+def run_batch(contenders, width, height, num, iterations, matches, seed, workers=None, min_matches=10, early_stop=True, checkpoint=None):
+  """
+  Runs up to matches independent headless matches across a pool of worker processes and returns their BatchResults. With early_stop, stops handing out matches once the first k matches (in seed order) include at least min_matches and settle the ranking, and returns exactly those k; matches already running are left to finish but not counted. Results are only ever counted in seed order, whichever finish first, so the same seed always gives the same results. With checkpoint, every match is a different continuation of the game saved there (see run_match).
+  """
+  workers = workers or os.cpu_count() or 1
+  results = BatchResults([critter.__name__ for critter in contenders])
+
+  # one seed per match, derived from the batch seed so the whole batch can be reproduced from a single number
+  seeds = iter(enumerate(critter_sim.split_seed(seed, matches)))
+
+  with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+    # keep every worker busy, with one match queued behind each
+    pending = {}
+    def submit():
+      for index, match_seed in seeds:
+        pending[pool.submit(run_match, contenders, width, height, num, iterations, match_seed, checkpoint)] = index
+        if len(pending) >= 2 * workers:
+          break
+
+    # results of matches finished ahead of an earlier one, by seed index
+    finished = {}
+    submit()
+    settled = False
+    while pending and not settled:
+      done, running = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+      for future in done:
+        finished[pending.pop(future)] = future.result()
+      # count the next matches in seed order, deciding whether to stop after each
+      while results.matches in finished and not settled:
+        results.add(finished.pop(results.matches))
+        settled = early_stop and results.matches >= min_matches and results.is_settled()
+      if settled:
+        pool.shutdown(wait=True, cancel_futures=True)
+      else:
+        submit()
+
+  return results
@@ -0,0 +1,72 @@
+import time
+import constants
+import critter_profile
+
+# What a critter that ran out of time does instead.
+DEFAULT_MOVE = constants.CENTER
+DEFAULT_ATTACK = constants.ROAR
+
+
+class Budget():
+  """
+  Holds every critter class of a simulation to a time budget: at most call_budget seconds per get_move or fight call, and at most tick_budget seconds of such calls per class per tick (either may be None). A call that runs over counts as a violation of its class and its result is replaced by DEFAULT_MOVE or DEFAULT_ATTACK; once a class has used up its tick budget, its critters are not called again until the next tick and make the default choice instead. With disqualify, the first violation disqualifies the class for good: its critters are never called again.
+
+  Running over can only be noticed once a call returns, so this cannot stop a critter that never does; critter_worker.Isolation can, by running critters in other processes. Like critter_profile.Profiler, install() wraps the classes' methods and the simulation's update, and uninstall() puts them back, so the simulation does not pay for budgets it does not have.
+  """
+  def __init__(self, sim, classes, call_budget=None, tick_budget=None, disqualify=False):
+    self.sim = sim
+    self.classes = list(classes)
+    self.call_budget = call_budget
+    self.tick_budget = tick_budget
+    self.disqualify = disqualify
+
+    # time each class spent in its calls this tick
+    self.spent = dict.fromkeys(self.classes, 0)
+    self.originals = []
+    self.own_update = None
+
+  def install(self):
+    # look up every original before wrapping anything, so a class inheriting from another contender does not wrap its wrapper
+    originals = [(critter_class, name, critter_class.__dict__.get(name), getattr(critter_class, name), default) for critter_class in self.classes for name, default in (('get_move', DEFAULT_MOVE), ('fight', DEFAULT_ATTACK))]
+    for critter_class, name, own, method, default in originals:
+      setattr(critter_class, name, self.budgeted(critter_class, method, default))
+      self.originals.append((critter_class, name, own))
+
+    # what update was on the simulation itself, if anything (another wrapper), to put back on uninstall
+    self.own_update = self.sim.__dict__.get('update')
+    update = self.sim.update
+    def budgeted_update():
+      self.spent = dict.fromkeys(self.classes, 0)
+      return update()
+    self.sim.update = budgeted_update
+
+  def uninstall(self):
+    for critter_class, name, own in self.originals:
+      if own is None:
+        delattr(critter_class, name)
+      else:
+        setattr(critter_class, name, own)
+    self.originals = []
+    critter_profile.restore(self.sim, 'update', self.own_update)
+
+  def budgeted(self, critter_class, method, default):
+    def budgeted(*args):
+      stats = self.sim.critter_class_stats[critter_class]
+      if stats.disqualified or self.tick_budget is not None and self.spent[critter_class] > self.tick_budget:
+        return default
+
+      start = time.perf_counter()
+      result = method(*args)
+      elapsed = time.perf_counter() - start
+      self.spent[critter_class] += elapsed
+
+      if self.call_budget is not None and elapsed > self.call_budget or self.tick_budget is not None and self.spent[critter_class] > self.tick_budget:
+        self.violation(stats)
+        return default
+      return result
+    return budgeted
+
+  def violation(self, stats):
+    stats.violations += 1
+    if self.disqualify:
+      stats.disqualified = True
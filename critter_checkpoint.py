@@ -0,0 +1,54 @@
+import gzip
+import os
+import pickle
+import random
+
+# A checkpoint is a gzipped pickle of a dict holding VERSION, the CritterSim (grid, positions, class stats and every critter with its own state, see CritterSim.__getstate__) and the state of the random module, which critters draw from. Unpickling runs code named in the file, so only load checkpoints you wrote.
+VERSION = 7
+
+
+def save(sim, path):
+  """
+  Writes a checkpoint of sim to path. The file is written next to path first and then moved into place, so an interrupted save never leaves a broken checkpoint behind.
+  """
+  temporary = path + '.tmp'
+  with gzip.open(temporary, 'wb', compresslevel=1) as f:
+    pickle.dump({'version': VERSION, 'sim': sim, 'random': random.getstate()}, f, protocol=pickle.HIGHEST_PROTOCOL)
+  os.replace(temporary, path)
+
+
+def load(path, seed=None):
+  """
+  Reads the checkpoint at path and returns its simulation, ready to go on from the tick it was saved at, and restores the random module's state. With seed, both the simulation and the random module are reseeded instead, forking a new continuation of the same game.
+  """
+  with gzip.open(path, 'rb') as f:
+    checkpoint = pickle.load(f)
+  if checkpoint.get('version') != VERSION:
+    raise CheckpointException("Error: %s is not a version %d checkpoint." % (path, VERSION))
+
+  sim = checkpoint['sim']
+  if seed is None:
+    random.setstate(checkpoint['random'])
+  else:
+    sim.seed = seed
+    sim.random.seed(seed)
+    random.seed(seed)
+  return sim
+
+
+class Checkpointer():
+  """
+  Saves a checkpoint of a simulation to path every interval ticks.
+  """
+  def __init__(self, path, interval=1000):
+    self.path = path
+    self.interval = interval
+
+  def tick(self, sim):
+    """Meant to be called after every tick."""
+    if sim.move_count % self.interval == 0:
+      save(sim, self.path)
+
+
+class CheckpointException(Exception):
+  pass
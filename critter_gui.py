@@ -1,17 +1,43 @@
 import tkinter as tk
+import collections
+import functools
+import queue
+import threading
+import time
 import constants
 
 EMPTY_CHAR = '.'
 
+# How many pixels wide and tall a cell is drawn, as a char.
+CELL_SIZE = 15
+
+# Boards with more cells than this are drawn as a bitmap instead, one block of pixels in the critter's color per cell, as Tk cannot keep up with a text item per cell. The bitmap's cells are as big as fits BITMAP_SIDE pixels, up to CELL_SIZE, and at least one pixel. Empty cells are EMPTY_PIXEL.
+BITMAP_CELLS = 100 * 100
+BITMAP_SIDE = 1000
+EMPTY_PIXEL = '#FFFFFF'
+
+# How often the GUI draws the latest frame in threaded mode.
+FRAMES_PER_SECOND = 30
+
+# Everything the GUI needs to draw one frame in threaded mode: the move count, a dict mapping the flat index of every cell that looks different since the previous frame to its new (char, hex color), the (name, alive, kills) of every class, and the measured ticks/sec.
+Frame = collections.namedtuple('Frame', ['move_count', 'looks', 'stats', 'ticks_per_second'])
+
 
 class CritterGUI():
-  def __init__(self, sim):
+  def __init__(self, sim, threaded=False, bitmap=None):
     # Keep track of whether the simulation is currently running or not.
     self.is_running = False
 
+    # In threaded mode the simulation runs on a SimulationThread and this only ever draws the frames it publishes.
+    self.thread = None
+
     self.sim = sim
-    self.width = 15 * self.sim.width
-    self.height = 15 * self.sim.height
+
+    # Draw the board as a bitmap rather than as chars; by default, only boards with more than BITMAP_CELLS cells.
+    self.bitmap = bitmap if bitmap is not None else sim.width * sim.height > BITMAP_CELLS
+    self.cell_size = max(1, min(CELL_SIZE, BITMAP_SIDE // max(sim.width, sim.height))) if self.bitmap else CELL_SIZE
+    self.width = self.cell_size * self.sim.width
+    self.height = self.cell_size * self.sim.height
 
     self.root = tk.Tk()
     self.root.grid()
@@ -46,19 +72,30 @@ class CritterGUI():
           column=25, row=ROW)
       ROW = ROW + 1
 
-    self.speed_label = tk.Label(self.root, text='Speed:')
+    self.speed_label = tk.Label(self.root, text='Ticks/sec:' if threaded else 'Speed:')
     self.speed_label.grid(column=0, row=10)
 
-    # Change speed of the simulation.
+    # Change speed of the simulation. In threaded mode this is a target number of ticks per second, 0 meaning as fast as possible.
     self.speed_var = tk.IntVar()
-    self.speed_var.set(10)
-    self.scale = tk.Scale(self.root,
-                          variable=self.speed_var,
-                          orient='horizontal',
-                          length=100,
-                          sliderlength=10,
-                          from_=1,
-                          to=10)
+    if threaded:
+      self.speed_var.set(20)
+      self.scale = tk.Scale(self.root,
+                            variable=self.speed_var,
+                            orient='horizontal',
+                            length=100,
+                            sliderlength=10,
+                            from_=0,
+                            to=200,
+                            command=self.set_target_speed)
+    else:
+      self.speed_var.set(10)
+      self.scale = tk.Scale(self.root,
+                            variable=self.speed_var,
+                            orient='horizontal',
+                            length=100,
+                            sliderlength=10,
+                            from_=1,
+                            to=10)
     self.scale.grid(column=1, row=10)
 
     # Move count.
@@ -98,37 +135,116 @@ class CritterGUI():
                                   command=self.reset)
     self.reset_button.grid(column=11, row=10)
 
-    # Representation of the critter world.
-    self.chars = [[
-        self.canvas.create_text((x * 15 + 7.5, y * 15 + 7.5),
-                                text='',
-                                font=('Courier New', -15))
-        for y in range(self.sim.height)
-    ] for x in range(self.sim.width)]
+    # Representation of the critter world. The text items, or the image, are created after the background rectangle, so they always sit on top of it.
+    if self.bitmap:
+      # The board image has one pixel per cell and starts out transparent, showing the background; the image on the canvas is it zoomed to cell_size, or the board image itself at one pixel per cell. pixels holds the color of every cell by flat index, and dirty_rows maps the rows whose pixels changed since they were last written to the board image to the [first, last] columns that changed.
+      self.board = tk.PhotoImage(width=self.sim.width, height=self.sim.height)
+      self.image = tk.PhotoImage(width=self.width, height=self.height) if self.cell_size > 1 else self.board
+      self.canvas.create_image((0, 0), image=self.image, anchor='nw')
+      self.pixels = [EMPTY_PIXEL] * (self.sim.width * self.sim.height)
+      self.dirty_rows = {}
+    else:
+      self.chars = [[
+          self.canvas.create_text((x * CELL_SIZE + CELL_SIZE / 2, y * CELL_SIZE + CELL_SIZE / 2),
+                                  text='',
+                                  font='Courier 13 bold')
+          for y in range(self.sim.height)
+      ] for x in range(self.sim.width)]
 
-    # Display current critter sim.
-    self.display()
+    # The (char, hex color) each cell was last drawn with, by flat index, so that unchanged cells are never reconfigured.
+    self.drawn = [None] * (self.sim.width * self.sim.height)
+
+    # Display current critter sim, and from now on only what changes.
+    if threaded:
+      # Measured ticks/sec and frames/sec.
+      self.rate_label = tk.Label(self.root, text='')
+      self.rate_label.grid(column=4, row=10, columnspan=3)
+      self.frames = 0
+      self.frames_start = time.perf_counter()
+      self.frames_per_second = 0.0
+
+      self.thread = SimulationThread(self.sim, self.speed_var.get())
+      self.thread.start()
+      self.render()
+    else:
+      self.sim.track_changes()
+      self.display()
 
   def draw_char(self, char, color, x, y):
-    """Displays a single char at position (x, y) on the canvas."""
-    self.canvas.itemconfig(self.chars[x][y],
-                            text=char,
-                            fill=color_to_hex(color),
-                            font='Courier 13 bold')
-    self.canvas.tag_raise(self.chars[x][y])
+    """Displays a single char at position (x, y) on the canvas, unless it is already there."""
+    self.draw_look(y * self.sim.width + x, (char, color_to_hex(color)))
+
+  def draw_look(self, i, look):
+    """Displays a (char, hex color) look on the cell with flat index i, unless it is already there. In bitmap mode, the pixels only reach the screen with the next flush()."""
+    if self.drawn[i] != look:
+      self.drawn[i] = look
+      if self.bitmap:
+        self.pixels[i] = EMPTY_PIXEL if look[0] == EMPTY_CHAR else look[1]
+        y, x = divmod(i, self.sim.width)
+        span = self.dirty_rows.get(y)
+        if span is None:
+          self.dirty_rows[y] = [x, x]
+        elif x < span[0]:
+          span[0] = x
+        elif x > span[1]:
+          span[1] = x
+      else:
+        self.canvas.itemconfig(self.chars[i % self.sim.width][i // self.sim.width], text=look[0], fill=look[1])
+
+  def flush(self):
+    """Bitmap mode: writes the changed pixels to the board image, every run of consecutive rows in one put of the columns that changed in any of them, then zooms it onto the image on the canvas, all in Tk."""
+    if not self.bitmap or not self.dirty_rows:
+      return
+    width = self.sim.width
+    pixels = self.pixels
+    dirty = self.dirty_rows
+    rows = sorted(dirty)
+    start = 0
+    for end in range(1, len(rows) + 1):
+      if end == len(rows) or rows[end] != rows[end - 1] + 1:
+        run = rows[start:end]
+        first = min(dirty[y][0] for y in run)
+        last = max(dirty[y][1] for y in run) + 1
+        self.board.put(' '.join(['{%s}' % ' '.join(pixels[y * width + first:y * width + last]) for y in run]), to=(first, rows[start]))
+        start = end
+    self.dirty_rows.clear()
+    if self.image is not self.board:
+      self.image.tk.call(self.image, 'copy', self.board, '-zoom', self.cell_size, self.cell_size)
+
+  def draw_cell(self, i):
+    """Displays whatever is on the cell with flat index i."""
+    critter = self.sim.grid.critters[self.sim.grid.ids[i]]
+    if critter:
+      self.draw_look(i, (critter.get_char(), color_to_hex(critter.get_color())))
+    else:
+      self.draw_look(i, (EMPTY_CHAR, color_to_hex(constants.BLACK)))
 
   def display(self):
-    """Draw all characters representing critters or empty spots."""
-    # Clear screen
-    self.canvas.tag_raise(self.rectangle)
-    # Draw all critters
-    for x in range(self.sim.width):
-      for y in range(self.sim.height):
-        critter = self.sim.grid[x][y]
-        if critter:
-          self.draw_char(critter.get_char(), critter.get_color(), x, y)
-        else:
-          self.draw_char(EMPTY_CHAR, constants.BLACK, x, y)
+    """Draw all characters representing critters or empty spots. In bitmap mode, empty spots are the background, so the image is cleared and only the critters are drawn."""
+    self.sim.take_changed_cells()
+    if self.bitmap:
+      cells = self.sim.width * self.sim.height
+      self.board.blank()
+      if self.image is not self.board:
+        # the board is only ever copied over the zoomed image, and a blank one copies nothing, so the old frame would stay even when no cell gets drawn
+        self.image.blank()
+      self.pixels = [EMPTY_PIXEL] * cells
+      self.drawn = [(EMPTY_CHAR, color_to_hex(constants.BLACK))] * cells
+      self.dirty_rows.clear()
+      for i in self.sim.grid.occupied_cells():
+        self.draw_cell(i)
+      self.flush()
+      return
+    for i in range(self.sim.width * self.sim.height):
+      self.draw_cell(i)
+
+  def display_changes(self):
+    """
+    Draw only the cells the simulation changed since the last display, which include those of critters that changed their char or color without moving (see CritterSim.take_changed_cells). Cells that look the same as before are not touched, so the cost follows the activity on the board rather than its size.
+    """
+    for i in self.sim.take_changed_cells():
+      self.draw_cell(i)
+    self.flush()
 
   def update(self):
     """
@@ -136,7 +252,7 @@ class CritterGUI():
     """
     if self.is_running == True:
       self.sim.update()
-      self.display()
+      self.display_changes()
       self.increment_move()
       self.update_class_stats()
       self.root.after(int(500 / self.speed_var.get()), self.update)
@@ -156,26 +272,65 @@ class CritterGUI():
           text=self.critter_classes[x].__name__ + ": " + str(alive) +
           " + " + str(kills) + " = " + str(total))
 
+  def render(self):
+    """
+    Threaded mode: draws the latest frame published by the simulation thread, if there is a new one, then reschedules itself to run at FRAMES_PER_SECOND.
+    """
+    frame = self.thread.take_frame()
+    if frame is not None:
+      for i, look in frame.looks.items():
+        self.draw_look(i, look)
+      self.flush()
+      self.move_count = frame.move_count
+      self.move_count_label.config(text=str(self.move_count) + ' iterations')
+      for name, alive, kills in frame.stats:
+        if name in self.class_state_labels:
+          self.class_state_labels[name].config(text=name + ": " + str(alive) + " + " + str(kills) + " = " + str(alive + kills))
+      self.frames += 1
+
+    now = time.perf_counter()
+    if now - self.frames_start >= 1:
+      self.frames_per_second = self.frames / (now - self.frames_start)
+      self.frames = 0
+      self.frames_start = now
+    self.rate_label.config(text='%.0f ticks/sec, %.0f frames/sec' % (self.thread.ticks_per_second, self.frames_per_second))
+    self.root.after(1000 // FRAMES_PER_SECOND, self.render)
+
+  def set_target_speed(self, value):
+    """Threaded mode: the speed slider sets the simulation thread's target ticks/sec."""
+    self.thread.target_ticks_per_second = int(value)
+
   def go(self):
     """Actually runs the GUI. Pretty straightforward."""
     self.is_running = True
+    if self.thread:
+      self.thread.commands.put(SimulationThread.GO)
+      return
     self.update()
 
   def pause(self):
     """Pause updating."""
     self.is_running = False
+    if self.thread:
+      self.thread.commands.put(SimulationThread.PAUSE)
 
   def step(self):
     """Move all critters by 1 step."""
     self.is_running = False
+    if self.thread:
+      self.thread.commands.put(SimulationThread.STEP)
+      return
     self.sim.update()
-    self.display()
+    self.display_changes()
     self.increment_move()
     self.update_class_stats()
 
   def reset(self):
     """Stop simulation, reset critter sim."""
     self.is_running = False
+    if self.thread:
+      self.thread.commands.put(SimulationThread.RESET)
+      return
     self.sim.reset()
     self.display()
     self.move_count = 0
@@ -184,7 +339,122 @@ class CritterGUI():
   def start(self):
     self.root.mainloop()
 
+  def stop(self):
+    """Stops the simulation thread, if there is one."""
+    if self.thread:
+      self.thread.commands.put(SimulationThread.QUIT)
+      self.thread.join()
+
+
+class SimulationThread(threading.Thread):
+  """
+  Runs a simulation on its own thread, as fast as a target number of ticks per second allows, so that the simulation is not held back by rendering and a slow critter cannot freeze the window. Nothing else may touch the simulation while the thread runs: the GUI sends it commands (GO, PAUSE, STEP, RESET, QUIT) and takes Frames, which the thread publishes between ticks whenever the previous one has been taken. A frame only holds the cells whose looks changed since the frame before, so publishing costs one pass over the cells the simulation changed (see CritterSim.take_changed_cells), however fast it ticks.
+  """
+  GO = 'go'
+  PAUSE = 'pause'
+  STEP = 'step'
+  RESET = 'reset'
+  QUIT = 'quit'
+
+  def __init__(self, sim, target_ticks_per_second=0):
+    super().__init__(daemon=True)
+    self.sim = sim
+    self.commands = queue.Queue()
+
+    # 0 means as fast as possible. Plain attributes: assigning them is atomic.
+    self.target_ticks_per_second = target_ticks_per_second
+    self.ticks_per_second = 0.0
+
+    self.running = False
+    self.frame = None
+    self.frame_lock = threading.Lock()
+    self.frame_wanted = threading.Event()
+
+    # The (char, hex color) of every cell as of the last published frame, so only cells that look different get published.
+    self.published = [None] * (sim.width * sim.height)
+    sim.track_changes()
+
+  def take_frame(self):
+    """Returns the latest unseen Frame, or None, and asks for the next one."""
+    with self.frame_lock:
+      frame, self.frame = self.frame, None
+    self.frame_wanted.set()
+    return frame
+
+  def run(self):
+    self.publish(everything=True)
+    next_tick = time.perf_counter()
+    rate_start = next_tick
+    rate_ticks = 0
+    while True:
+      # wait for a command while paused, or until the next tick is due while running
+      if not self.running:
+        timeout = None
+      elif self.target_ticks_per_second:
+        timeout = max(0, next_tick - time.perf_counter())
+      else:
+        timeout = 0
+      try:
+        command = self.commands.get(timeout=timeout)
+      except queue.Empty:
+        command = None
+
+      if command == self.QUIT:
+        return
+      elif command == self.GO:
+        self.running = True
+        next_tick = rate_start = time.perf_counter()
+        rate_ticks = 0
+      elif command == self.PAUSE:
+        self.running = False
+        self.ticks_per_second = 0.0
+      elif command == self.STEP:
+        self.running = False
+        self.sim.update()
+        self.publish()
+      elif command == self.RESET:
+        self.running = False
+        self.sim.reset()
+        self.publish(everything=True)
+
+      now = time.perf_counter()
+      if self.running and now >= next_tick:
+        self.sim.update()
+        rate_ticks += 1
+        if self.target_ticks_per_second:
+          # don't try to catch up on ticks lost to a slow critter
+          next_tick = max(next_tick + 1 / self.target_ticks_per_second, now)
+        if now - rate_start >= 1:
+          self.ticks_per_second = rate_ticks / (now - rate_start)
+          rate_start = now
+          rate_ticks = 0
+        if self.frame_wanted.is_set():
+          self.publish()
+
+  def publish(self, everything=False):
+    """Publishes a Frame of everything that changed since the last one, merged with that one if the GUI has not taken it yet. With everything, looks at every cell rather than only the changed ones (see CritterSim.take_changed_cells)."""
+    self.frame_wanted.clear()
+    sim = self.sim
+    grid = sim.grid
+    looks = {}
+    changed = sim.take_changed_cells()
+    for i in range(sim.width * sim.height) if everything else changed:
+      critter = grid.critters[grid.ids[i]]
+      look = (critter.get_char(), color_to_hex(critter.get_color())) if critter else (EMPTY_CHAR, color_to_hex(constants.BLACK))
+      if self.published[i] != look:
+        self.published[i] = look
+        looks[i] = look
+    stats = tuple((critter_class.__name__, stats.alive, stats.kills) for critter_class, stats in sim.critter_class_stats.items())
+
+    with self.frame_lock:
+      if self.frame is not None:
+        merged = dict(self.frame.looks)
+        merged.update(looks)
+        looks = merged
+      self.frame = Frame(sim.move_count, looks, stats, self.ticks_per_second)
+
 
+@functools.lru_cache(maxsize=4096)
 def color_to_hex(color):
 	"""
   Converts RGB colors to hex string, because tkinter thought that passing numeric types as strings was an AWESOME idea.
@@ -0,0 +1,142 @@
+import ast
+import hashlib
+import importlib
+import inspect
+import json
+import os
+import critter
+
+# Where the index of a directory's critters is kept, inside that directory.
+INDEX_FILE = '.critter_index.json'
+INDEX_VERSION = 1
+
+# Critter subclasses that are there to be subclassed, not to play, as (module, class name).
+BASE_CLASSES = {('critter', 'Critter'), ('critter_table', 'TableCritter'), ('critter_worker', 'RemoteCritter'), ('critter_remote', 'ServiceCritter')}
+
+
+def scan(source):
+  """
+  Returns every class defined at the top level of a module's source, as (name, base names, line) tuples. Base names are written as in the source, minus any module prefix: both critter.Critter and Critter give Critter.
+  """
+  classes = []
+  for node in ast.parse(source).body:
+    if isinstance(node, ast.ClassDef):
+      bases = []
+      for base in node.bases:
+        if isinstance(base, ast.Attribute):
+          bases.append(base.attr)
+        elif isinstance(base, ast.Name):
+          bases.append(base.id)
+      classes.append((node.name, bases, node.lineno))
+  return classes
+
+
+class CritterIndex():
+  """
+  Finds the critters defined in the .py files of a directory without importing them: every file is parsed, and a class counts as a critter if one of its bases is Critter or, transitively, another such class. Importing happens only when a critter class is asked for, and then only its module is imported, so tools like the GUI and the simulator, which define no critters, are never imported just to be looked at.
+
+  What each file defines is kept in INDEX_FILE, keyed by the file's mtime and size and the sha256 of its contents: a file whose mtime and size did not change is not read again, and one whose contents did not change is not parsed again.
+  """
+  def __init__(self, root='.'):
+    self.root = root
+    self.path = os.path.join(root, INDEX_FILE)
+    self.files = self.read_index()
+    changed = self.refresh()
+    if changed:
+      self.write_index()
+
+    # every module's classes, and which of them are critters
+    bases = {}
+    for file, entry in sorted(self.files.items()):
+      for name, class_bases, line in entry['classes']:
+        bases.setdefault(name, set()).update(class_bases)
+    critters = {'Critter'}
+    grown = True
+    while grown:
+      grown = False
+      for name, class_bases in bases.items():
+        if name not in critters and class_bases & critters:
+          critters.add(name)
+          grown = True
+
+    # (class name, module name) of every critter, in file and line order
+    self.critters = []
+    for file, entry in sorted(self.files.items()):
+      module_name = inspect.getmodulename(file)
+      for name, class_bases, line in entry['classes']:
+        if name in critters and set(class_bases) & critters and (module_name, name) not in BASE_CLASSES:
+          self.critters.append((name, module_name))
+
+  def read_index(self):
+    try:
+      with open(self.path) as f:
+        index = json.load(f)
+      if index.get('version') == INDEX_VERSION:
+        return index['files']
+    except (OSError, ValueError, KeyError):
+      pass
+    return {}
+
+  def write_index(self):
+    # an index that cannot be written only costs the next launch a rescan
+    try:
+      with open(self.path, 'w') as f:
+        json.dump({'version': INDEX_VERSION, 'files': self.files}, f)
+    except OSError:
+      pass
+
+  def refresh(self):
+    """Brings the index up to date with the directory, rescanning only files that changed. Returns whether anything did."""
+    changed = False
+    files = {}
+    for file in os.listdir(self.root):
+      if not file.lower().endswith('.py'):
+        continue
+      path = os.path.join(self.root, file)
+      stat = os.stat(path)
+      entry = self.files.get(file)
+      if entry is not None and entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size:
+        files[file] = entry
+        continue
+
+      with open(path, 'rb') as f:
+        source = f.read()
+      digest = hashlib.sha256(source).hexdigest()
+      if entry is None or entry['sha256'] != digest:
+        try:
+          classes = scan(source)
+        except SyntaxError:
+          # the import would fail too; leave the file out
+          classes = []
+        entry = {'sha256': digest, 'classes': classes}
+      files[file] = dict(entry, mtime=stat.st_mtime, size=stat.st_size)
+      changed = True
+
+    changed = changed or files.keys() != self.files.keys()
+    self.files = files
+    return changed
+
+  def names(self):
+    """Returns the class names of every critter found, in file and line order."""
+    return [name for name, module_name in self.critters]
+
+  def load(self, name):
+    """Imports the module defining the critter class called name and returns the class, or None if there is no such critter."""
+    for critter_name, module_name in self.critters:
+      if critter_name == name:
+        obj = self.import_class(critter_name, module_name)
+        if obj is not None:
+          return obj
+    return None
+
+  def load_all(self):
+    """Imports every module defining a critter and returns all critter classes, in file and line order."""
+    classes = [self.import_class(name, module_name) for name, module_name in self.critters]
+    return [c for c in classes if c is not None]
+
+  def import_class(self, name, module_name):
+    obj = getattr(importlib.import_module(module_name), name, None)
+    # the scan goes by names, so make sure it really is a critter
+    if inspect.isclass(obj) and issubclass(obj, critter.Critter):
+      return obj
+    return None
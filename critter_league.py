@@ -0,0 +1,76 @@
+import itertools
+import critter_sweep
+
+# Elo ratings: where every class starts, and how far one match can move a rating.
+ELO_START = 1500
+ELO_K = 16
+
+
+def fixtures(contenders):
+  """Returns every pair of contenders, each pair ordered by class name, so that a pair is the same match (and the same cached result) whoever else is in the league. Raises a LeagueException if a class name comes up twice, as a class cannot play itself: its critters would all count as one side."""
+  names = [contender.__name__ for contender in contenders]
+  for name in names:
+    if names.count(name) > 1:
+      raise LeagueException("Error: %s is in the league more than once; a league needs distinct critters." % name)
+  return [tuple(sorted(pair, key=lambda contender: contender.__name__)) for pair in itertools.combinations(contenders, 2)]
+
+
+def expected_score(rating, opponent_rating):
+  """Returns the score, from 0 to 1, that Elo expects of a player rated rating against one rated opponent_rating."""
+  return 1 / (1 + 10 ** ((opponent_rating - rating) / 400))
+
+
+class League():
+  """
+  Elo ratings and win/draw/loss records of critter classes playing head-to-head matches. A match is won by the class with the higher total (wins + alive) at the end, and drawn on equal totals.
+  """
+  def __init__(self, names, k=ELO_K):
+    self.k = k
+    self.ratings = {name: ELO_START for name in names}
+    # name -> [wins, draws, losses]
+    self.records = {name: [0, 0, 0] for name in names}
+
+  def add(self, result):
+    """Adds the result of one head-to-head match, as returned by critter_batch.run_match, updating both ratings at once. Raises a LeagueException unless the result is of two different classes of the league."""
+    if len(result) != 2 or any(name not in self.ratings for name in result):
+      raise LeagueException("Error: a league match is between two different critters of the league, not %s." % ', '.join(sorted(result)))
+    (name1, (kills1, alive1)), (name2, (kills2, alive2)) = result.items()
+    total1, total2 = kills1 + alive1, kills2 + alive2
+    score = 1 if total1 > total2 else 0.5 if total1 == total2 else 0
+    change = self.k * (score - expected_score(self.ratings[name1], self.ratings[name2]))
+    self.ratings[name1] += change
+    self.ratings[name2] -= change
+    for name, outcome in ((name1, score), (name2, 1 - score)):
+      self.records[name][0 if outcome == 1 else 1 if outcome == 0.5 else 2] += 1
+
+  def standings(self):
+    """Returns the class names sorted by rating, best first, each paired with its rating and [wins, draws, losses]."""
+    return sorted(((name, self.ratings[name], self.records[name]) for name in self.ratings), key=lambda standing: -standing[1])
+
+  def __str__(self):
+    """Returns a formatted table of the standings."""
+    header = "-" * 53 + '\n'
+    header += "%-20s %6s\t%5s\t%5s\t%5s\n" % ("Critter", "Elo", "Won", "Drawn", "Lost")
+    header += "-" * 53 + '\n'
+    return header + '\n'.join(['%-20s %6.0f\t%5d\t%5d\t%5d' % (name, rating, won, drawn, lost) for name, rating, (won, drawn, lost) in self.standings()])
+
+
+def run_league(contenders, width, height, num, iterations, matches, seed, workers=None, cache=None):
+  """
+  Plays every pair of contenders against each other in matches head-to-head matches, on the seeds critter_sweep derives from seed, across a pool of worker processes, and returns the League along with how many of the matches were played rather than found in cache (a critter_sweep.ResultCache, or None).
+
+  Only matches are cached, never ratings: these are replayed from every result each time, round by round (every pair's first match, then every pair's second, ...) in a fixed order, so the same results always give the same ratings. With a cache, adding or editing a critter only plays the matches involving it.
+  """
+  cells = [critter_sweep.Cell(width, height, num, iterations, pair) for pair in fixtures(contenders)]
+  sweep = critter_sweep.run_sweep(cells, matches, seed, workers, cache)
+  league = League([contender.__name__ for contender in contenders])
+  for match in range(matches):
+    for cell, results, cached in sweep:
+      names = [contender.__name__ for contender in cell.contenders]
+      league.add({name: (results.wins[name][match], results.alive[name][match]) for name in names})
+  played = sum(results.matches - cached for cell, results, cached in sweep)
+  return league, played
+
+
+class LeagueException(Exception):
+  pass
@@ -0,0 +1,387 @@
+import array
+import struct
+import sys
+import threading
+import constants
+import critter_sim
+
+# A log is a header followed by blocks, each starting with a one-byte type:
+#
+#   CLASS     a critter class's index and name, written the first time the class is seen.
+#   SPAWN     one critter added to the board outside of a tick.
+#   KEYFRAME  the whole board (every critter's id, class, cell and looks) and the class stats, every keyframe_interval ticks and after a reset.
+#   TICK      everything that happened in one tick, grouped by kind: moves (id, new cell), fights (attacker id, defender id, attacks, attacker won), deaths (id), then looks that changed (id, color, char).
+#   INDEX     written on close: the class names and the file offset of every keyframe, so a replay can seek without scanning.
+#
+# A trailer holding the offset of the INDEX block ends the file. Critter ids are the ids the simulation's Grid gave out. Every number is little-endian.
+MAGIC = b'CRLG'
+TRAILER_MAGIC = b'CRLX'
+VERSION = 1
+
+CLASS = 1
+SPAWN = 2
+KEYFRAME = 3
+TICK = 4
+INDEX = 5
+
+HEADER = struct.Struct('<4sBIII')  # magic, version, width, height, keyframe interval
+CLASS_BLOCK = struct.Struct('<HH')  # class index, name length; followed by the utf-8 name
+KEYFRAME_BLOCK = struct.Struct('<III')  # tick, critters, classes; followed by a CRITTER per critter and a STATS per class
+TICK_BLOCK = struct.Struct('<IIIII')  # tick, moves, fights, deaths, looks; followed by the u32 arrays and a LOOKS per changed critter
+INDEX_BLOCK = struct.Struct('<II')  # keyframes, classes; followed by an INDEX_ENTRY per keyframe and a name per class
+INDEX_ENTRY = struct.Struct('<IQ')  # tick, file offset of the keyframe's block
+TRAILER = struct.Struct('<Q4s')  # file offset of the INDEX block, TRAILER_MAGIC
+
+CRITTER = struct.Struct('<IHI')  # id, class index, cell; followed by LOOKS without the id
+LOOKS = struct.Struct('<IBBBB')  # id, r, g, b, char length; followed by the utf-8 char
+STATS = struct.Struct('<III')  # kills, alive, count
+NAME = struct.Struct('<H')  # name length; followed by the utf-8 name
+
+BIG_ENDIAN = sys.byteorder == 'big'
+
+
+def to_bytes(values):
+  """Returns the bytes of an array('I') in little-endian order."""
+  if BIG_ENDIAN:
+    values = array.array('I', values)
+    values.byteswap()
+  return values.tobytes()
+
+
+def from_bytes(data):
+  """Returns an array('I') read from little-endian bytes."""
+  values = array.array('I')
+  values.frombytes(data)
+  if BIG_ENDIAN:
+    values.byteswap()
+  return values
+
+
+def pack_looks(critter_id, char, color):
+  char = str(char).encode()
+  return LOOKS.pack(critter_id, color[0], color[1], color[2], len(char)) + char
+
+
+class Recorder():
+  """
+  Streams a compact binary trace of a CritterSim to a file: the moves, fights and deaths of every tick, and a keyframe of the whole board every keyframe_interval ticks so that a Replay can seek. Each tick's events are packed into typed arrays and written in one go through a large file buffer, so recording costs little next to running the critters.
+
+  Create it once the critters have been added, which attaches it to the simulation, and close() it at the end. With appearance, every critter's char and color are polled after each tick and changes are logged, so a replay looks exactly like the run; without it, critters keep the looks they had when they were spawned or last keyframed.
+  """
+  def __init__(self, path, sim, keyframe_interval=1000, appearance=True):
+    self.sim = sim
+    self.keyframe_interval = keyframe_interval
+    self.appearance = appearance
+    self.file = open(path, 'wb', buffering=1 << 20)
+    self.file.write(HEADER.pack(MAGIC, VERSION, sim.width, sim.height, keyframe_interval))
+
+    self.class_ids = {}
+    self.index = []
+
+    # the looks last written for each critter id
+    self.looks = {}
+
+    # events of the tick in progress
+    self.moves = array.array('I')
+    self.fights = array.array('I')
+    self.deaths = array.array('I')
+
+    sim.recorder = self
+    self.keyframe()
+
+  def class_id(self, critter_class):
+    """Returns the index of critter_class in the log, writing a CLASS block the first time it is seen."""
+    class_id = self.class_ids.get(critter_class)
+    if class_id is None:
+      class_id = self.class_ids[critter_class] = len(self.class_ids)
+      name = critter_class.__name__.encode()
+      self.file.write(bytes((CLASS,)) + CLASS_BLOCK.pack(class_id, len(name)) + name)
+    return class_id
+
+  def critter_entry(self, critter):
+    """Returns the CRITTER entry of a critter on the board, as used by SPAWN and KEYFRAME blocks."""
+    critter_id = self.sim.grid.id_of(critter)
+    char, color = critter.get_char(), critter.get_color()
+    self.looks[critter_id] = (char, color)
+    return CRITTER.pack(critter_id, self.class_ids[critter.__class__], self.sim.critter_cells[critter]) + pack_looks(critter_id, char, color)[4:]
+
+  def spawn(self, critter):
+    self.class_id(critter.__class__)
+    self.file.write(bytes((SPAWN,)) + self.critter_entry(critter))
+
+  def keyframe(self):
+    """Writes the whole board and the class stats. A keyframe at tick 0 (after a reset) starts a new timeline, and replays only see the latest one."""
+    sim = self.sim
+    for critter_class in sim.critter_class_stats:
+      self.class_id(critter_class)
+    if sim.move_count == 0:
+      self.index = []
+      self.looks = {}
+    self.index.append((sim.move_count, self.file.tell()))
+
+    entries = [self.critter_entry(c) for c in sim.critter_cells]
+    stats = []
+    for critter_class in self.class_ids:
+      class_stats = sim.critter_class_stats.get(critter_class, critter_sim.ClassStats())
+      stats.append(STATS.pack(class_stats.kills, class_stats.alive, class_stats.count))
+    self.file.write(bytes((KEYFRAME,)) + KEYFRAME_BLOCK.pack(sim.move_count, len(entries), len(stats)) + b''.join(entries) + b''.join(stats))
+
+  def move(self, critter_id, cell):
+    self.moves.append(critter_id)
+    self.moves.append(cell)
+
+  def fight(self, critter1_id, critter2_id, attack1, attack2, won):
+    self.fights.extend((critter1_id, critter2_id, constants.VALID_ATTACKS.index(attack1) * 3 + constants.VALID_ATTACKS.index(attack2), won))
+
+  def death(self, critter_id):
+    self.deaths.append(critter_id)
+    self.looks.pop(critter_id, None)
+
+  def end_tick(self):
+    """Writes the tick the simulation just finished, and a keyframe if one is due."""
+    sim = self.sim
+    changed = []
+    if self.appearance:
+      grid = sim.grid
+      looks = self.looks
+      for c in sim.critters:
+        critter_id = grid.id_of(c)
+        char, color = c.get_char(), c.get_color()
+        if looks.get(critter_id) != (char, color):
+          looks[critter_id] = (char, color)
+          changed.append(pack_looks(critter_id, char, color))
+
+    self.file.write(bytes((TICK,)) + TICK_BLOCK.pack(sim.move_count, len(self.moves) // 2, len(self.fights) // 4, len(self.deaths), len(changed))
+                    + to_bytes(self.moves) + to_bytes(self.fights) + to_bytes(self.deaths) + b''.join(changed))
+    del self.moves[:]
+    del self.fights[:]
+    del self.deaths[:]
+
+    if sim.move_count % self.keyframe_interval == 0:
+      self.keyframe()
+
+  def close(self):
+    """Writes the index and trailer, closes the file and detaches from the simulation."""
+    offset = self.file.tell()
+    names = [critter_class.__name__.encode() for critter_class in self.class_ids]
+    self.file.write(bytes((INDEX,)) + INDEX_BLOCK.pack(len(self.index), len(names))
+                    + b''.join(INDEX_ENTRY.pack(tick, entry) for tick, entry in self.index)
+                    + b''.join(NAME.pack(len(name)) + name for name in names)
+                    + TRAILER.pack(offset, TRAILER_MAGIC))
+    self.file.close()
+    self.sim.recorder = None
+
+
+class ReplayCritter():
+  """
+  Stands in for a recorded critter. It knows nothing but how it looked.
+  """
+  __slots__ = ('char', 'color')
+
+  def __init__(self, char, color):
+    self.char = char
+    self.color = color
+
+  def get_char(self):
+    return self.char
+
+  def get_color(self):
+    return self.color
+
+
+class Replay():
+  """
+  Plays back a log written by Recorder without running any critter code, so playback speed is bound by reading the file. It looks enough like a CritterSim (width, height, grid, critter_class_stats, move_count, update() and reset()) for CritterGUI to display it, and can seek() to any tick by starting from the closest keyframe before it.
+  """
+  def __init__(self, path):
+    self.file = open(path, 'rb', buffering=1 << 20)
+    magic, version, self.width, self.height, self.keyframe_interval = HEADER.unpack(self.file.read(HEADER.size))
+    if magic != MAGIC or version != VERSION:
+      raise LogException("Error: %s is not a version %d critter log." % (path, VERSION))
+    self.data_start = self.file.tell()
+    self.list_lock = threading.Lock()
+    self.changed_cells = None
+
+    # one stand-in class per recorded critter class, named after it
+    self.classes = []
+    self.critter_class_stats = {}
+
+    self.index = self.read_index()
+    if not self.index:
+      raise LogException("Error: %s has no keyframes." % path)
+    self.seek(0)
+
+  def define_class(self, class_id, name):
+    if class_id == len(self.classes):
+      self.classes.append(type(name, (ReplayCritter,), {'__slots__': ()}))
+
+  def class_stats(self, class_id):
+    """Returns the stats of a class, which takes part in the replay from the moment a keyframe or spawn mentions it."""
+    critter_class = self.classes[class_id]
+    if critter_class not in self.critter_class_stats:
+      self.critter_class_stats[critter_class] = critter_sim.ClassStats()
+    return self.critter_class_stats[critter_class]
+
+  def read_index(self):
+    """Returns the (tick, offset) of every keyframe of the latest timeline, from the INDEX block if the log was closed properly, or by scanning the whole file if not."""
+    self.file.seek(0, 2)
+    end = self.file.tell()
+    if end - self.data_start >= TRAILER.size:
+      self.file.seek(end - TRAILER.size)
+      offset, magic = TRAILER.unpack(self.file.read(TRAILER.size))
+      if magic == TRAILER_MAGIC:
+        self.file.seek(offset + 1)
+        keyframes, classes = INDEX_BLOCK.unpack(self.file.read(INDEX_BLOCK.size))
+        index = [INDEX_ENTRY.unpack(self.file.read(INDEX_ENTRY.size)) for i in range(keyframes)]
+        for class_id in range(classes):
+          length, = NAME.unpack(self.file.read(NAME.size))
+          self.define_class(class_id, self.file.read(length).decode())
+        return index
+
+    index = []
+    self.file.seek(self.data_start)
+    while True:
+      offset = self.file.tell()
+      kind = self.file.read(1)
+      if not kind or kind[0] == INDEX:
+        return index
+      if kind[0] == KEYFRAME:
+        tick = KEYFRAME_BLOCK.unpack(self.file.read(KEYFRAME_BLOCK.size))[0]
+        if tick == 0:
+          index = []
+        index.append((tick, offset))
+        self.file.seek(offset + 1)
+      self.read_block(kind[0], skip=True)
+
+  def seek(self, tick):
+    """Moves the replay to just after the given tick (0 is the starting board), or to the end of the log if it is shorter. Only the ticks since the closest keyframe are played."""
+    start, offset = [entry for entry in self.index if entry[0] <= tick][-1]
+    self.file.seek(offset + 1)
+    self.read_block(KEYFRAME)
+    while self.move_count < tick and self.update():
+      pass
+
+  def reset(self):
+    self.seek(0)
+
+  def track_changes(self):
+    """Starts keeping track of the cells each update() changes, like CritterSim.track_changes."""
+    if self.changed_cells is None:
+      self.changed_cells = set()
+
+  def take_changed_cells(self):
+    with self.list_lock:
+      cells, self.changed_cells = self.changed_cells, set()
+    return cells
+
+  def update(self):
+    """Plays the next tick. Returns False, changing nothing, at the end of the log."""
+    while True:
+      kind = self.file.read(1)
+      if not kind or kind[0] == INDEX:
+        self.file.seek(-len(kind), 1)
+        return False
+      self.read_block(kind[0], skip=kind[0] == KEYFRAME)
+      if kind[0] == TICK:
+        return True
+
+  def read_looks(self, critter_id=None):
+    """Reads a LOOKS entry (without its id if critter_id is given) and returns (id, char, color)."""
+    if critter_id is None:
+      critter_id, r, g, b, length = LOOKS.unpack(self.file.read(LOOKS.size))
+    else:
+      r, g, b, length = LOOKS.unpack(b'\0\0\0\0' + self.file.read(LOOKS.size - 4))[1:]
+    return critter_id, self.file.read(length).decode(), constants.Color(r, g, b)
+
+  def place(self, critter_id, class_id, cell, char, color):
+    c = self.classes[class_id](char, color)
+    self.critters[critter_id] = c
+    self.cells[critter_id] = cell
+    self.class_of[critter_id] = class_id
+    self.grid.set(cell % self.width, cell // self.width, c)
+
+  def read_block(self, kind, skip=False):
+    """Reads the block whose type byte was just read and applies it, or only moves past it if skip is set."""
+    read = self.file.read
+    if kind == CLASS:
+      class_id, length = CLASS_BLOCK.unpack(read(CLASS_BLOCK.size))
+      self.define_class(class_id, read(length).decode())
+    elif kind == SPAWN:
+      critter_id, class_id, cell = CRITTER.unpack(read(CRITTER.size))
+      critter_id, char, color = self.read_looks(critter_id)
+      if not skip:
+        self.place(critter_id, class_id, cell, char, color)
+        stats = self.class_stats(class_id)
+        stats.alive += 1
+        stats.count += 1
+    elif kind == KEYFRAME:
+      tick, count, classes = KEYFRAME_BLOCK.unpack(read(KEYFRAME_BLOCK.size))
+      if not skip:
+        self.move_count = tick
+        self.grid = critter_sim.Grid(self.width, self.height)
+        self.critters = {}
+        self.cells = {}
+        self.class_of = {}
+        self.critter_class_stats = {}
+      for i in range(count):
+        critter_id, class_id, cell = CRITTER.unpack(read(CRITTER.size))
+        critter_id, char, color = self.read_looks(critter_id)
+        if not skip:
+          self.place(critter_id, class_id, cell, char, color)
+      for class_id in range(classes):
+        kills, alive, count = STATS.unpack(read(STATS.size))
+        if not skip:
+          stats = self.class_stats(class_id)
+          stats.kills, stats.alive, stats.count = kills, alive, count
+    elif kind == TICK:
+      tick, moves, fights, deaths, looks = TICK_BLOCK.unpack(read(TICK_BLOCK.size))
+      if skip:
+        self.file.seek(8 * moves + 16 * fights + 4 * deaths, 1)
+        for i in range(looks):
+          self.read_looks()
+        return
+      self.play_tick(tick, from_bytes(read(8 * moves)), from_bytes(read(16 * fights)), from_bytes(read(4 * deaths)), looks)
+    else:
+      raise LogException("Error: unexpected block type %d in critter log." % kind)
+
+  def play_tick(self, tick, moves, fights, deaths, looks):
+    """
+    Applies one tick. Events are grouped by kind rather than in the order they happened, which still gives the right board: a critter that is displaced by a move dies later in the same tick, and a dead critter's cell is only emptied if nobody has moved in since.
+    """
+    grid = self.grid
+    cells = self.cells
+    changed = self.changed_cells if self.changed_cells is not None else set()
+    with self.list_lock:
+      for i in range(0, len(moves), 2):
+        critter_id, cell = moves[i], moves[i + 1]
+        changed.add(cells[critter_id])
+        changed.add(cell)
+        grid.move_cell(cells[critter_id], cell)
+        cells[critter_id] = cell
+      for i in range(0, len(fights), 4):
+        winner = fights[i] if fights[i + 3] else fights[i + 1]
+        self.critter_class_stats[self.classes[self.class_of[winner]]].kills += 1
+      for critter_id in deaths:
+        c = self.critters.pop(critter_id)
+        cell = cells.pop(critter_id)
+        changed.add(cell)
+        if grid.critters[grid.ids[cell]] is c:
+          grid.clear_cell(cell)
+        grid.release(c)
+        self.critter_class_stats[self.classes[self.class_of.pop(critter_id)]].alive -= 1
+      for i in range(looks):
+        critter_id, char, color = self.read_looks()
+        c = self.critters[critter_id]
+        c.char, c.color = char, color
+        changed.add(cells[critter_id])
+      self.move_count = tick
+
+  def __str__(self):
+    return critter_sim.CritterSim.__str__(self)
+
+  def close(self):
+    self.file.close()
+
+
+class LogException(Exception):
+  pass
@@ -0,0 +1,106 @@
+import collections
+import csv
+import json
+import threading
+import time
+
+# How many samples the ring buffer holds. Should the writer fall this far behind, the oldest samples are dropped rather than the simulation made to wait.
+CAPACITY = 4096
+
+# The writer wakes up once this many samples are waiting, or this many seconds after it last wrote, whichever comes first.
+BATCH = 64
+FLUSH_INTERVAL = 1.0
+
+
+class Metrics():
+  """
+  Streams the population dynamics of a simulation to a JSONL or CSV file while it runs. Every interval ticks it takes one sample: the tick, each critter class's alive and kills, and the fights, moves (critters that moved onto another cell) and milliseconds per tick, averaged over the interval, along with the slowest tick. Everything comes from counters the simulation keeps up to date as it goes (ClassStats, fight_count and step_count), so sampling never scans the board.
+
+  Samples go into a bounded ring buffer, which a writer thread formats and writes in batches through a large file buffer, so a slow disk never holds the simulation up: if the writer falls CAPACITY samples behind, the oldest are dropped and counted in dropped. Call tick() after every update and close() at the end, which writes the last, partial interval.
+  """
+  def __init__(self, path, sim, interval=100, format=None):
+    self.sim = sim
+    self.interval = interval
+    self.format = format or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+    self.names = [critter_class.__name__ for critter_class in sim.critter_class_stats]
+    self.file = open(path, 'w', buffering=1 << 20, newline='')
+    if self.format == 'csv':
+      self.csv = csv.writer(self.file)
+      self.csv.writerow(['tick', 'fights', 'moves', 'tick_ms', 'max_tick_ms'] + ['%s alive' % name for name in self.names] + ['%s kills' % name for name in self.names])
+
+    self.buffer = collections.deque(maxlen=CAPACITY)
+    self.dropped = 0
+    self.start_interval()
+
+    self.wake = threading.Event()
+    self.closed = False
+    self.writer = threading.Thread(target=self.write_loop, daemon=True)
+    self.writer.start()
+
+  def start_interval(self):
+    sim = self.sim
+    self.sampled_tick = sim.move_count
+    self.sampled_fights = sim.fight_count
+    self.sampled_steps = sim.step_count
+    self.sampled_at = self.last_tick_at = time.perf_counter()
+    self.slowest = 0
+
+  def tick(self):
+    """Meant to be called after every tick."""
+    now = time.perf_counter()
+    self.slowest = max(self.slowest, now - self.last_tick_at)
+    self.last_tick_at = now
+    if self.sim.move_count < self.sampled_tick:
+      # the simulation was reset, and its counters with it
+      self.start_interval()
+    elif self.sim.move_count - self.sampled_tick >= self.interval:
+      self.sample()
+
+  def sample(self):
+    """Puts a sample of the interval since the last one into the ring buffer, to be formatted and written by the writer thread."""
+    sim = self.sim
+    ticks = sim.move_count - self.sampled_tick
+    if len(self.buffer) == self.buffer.maxlen:
+      self.dropped += 1
+    self.buffer.append((sim.move_count, ticks, sim.fight_count - self.sampled_fights, sim.step_count - self.sampled_steps,
+                        self.last_tick_at - self.sampled_at, self.slowest, [(stats.alive, stats.kills) for stats in sim.critter_class_stats.values()]))
+    self.start_interval()
+    if len(self.buffer) >= BATCH:
+      self.wake.set()
+
+  def write_loop(self):
+    while not self.closed:
+      self.wake.wait(FLUSH_INTERVAL)
+      self.wake.clear()
+      self.write()
+
+  def write(self):
+    """Writes every sample in the ring buffer."""
+    rows = []
+    while self.buffer:
+      tick, ticks, fights, steps, elapsed, slowest, stats = self.buffer.popleft()
+      row = (tick, round(fights / ticks, 3), round(steps / ticks, 3), round(1000 * elapsed / ticks, 3), round(1000 * slowest, 3))
+      if self.format == 'csv':
+        rows.append(row + tuple(alive for alive, kills in stats) + tuple(kills for alive, kills in stats))
+      else:
+        rows.append(json.dumps({
+          'tick': tick, 'fights': row[1], 'moves': row[2], 'tick_ms': row[3], 'max_tick_ms': row[4],
+          'alive': {name: alive for name, (alive, kills) in zip(self.names, stats)},
+          'kills': {name: kills for name, (alive, kills) in zip(self.names, stats)},
+        }) + '\n')
+    if rows:
+      if self.format == 'csv':
+        self.csv.writerows(rows)
+      else:
+        self.file.write(''.join(rows))
+      # so that the file can be followed and plotted while the run goes on
+      self.file.flush()
+
+  def close(self):
+    if self.sim.move_count > self.sampled_tick:
+      self.sample()
+    self.closed = True
+    self.wake.set()
+    self.writer.join()
+    self.write()
+    self.file.close()
@@ -0,0 +1,204 @@
+import json
+import math
+import time
+
+# The critter methods the simulation calls, and the parts of a tick spent in the engine itself.
+CALLBACKS = ('get_move', 'fight', 'recover', 'get_char', 'get_color')
+PHASES = ('shuffle', 'moves', 'fights', 'bookkeeping')
+
+# Call durations are counted in logarithmic buckets rather than kept, so a long run's profile takes constant memory. BUCKETS_PER_DOUBLING buckets per power of two put percentiles within about 9% of the real value.
+BUCKETS_PER_DOUBLING = 8
+BUCKETS = 64 * BUCKETS_PER_DOUBLING
+
+
+class CallStats():
+  """
+  Number, total duration and duration histogram of the calls to one callback of one critter class.
+  """
+  __slots__ = ('calls', 'total', 'buckets')
+
+  def __init__(self):
+    self.calls = 0
+    self.total = 0
+    self.buckets = [0] * BUCKETS
+
+  def add(self, ns):
+    self.calls += 1
+    self.total += ns
+    self.buckets[min(int(BUCKETS_PER_DOUBLING * math.log2(ns + 1)), BUCKETS - 1)] += 1
+
+  def percentile(self, q):
+    """Returns the duration in ns that q percent of the calls took at most, rounded up to the top of its bucket."""
+    if not self.calls:
+      return 0
+    rank = math.ceil(self.calls * q / 100)
+    seen = 0
+    for bucket, count in enumerate(self.buckets):
+      seen += count
+      if seen >= rank:
+        return 2 ** ((bucket + 1) / BUCKETS_PER_DOUBLING) - 1
+    return 0
+
+  def to_dict(self):
+    return {'calls': self.calls, 'total_ms': self.total / 1e6, 'mean_us': self.total / self.calls / 1e3 if self.calls else 0, 'p99_us': self.percentile(99) / 1e3}
+
+
+class Profiler():
+  """
+  Times every callback the simulation makes into each critter class, and the engine's own work per tick, split into shuffle, moves (everything in update outside of callbacks, fights and kills), fights (CritterSim.fight outside of callbacks) and bookkeeping (getting rid of the dead, which update does holding list_lock).
+
+  Nothing in the simulation checks whether it is being profiled: install() replaces the critter classes' callbacks and the simulation's update, fight, shuffle and lock with timed wrappers, and uninstall() puts the originals back, so an unprofiled run costs exactly what it did.
+  """
+  def __init__(self, sim, classes):
+    self.sim = sim
+    self.classes = list(classes)
+    self.stats = {critter_class: {name: CallStats() for name in CALLBACKS} for critter_class in self.classes}
+    self.phases = dict.fromkeys(PHASES, 0)
+    self.ticks = 0
+
+    # time spent in outermost callbacks, so nested ones (a fight() asking its opponent's info for a char) are not subtracted from the engine's time twice
+    self.depth = 0
+    self.callback_ns = 0
+    self.fight_ns = 0
+
+    self.originals = []
+    self.own = []
+
+  def install(self):
+    # look up every original before wrapping anything, so a class inheriting from another contender does not wrap its wrapper
+    originals = [(critter_class, name, critter_class.__dict__.get(name), getattr(critter_class, name)) for critter_class in self.classes for name in CALLBACKS]
+    for critter_class, name, own, method in originals:
+      setattr(critter_class, name, self.timed_callback(method, self.stats[critter_class][name]))
+      self.originals.append((critter_class, name, own))
+
+    sim = self.sim
+    # what each wrapped method was on the simulation itself, if anything (another wrapper, like critter_budget's), to put back on uninstall
+    self.own = [(obj, name, obj.__dict__.get(name)) for obj, name in ((sim, 'update'), (sim, 'fight'), (sim.random, 'shuffle'))]
+    sim.update = self.timed_update(sim.update)
+    sim.fight = self.timed_fight(sim.fight)
+    sim.random.shuffle = self.timed_phase(sim.random.shuffle, 'shuffle')
+    sim.list_lock = TimedLock(sim.list_lock, self)
+
+  def uninstall(self):
+    for critter_class, name, own in self.originals:
+      if own is None:
+        delattr(critter_class, name)
+      else:
+        setattr(critter_class, name, own)
+    self.originals = []
+
+    for obj, name, own in self.own:
+      restore(obj, name, own)
+    self.own = []
+    self.sim.list_lock = self.sim.list_lock.lock
+
+  def timed_callback(self, method, stats):
+    def timed(*args):
+      self.depth += 1
+      start = time.perf_counter_ns()
+      try:
+        return method(*args)
+      finally:
+        elapsed = time.perf_counter_ns() - start
+        self.depth -= 1
+        stats.add(elapsed)
+        if not self.depth:
+          self.callback_ns += elapsed
+    return timed
+
+  def timed_phase(self, method, phase):
+    def timed(*args):
+      start = time.perf_counter_ns()
+      try:
+        return method(*args)
+      finally:
+        self.phases[phase] += time.perf_counter_ns() - start
+    return timed
+
+  def timed_fight(self, fight):
+    def timed(*args):
+      callbacks = self.callback_ns
+      start = time.perf_counter_ns()
+      try:
+        return fight(*args)
+      finally:
+        elapsed = time.perf_counter_ns() - start
+        inside = self.callback_ns - callbacks
+        self.phases['fights'] += elapsed - inside
+        # moves are worked out as what is left of the tick, so take the fight out of it once, callbacks included
+        self.fight_ns += elapsed - inside
+    return timed
+
+  def timed_update(self, update):
+    def timed():
+      self.ticks += 1
+      callbacks = self.callback_ns
+      shuffle = self.phases['shuffle']
+      bookkeeping = self.phases['bookkeeping']
+      self.fight_ns = 0
+      start = time.perf_counter_ns()
+      try:
+        return update()
+      finally:
+        elapsed = time.perf_counter_ns() - start
+        engine = elapsed - (self.callback_ns - callbacks)
+        self.phases['moves'] += engine - (self.phases['shuffle'] - shuffle) - (self.phases['bookkeeping'] - bookkeeping) - self.fight_ns
+    return timed
+
+  def to_dict(self):
+    """Returns the profile as plain dicts and numbers, ready for json."""
+    return {
+      'ticks': self.ticks,
+      'classes': {critter_class.__name__: {name: stats.to_dict() for name, stats in callbacks.items()} for critter_class, callbacks in self.stats.items()},
+      'engine': {phase: {'total_ms': ns / 1e6, 'per_tick_ms': ns / 1e6 / self.ticks if self.ticks else 0} for phase, ns in self.phases.items()},
+    }
+
+  def save(self, path):
+    with open(path, 'w') as f:
+      json.dump(self.to_dict(), f, indent=2)
+
+  def __str__(self):
+    """
+    Returns a formatted table of the callbacks of each class, slowest class first, followed by the engine's time per tick.
+    """
+    header = "-" * 72 + '\n'
+    header += "%-20s %-10s %10s %11s %9s %9s\n" % ("Critter", "Callback", "Calls", "Total (ms)", "Mean (us)", "p99 (us)")
+    header += "-" * 72 + '\n'
+
+    rows = []
+    for critter_class, callbacks in sorted(self.stats.items(), key=lambda item: -sum(stats.total for stats in item[1].values())):
+      for name, stats in callbacks.items():
+        if stats.calls:
+          profile = stats.to_dict()
+          rows.append('%-20s %-10s %10d %11.1f %9.2f %9.2f' % (critter_class.__name__, name, profile['calls'], profile['total_ms'], profile['mean_us'], profile['p99_us']))
+
+    engine = '\n\n%-20s %11s %12s\n' % ("Engine", "Total (ms)", "ms per tick")
+    engine += '\n'.join('%-20s %11.1f %12.3f' % (phase, ns / 1e6, ns / 1e6 / max(self.ticks, 1)) for phase, ns in self.phases.items())
+    return header + '\n'.join(rows) + engine
+
+
+def restore(obj, name, own):
+  """Puts back the attribute name that obj had on itself before something wrapped it, own, or removes the wrapper if it had none, so that wrappers installed on top of each other can be taken off in reverse order."""
+  if own is None:
+    obj.__dict__.pop(name, None)
+  else:
+    setattr(obj, name, own)
+
+
+class TimedLock():
+  """
+  Stands in for a simulation's list_lock while it is profiled, adding the time it is held to the bookkeeping phase.
+  """
+  def __init__(self, lock, profiler):
+    self.lock = lock
+    self.profiler = profiler
+    self.start = 0
+
+  def __enter__(self):
+    self.lock.acquire()
+    self.start = time.perf_counter_ns()
+    return self
+
+  def __exit__(self, *exc):
+    self.profiler.phases['bookkeeping'] += time.perf_counter_ns() - self.start
+    self.lock.release()
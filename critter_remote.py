@@ -0,0 +1,453 @@
+import argparse
+import asyncio
+import json
+import os
+import struct
+import sys
+import uuid
+import constants
+import critter
+import critter_budget
+import critter_index
+import critter_worker
+
+# Critters running as services, talked to over TCP (HOST:PORT) or a unix socket (unix:PATH). Every message is a FRAME: its length, then that many bytes of compact JSON. The simulation sends [ops, request], where ops are operations that need no answer, applied in order before the request, and the service answers every request with one reply.
+#
+#   HELLO  session, width, height  ->  []               first on every connection; connections with the same session share critters
+#   HAS    class name              ->  whether the service runs critters of that class
+#   LOOKS  ids                     ->  [id, char, r, g, b] per critter
+#   MOVES  infos                   ->  [id, move, char, r, g, b] per critter, in the order asked
+#   FIGHT  id, info                ->  [attack, char, r, g, b]
+#   QUIT                           ->  no reply; closes the connection
+#
+# If an operation or the request fails on the service, e.g. a SPAWN of a class it does not serve or with the wrong constructor args, or a critter raises, the rest of the message is skipped and the reply is {"error": message} instead. The connection stays open, but the simulation gives up on the service.
+#
+#   SPAWN    id, class name, constructor args
+#   RECOVER  id, won, opponent's attack
+#   FORGET   id
+#   NAME     name, which gets the next free number on this connection, starting from 1 ('.' is 0)
+#
+# An info is what a CritterInfo tells, flattened: [x, y, char, r, g, b] and the numbers of the 8 neighbors' names, in the order of constants.VALID_DIRECTIONS. In MOVES, the critter's own id comes first and its looks are left out, as the service knows them. Names are sent once per connection (NAME) and by number after that, so a tick's worth of infos is mostly small ints.
+FRAME = struct.Struct('>I')
+MAX_FRAME = 1 << 28
+
+HELLO = 0
+HAS = 1
+LOOKS = 2
+MOVES = 3
+FIGHT = 4
+QUIT = 5
+
+SPAWN = 0
+RECOVER = 1
+FORGET = 2
+NAME = 3
+
+# How many connections to open to every endpoint. A critter always goes through the same one, picked by its id, so its operations arrive in order, and a tick's moves are asked for on all of them at once.
+POOL_SIZE = 2
+
+
+def encode(message):
+  """Returns message as a FRAME."""
+  data = json.dumps(message, separators=(',', ':')).encode()
+  return FRAME.pack(len(data)) + data
+
+
+async def read_message(reader):
+  """Reads one FRAME from reader and returns its message."""
+  size, = FRAME.unpack(await reader.readexactly(FRAME.size))
+  if size > MAX_FRAME:
+    raise RemoteException("Error: a %d byte message is too big." % size)
+  return json.loads(await reader.readexactly(size))
+
+
+async def gather(coroutines):
+  """Runs coroutines concurrently and returns their results, in order. Gathering has to start inside the loop that runs them."""
+  return await asyncio.gather(*coroutines)
+
+
+async def open_connection(address):
+  """Connects to address, as HOST:PORT or unix:PATH, and returns a (reader, writer) pair."""
+  if address.startswith('unix:'):
+    return await asyncio.open_unix_connection(address[len('unix:'):])
+  host, port = address.rsplit(':', 1)
+  return await asyncio.open_connection(host, int(port))
+
+
+class Connection():
+  """
+  One connection of an Endpoint's pool. Operations on the critters it handles are queued and sent ahead of its next request.
+  """
+  def __init__(self, reader, writer):
+    self.reader = reader
+    self.writer = writer
+    self.ops = []
+    self.names = {'.': 0}
+
+  def name_id(self, name):
+    name_id = self.names.get(name)
+    if name_id is None:
+      name_id = self.names[name] = len(self.names)
+      self.ops.append((NAME, name))
+    return name_id
+
+  def info(self, info, looks=True):
+    """Returns a CritterInfo as an info of the wire format, without the looks unless looks."""
+    entry = list(info.get_pos())
+    if looks:
+      color = info.get_color()
+      entry += [info.get_char(), color[0], color[1], color[2]]
+    return entry + [self.name_id(name) for name in info.get_neighbors()]
+
+  async def exchange(self, request):
+    """Sends the queued operations and request, and returns the reply. Raises a RemoteException if the service answers with an error."""
+    self.writer.write(encode([self.ops, request]))
+    self.ops = []
+    await self.writer.drain()
+    reply = await read_message(self.reader)
+    if isinstance(reply, dict):
+      raise RemoteException("Error: the critter service failed: %s" % reply.get('error'))
+    return reply
+
+  async def close(self):
+    try:
+      self.writer.write(encode([self.ops, (QUIT,)]))
+      self.writer.close()
+      await self.writer.wait_closed()
+    except OSError:
+      pass
+
+
+class Endpoint():
+  """
+  The simulation's end of one critter service, holding a pool of connections to it. Every critter class added from the same address shares the endpoint, so a tick costs one round trip for all of their moves, spread over the pool, plus one per fight.
+  """
+  def __init__(self, remote, address):
+    self.remote = remote
+    self.address = address
+    self.connections = []
+    self.proxies = []
+    self.critters = {}
+    self.next_id = 0
+    # proxies spawned since the last reply, whose looks are not known yet
+    self.stale = []
+    self.dead = False
+    # why the service was given up on, once it is
+    self.error = None
+    # round trips made, and how many of them were for fights
+    self.round_trips = 0
+    self.fights = 0
+
+  async def connect(self, size):
+    for i in range(size):
+      reader, writer = await open_connection(self.address)
+      self.connections.append(Connection(reader, writer))
+    remote = self.remote
+    return await self.exchange([(connection, (HELLO, remote.session, remote.sim.width, remote.sim.height)) for connection in self.connections])
+
+  def connection_of(self, critter_id):
+    return self.connections[critter_id % len(self.connections)]
+
+  async def exchange(self, requests):
+    """Sends every (connection, request) of requests at once and returns the replies, in the same order, or None if the service did not answer them all within the timeout, in which case it is given up on."""
+    self.round_trips += 1
+    try:
+      return await asyncio.wait_for(asyncio.gather(*[connection.exchange(request) for connection, request in requests]), self.remote.timeout)
+    except (OSError, EOFError, ValueError, RemoteException, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+      self.error = str(e) or e.__class__.__name__
+      self.kill()
+      return None
+
+  def kill(self):
+    self.dead = True
+    for connection in self.connections:
+      connection.writer.close()
+    for proxy in self.proxies:
+      stats = self.remote.sim.critter_class_stats.get(proxy)
+      if stats is not None:
+        stats.violations += 1
+        stats.disqualified = True
+
+  def fetch_looks(self):
+    stale, self.stale = self.stale, []
+    if self.dead:
+      return
+    asked = {}
+    for c in stale:
+      asked.setdefault(self.connection_of(c.id), []).append(c.id)
+    replies = self.remote.run(self.exchange([(connection, (LOOKS, ids)) for connection, ids in asked.items()]))
+    for reply in replies or ():
+      for critter_id, char, r, g, b in reply:
+        c = self.critters[critter_id]
+        c.char = char
+        c.color = constants.Color(r, g, b)
+
+  def fight(self, c, opp_info):
+    if self.dead:
+      return critter_budget.DEFAULT_ATTACK
+    connection = self.connection_of(c.id)
+    self.fights += 1
+    replies = self.remote.run(self.exchange([(connection, (FIGHT, c.id, connection.info(opp_info)))]))
+    if replies is None:
+      return critter_budget.DEFAULT_ATTACK
+    attack, c.char, r, g, b = replies[0]
+    c.color = constants.Color(r, g, b)
+    return attack if attack in constants.VALID_ATTACKS else critter_budget.DEFAULT_ATTACK
+
+  async def close(self):
+    if not self.dead:
+      await asyncio.gather(*[connection.close() for connection in self.connections])
+
+
+class ServiceCritter(critter.Critter):
+  """
+  Stands in for a critter running in a critter service. Remote.remote() makes a subclass of it per remote class, named after it, so that it can be added to a simulation and shows up in the stats as that class. Moves are fetched for all critters at the start of each tick, and looks come back with every reply.
+  """
+  endpoint = None
+
+  def __init__(self, *args):
+    endpoint = self.endpoint
+    self.id = endpoint.next_id
+    endpoint.next_id += 1
+    endpoint.critters[self.id] = self
+    endpoint.connection_of(self.id).ops.append((SPAWN, self.id, self.__class__.__name__, args))
+    endpoint.stale.append(self)
+
+    self.move = critter_budget.DEFAULT_MOVE
+    self.char = '?'
+    self.color = constants.BLACK
+
+  def get_char(self):
+    if self.endpoint.stale:
+      self.endpoint.fetch_looks()
+    return self.char
+
+  def get_color(self):
+    if self.endpoint.stale:
+      self.endpoint.fetch_looks()
+    return self.color
+
+  def get_move(self, self_info):
+    return self.move
+
+  def fight(self, opp_info):
+    return self.endpoint.fight(self, opp_info)
+
+  def recover(self, won, opp_attack):
+    if not self.endpoint.dead:
+      self.endpoint.connection_of(self.id).ops.append((RECOVER, self.id, won, opp_attack))
+
+
+class Remote():
+  """
+  Plays critters that run as separate services (see serve) in a simulation, through an asyncio event loop of its own. Add the classes returned by remote() to the simulation.
+
+  At the start of every tick, every endpoint is sent all of its critters' CritterInfo snapshots at once, split over its pool of connections, and all endpoints are waited on together, so a tick costs one round trip per endpoint for moves however many critters and classes it runs. As with critter_worker.Isolation, remote critters decide their moves from how the board looked at the start of the tick, and fights cost a round trip each.
+
+  An endpoint that does not answer within timeout seconds (None waits forever), or drops the connection, is given up on and its classes disqualified: their critters stay on the board, making the default choices.
+  """
+  def __init__(self, sim, timeout=None, pool_size=POOL_SIZE):
+    self.sim = sim
+    self.timeout = timeout
+    self.pool_size = pool_size
+    self.session = uuid.uuid4().hex
+    self.loop = asyncio.new_event_loop()
+    self.endpoints = {}
+
+  def run(self, coroutine):
+    return self.loop.run_until_complete(coroutine)
+
+  def remote(self, name, address):
+    """Returns the ServiceCritter class to add to the simulation for the critter class called name served at address, connecting to it if this is the first class from there. Raises a RemoteException if it cannot be reached or does not run such critters."""
+    endpoint = self.endpoints.get(address)
+    if endpoint is None:
+      endpoint = Endpoint(self, address)
+      try:
+        connected = self.run(endpoint.connect(self.pool_size))
+      except OSError as e:
+        raise RemoteException("Error: cannot connect to the critter service at %s: %s" % (address, e))
+      if connected is None:
+        raise RemoteException("Error: the critter service at %s did not answer." % address)
+      self.endpoints[address] = endpoint
+
+    replies = self.run(endpoint.exchange([(endpoint.connections[0], (HAS, name))]))
+    if not replies or not replies[0]:
+      raise RemoteException("Error: the critter service at %s has no critter called %s." % (address, name))
+    proxy = type(name, (ServiceCritter,), {'endpoint': endpoint, '__module__': __name__, '__doc__': "%s, served at %s." % (name, address)})
+    endpoint.proxies.append(proxy)
+    return proxy
+
+  def install(self):
+    self.sim.prefetchers.append(self)
+
+  def prefetch(self, sim):
+    """Fetches every remote critter's move for this tick."""
+    batches = {endpoint: [] for endpoint in self.endpoints.values()}
+    for c in sim.critters:
+      if isinstance(c, ServiceCritter):
+        batches[c.endpoint].append(c)
+
+    asked = []
+    jobs = []
+    for endpoint, critters in batches.items():
+      # forget the critters that died since the last tick
+      alive = {c.id for c in critters}
+      for critter_id in [critter_id for critter_id in endpoint.critters if critter_id not in alive]:
+        del endpoint.critters[critter_id]
+        endpoint.connection_of(critter_id).ops.append((FORGET, critter_id))
+
+      if endpoint.dead or not critters:
+        for c in critters:
+          c.move = critter_budget.DEFAULT_MOVE
+        continue
+      endpoint.stale = []
+      infos = {connection: [] for connection in endpoint.connections}
+      for c in critters:
+        connection = endpoint.connection_of(c.id)
+        infos[connection].append([c.id] + connection.info(sim.critter_infos[c], looks=False))
+      asked.append(endpoint)
+      jobs.append(endpoint.exchange([(connection, (MOVES, connection_infos)) for connection, connection_infos in infos.items() if connection_infos]))
+
+    for endpoint, replies in zip(asked, self.run(gather(jobs))):
+      if replies is None:
+        for c in batches[endpoint]:
+          c.move = critter_budget.DEFAULT_MOVE
+        continue
+      for reply in replies:
+        for critter_id, move, char, r, g, b in reply:
+          c = endpoint.critters[critter_id]
+          c.move = move if move in constants.VALID_MOVES else critter_budget.DEFAULT_MOVE
+          c.char = char
+          c.color = constants.Color(r, g, b)
+
+  def round_trips(self):
+    """Returns how many round trips have been made to every endpoint, as a dict of address to (round trips, how many of them were for fights)."""
+    return {address: (endpoint.round_trips, endpoint.fights) for address, endpoint in self.endpoints.items()}
+
+  def close(self):
+    self.run(gather([endpoint.close() for endpoint in self.endpoints.values()]))
+    self.loop.close()
+
+
+class StubServer():
+  """
+  A critter service for testing and for running critters away from the simulation: it runs the critters of the classes load(name) returns (None for a name it does not serve), for any number of simulations at once, each of which may use many connections. Every call is made on the event loop, one request at a time.
+  """
+  def __init__(self, load):
+    self.load = load
+    self.classes = {}
+    # session -> [critters by id, open connections, board dimensions]
+    self.sessions = {}
+
+  def critter_class(self, name):
+    if name not in self.classes:
+      self.classes[name] = self.load(name)
+    return self.classes[name]
+
+  def spawn(self, name, args):
+    critter_class = self.critter_class(name)
+    if critter_class is None:
+      raise RemoteException("no critter called %s" % name)
+    return critter_class(*args)
+
+  async def handle(self, reader, writer):
+    session = None
+    names = ['.']
+    try:
+      while True:
+        ops, request = await read_message(reader)
+        critters, connections, dimensions = self.sessions[session] if session is not None else ({}, 0, None)
+        try:
+          for op in ops:
+            if op[0] == SPAWN:
+              critters[op[1]] = self.spawn(op[2], op[3])
+            elif op[0] == RECOVER:
+              critters[op[1]].recover(op[2], op[3])
+            elif op[0] == FORGET:
+              del critters[op[1]]
+            elif op[0] == NAME:
+              names.append(op[1])
+
+          if request[0] == HELLO:
+            session = request[1]
+            self.sessions.setdefault(session, [{}, 0, (request[2], request[3])])[1] += 1
+            reply = []
+          elif request[0] == HAS:
+            reply = self.critter_class(request[1]) is not None
+          elif request[0] == LOOKS:
+            reply = [[critter_id] + looks(critters[critter_id]) for critter_id in request[1]]
+          elif request[0] == MOVES:
+            reply = []
+            for info in request[1]:
+              c = critters[info[0]]
+              reply.append([info[0], c.get_move(snapshot_info(info[1:], names, dimensions, c))] + looks(c))
+          elif request[0] == FIGHT:
+            c = critters[request[1]]
+            reply = [c.fight(snapshot_info(request[2], names, dimensions))] + looks(c)
+          elif request[0] == QUIT:
+            return
+        except Exception as e:
+          # a bad request or a broken critter must not take the connection, or the other sessions, down with it
+          reply = {'error': '%s: %s' % (e.__class__.__name__, e)}
+
+        writer.write(encode(reply))
+        await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+      pass
+    finally:
+      writer.close()
+      if session is not None:
+        self.sessions[session][1] -= 1
+        if not self.sessions[session][1]:
+          del self.sessions[session]
+
+  async def serve(self, address):
+    """Serves at address, as HOST:PORT or unix:PATH, until cancelled."""
+    if address.startswith('unix:'):
+      server = await asyncio.start_unix_server(self.handle, address[len('unix:'):])
+    else:
+      host, port = address.rsplit(':', 1)
+      server = await asyncio.start_server(self.handle, host, int(port))
+    async with server:
+      await server.serve_forever()
+
+
+def looks(c):
+  char, color = c.get_char(), c.get_color()
+  return [char, color[0], color[1], color[2]]
+
+
+def snapshot_info(info, names, dimensions, c=None):
+  """Returns the SnapshotInfo for an info of the wire format. Given c, the info is one of MOVES, without its id, and the looks are c's own."""
+  if c is not None:
+    return critter_worker.SnapshotInfo((info[0], info[1]), dimensions, c.get_char(), c.get_color(), tuple(names[name_id] for name_id in info[2:]))
+  x, y, char, r, g, b = info[:6]
+  return critter_worker.SnapshotInfo((x, y), dimensions, char, constants.Color(r, g, b), tuple(names[name_id] for name_id in info[6:]))
+
+
+def serve(address, root='.'):
+  """Serves the critters found in the directory root (see critter_index) at address until interrupted."""
+  # their modules are imported by name, so from root too
+  root = os.path.abspath(root)
+  if root not in sys.path:
+    sys.path.insert(0, root)
+  index = critter_index.CritterIndex(root)
+  try:
+    asyncio.run(StubServer(index.load).serve(address))
+  except KeyboardInterrupt:
+    pass
+  finally:
+    if address.startswith('unix:') and os.path.exists(address[len('unix:'):]):
+      os.remove(address[len('unix:'):])
+
+
+class RemoteException(Exception):
+  pass
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description="Serves the critters of a directory to simulations run with --remote.")
+  parser.add_argument('address', type=str, help="where to listen, as HOST:PORT or unix:PATH.")
+  parser.add_argument('--root', default='.', type=str, metavar='', help="the directory to find critters in.")
+  args = parser.parse_args()
+  serve(args.address, args.root)
@@ -1,12 +1,21 @@
 import argparse
-import os
-import inspect
-import importlib
+import random
 import sys
 import threading
+import critter_batch
+import critter_budget
+import critter_checkpoint
+import critter_index
+import critter_league
+import critter_log
+import critter_metrics
+import critter_profile
+import critter_remote
+import critter_shard
 import critter_sim
-import critter_gui
-import critter
+import critter_sweep
+import critter_table
+import critter_worker
 
 
 def handle_input():
@@ -15,8 +24,43 @@ def handle_input():
   parser.add_argument('--no-gui', action="store_true", help="run simulation without the GUI and print results directly to the console.")
   parser.add_argument('--width', default=38, type=int, metavar='', help="width of the game board.")
   parser.add_argument('--height', default=35, type=int, metavar='', help="height of the game board.")
-  parser.add_argument('--iters', default=1000, type=int, metavar='', help="number of simulation iterations to perform (only used in no-gui mode).")
+  parser.add_argument('--iters', default=1000, type=int, metavar='', help="number of simulation iterations to perform (only used in no-gui mode). A resumed run goes on until it has performed this many in all.")
   parser.add_argument('-n', '--ncritters', default=25, type=int, metavar='', help="number of each critter to add to the simulation.")
+  parser.add_argument('--batch', default=0, type=int, metavar='', help="run up to this many independent headless matches in parallel and print aggregated results with 95%% confidence intervals, instead of a single simulation.")
+  parser.add_argument('--workers', default=None, type=int, metavar='', help="number of worker processes for --batch (defaults to the number of CPUs).")
+  parser.add_argument('--seed', default=None, type=int, metavar='', help="seed for the simulation's random choices, and for critters that use the random module, so that a run can be reproduced. In --batch mode, every match's seed is derived from it (random if not given).")
+  parser.add_argument('--min-matches', default=10, type=int, metavar='', help="minimum number of matches to play in --batch mode before stopping early.")
+  parser.add_argument('--record', default=None, type=str, metavar='', help="record every tick of the simulation to this file, for --replay.")
+  parser.add_argument('--keyframe-interval', default=1000, type=int, metavar='', help="with --record, how many ticks apart the keyframes that replays seek from are.")
+  parser.add_argument('--replay', default=None, type=str, metavar='', help="play back a file written with --record instead of running critters. With --no-gui, prints the final results.")
+  parser.add_argument('--threaded', action="store_true", help="run the simulation on its own thread, with the speed slider setting a target number of ticks per second, and draw the latest state at a fixed frame rate.")
+  parser.add_argument('--vectorized', action="store_true", help="run the simulation on the NumPy engine, which only runs TableCritters (only used in no-gui mode).")
+  parser.add_argument('--profile', action="store_true", help="time every callback of every critter class and the engine's own work per tick, and print the profile after the results (only used in no-gui mode).")
+  parser.add_argument('--profile-out', default=None, type=str, metavar='', help="with --profile, also write the profile to this file as JSON.")
+  parser.add_argument('--call-budget', default=None, type=float, metavar='', help="time budget in milliseconds for each get_move or fight call. A critter that runs over makes a default move (CENTER) or attack (ROAR) instead.")
+  parser.add_argument('--tick-budget', default=None, type=float, metavar='', help="time budget in milliseconds for all get_move and fight calls of a critter class in one tick. Once it is spent, the class's critters make default choices until the next tick.")
+  parser.add_argument('--disqualify', action="store_true", help="disqualify a critter class the first time it runs over a budget: its critters only make default choices from then on.")
+  parser.add_argument('--isolate', action="store_true", help="run each critter class in its own worker process, so that budgets also stop critters that never return. Isolated critters decide their moves from the board as it was at the start of the tick.")
+  parser.add_argument('--remote', action='append', type=str, metavar='', help="also play the critter class NAME served at ADDRESS, as NAME@ADDRESS with ADDRESS either HOST:PORT or unix:PATH (see critter_remote.py). Remote critters decide their moves from the board as it was at the start of the tick. This flag can be used multiple times.")
+  parser.add_argument('--remote-timeout', default=None, type=float, metavar='', help="with --remote, how many milliseconds a critter service may take to answer before it is given up on and its critters only make default choices.")
+  parser.add_argument('--remote-connections', default=critter_remote.POOL_SIZE, type=int, metavar='', help="with --remote, how many connections to open to every critter service.")
+  parser.add_argument('--until-one', action="store_true", help="stop once only one critter class is left alive (only used in no-gui mode).")
+  parser.add_argument('--quiet-window', default=None, type=int, metavar='', help="stop once no critter has been killed for this many iterations (only used in no-gui mode).")
+  parser.add_argument('--time-limit', default=None, type=float, metavar='', help="stop after this many seconds (only used in no-gui mode).")
+  parser.add_argument('--checkpoint', default=None, type=str, metavar='', help="save the whole simulation to this file every --checkpoint-interval iterations and when the run ends, for --resume (only used in no-gui mode).")
+  parser.add_argument('--checkpoint-interval', default=1000, type=int, metavar='', help="with --checkpoint, how many iterations apart checkpoints are saved.")
+  parser.add_argument('--resume', default=None, type=str, metavar='', help="go on with the simulation saved in this checkpoint instead of starting a new one; its critters and board size are used. With --seed, fork a new continuation instead of picking up exactly where it left off. With --batch, every match forks its own continuation.")
+  parser.add_argument('--metrics', default=None, type=str, metavar='', help="stream per-class alive and kills, fights and moves per tick and tick times to this file as they happen, as CSV if it ends in .csv and JSON lines otherwise (only used in no-gui mode).")
+  parser.add_argument('--metrics-interval', default=100, type=int, metavar='', help="with --metrics, how many iterations each line of metrics covers.")
+  parser.add_argument('--shards', default=0, type=int, metavar='', help="run the simulation in this many worker processes, each simulating some tiles of the board (see --tiles), for boards too big for one process (only used in no-gui mode). Critters take their turns tile by tile rather than in one shuffled order.")
+  parser.add_argument('--tiles', default=None, type=str, metavar='', help="the tiles of --shards, as COLUMNSxROWS, each 1 or even (defaults to enough tiles to keep every shard busy). Without --shards, runs the simulation in one process in the same order, with the same results.")
+  parser.add_argument('--memo-size', default=critter_sim.MEMO_SIZE, type=int, metavar='', help="how many decisions to remember per pure critter class (see Critter.pure), whose calls are skipped when they are in a situation they have been in before; 0 turns this off. With --no-gui, hit rates are printed after the results.")
+  parser.add_argument('--sweep', action='append', type=str, metavar='', help="run a sweep: play every combination of the values given for width, height, n, iters and critters, as KEY=VALUE,VALUE,... with critter sets written NAME+NAME, e.g. --sweep width=38,100 --sweep critters=Walker+Statue,Walker+Lookout. Keys left out take the value of the matching flag. Cells run in parallel (see --workers), and every match result is cached in %s, so a rerun only plays what changed. This flag can be used multiple times." % critter_sweep.CACHE_DIR)
+  parser.add_argument('--sweep-matches', default=1, type=int, metavar='', help="with --sweep, how many matches to play per combination; every combination plays the same seeds, derived from --seed (0 if not given).")
+  parser.add_argument('--league', action="store_true", help="play a round-robin league instead: every pair of critters in head-to-head matches on the same seeds, in parallel (see --workers), and print their Elo ratings. Match results are cached like --sweep's, so after adding or editing a critter only the matches involving it are played.")
+  parser.add_argument('--league-matches', default=10, type=int, metavar='', help="with --league, how many matches every pair plays; the seeds are derived from --seed (0 if not given).")
+  parser.add_argument('--no-cache', action="store_true", help="with --sweep or --league, neither read nor write the result cache.")
+  parser.add_argument('--no-early-stop', action="store_true", help="in --batch mode, play every match even once the ranking is statistically settled.")
 
   group = parser.add_mutually_exclusive_group()
   group.add_argument('-i', '--include', action='append', type=str, metavar='', help="if specified, the simulation is run only for the provided critters. Critters should be specified by their class name. This flag only accepts one class name; however, you can use the flag multiple times to include different critters. Cannot be used with the --exclude argument.")
@@ -29,24 +73,9 @@ def handle_input():
 
 def import_critters(root='.'):
   """
-  Finds all critter definitions in the given directory and returns them as a list of class objects. Only subclasses of Critter will be included.
+  Finds all critter definitions in the given directory and returns them as a list of class objects. Only subclasses of Critter will be included, and only the modules defining them are imported (see critter_index).
   """
-  classes = []
-
-  # check each python file in directory
-  for file in os.listdir(root):
-    if file.lower().endswith('.py'):
-      # load module
-      module_name = inspect.getmodulename(os.path.join(root,file))
-      module = importlib.import_module(module_name)
-
-      # check if module contains a Critter subclass 
-      for name, obj in inspect.getmembers(module):
-        if inspect.isclass(obj) and issubclass(obj, critter.Critter):
-          if name != "Critter":
-            classes.append(obj)
-
-  return classes
+  return critter_index.CritterIndex(root).load_all()
 
 def get_critter(name, critters):
 	"""
@@ -58,56 +87,329 @@ def get_critter(name, critters):
 	return None
 
 
-def headless(sim, iterations=1000):
+def headless(sim, iterations=1000, stop=None, checkpointer=None, metrics=None):
 	"""
-  Runs the Critter simulation without showing a GUI and prints the results at the end.
+  Runs the Critter simulation without showing a GUI until it has run iterations ticks in all, or until stop (a StopConditions) is reached, and prints the results at the end. With checkpointer, checkpoints are saved along the way and once more at the end. With metrics (a critter_metrics.Metrics), it is ticked along and closed at the end.
   """
-	for i in range(iterations):
+	for i in range(iterations - sim.move_count):
 		sim.update()
+		if metrics is not None:
+			metrics.tick()
+		if checkpointer is not None:
+			checkpointer.tick(sim)
+		reason = stop.reached(sim) if stop is not None else None
+		if reason is not None:
+			print(reason)
+			break
+	if checkpointer is not None:
+		critter_checkpoint.save(sim, checkpointer.path)
+	if metrics is not None:
+		metrics.close()
 	print(sim)
 
 
+def batch(contenders, args):
+  """
+  Runs a batch of independent headless matches in parallel and prints the aggregated results.
+  """
+  seed = args.seed if args.seed is not None else random.randrange(2 ** 32)
+  results = critter_batch.run_batch(contenders, args.width, args.height, args.ncritters, args.iters, args.batch, seed,
+                                    workers=args.workers, min_matches=args.min_matches, early_stop=not args.no_early_stop, checkpoint=args.resume)
+  print(results)
+  settled = " (stopped early, ranking settled)" if results.matches < args.batch else ""
+  print("\n%d of %d matches played with seed %d%s." % (results.matches, args.batch, seed, settled))
+
+
+def parse_sweep(index, contenders, args):
+  """
+  Returns the cells of the sweep asked for with --sweep, with the flags' values for every key left out.
+  """
+  values = {'width': [args.width], 'height': [args.height], 'n': [args.ncritters], 'iters': [args.iters], 'critters': [contenders]}
+  for spec in args.sweep:
+    key, equals, given = spec.partition('=')
+    if key not in values or not equals or not given:
+      print("Error: --sweep takes KEY=VALUE,VALUE,... with KEY one of %s, not '%s'." % (', '.join(values), spec))
+      sys.exit(-1)
+    if key == 'critters':
+      values[key] = []
+      for names in given.split(','):
+        contender_set = []
+        for critter_name in names.split('+'):
+          contender = index.load(critter_name)
+          if contender is None:
+            print("Error: critter with class name '%s' was not found." % critter_name)
+            sys.exit(-1)
+          contender_set.append(contender)
+        values[key].append(contender_set)
+    else:
+      try:
+        values[key] = [int(value) for value in given.split(',')]
+      except ValueError:
+        print("Error: --sweep %s takes whole numbers, not '%s'." % (key, given))
+        sys.exit(-1)
+  return critter_sweep.grid(values['width'], values['height'], values['n'], values['iters'], values['critters'])
+
+
+def sweep(index, contenders, args):
+  """
+  Plays every cell of a sweep and prints each one's aggregated results.
+  """
+  cells = parse_sweep(index, contenders, args)
+  seed = args.seed if args.seed is not None else 0
+  cache = None if args.no_cache else critter_sweep.ResultCache()
+  results = critter_sweep.run_sweep(cells, args.sweep_matches, seed, workers=args.workers, cache=cache)
+  played = 0
+  for cell, cell_results, cached in results:
+    played += cell_results.matches - cached
+    print("\n%dx%d, %d of each, %d iterations: %s (%d of %d matches cached)" % (cell.width, cell.height, cell.num, cell.iterations, ', '.join(c.__name__ for c in cell.contenders), cached, cell_results.matches))
+    print(cell_results)
+  print("\n%d combinations, %d matches played with seed %d, %d from cache." % (len(results), played, seed, len(results) * args.sweep_matches - played))
+
+
+def league(contenders, args):
+  """
+  Plays a round-robin league of head-to-head matches between the contenders and prints the standings.
+  """
+  if len(contenders) < 2:
+    print("Error: a league needs at least two critters.")
+    sys.exit(-1)
+  seed = args.seed if args.seed is not None else 0
+  cache = None if args.no_cache else critter_sweep.ResultCache()
+  try:
+    standings, played = critter_league.run_league(contenders, args.width, args.height, args.ncritters, args.iters, args.league_matches, seed, workers=args.workers, cache=cache)
+  except critter_league.LeagueException as e:
+    print(e)
+    sys.exit(-1)
+  print(standings)
+  pairs = len(contenders) * (len(contenders) - 1) // 2
+  print("\n%d pairs, %d matches each with seed %d: %d played, %d from cache." % (pairs, args.league_matches, seed, played, pairs * args.league_matches - played))
+
+
+def vectorized(contenders, args):
+  """
+  Runs the simulation headless on the vectorized engine and prints the results at the end.
+  """
+  if not args.no_gui or args.record:
+    print("Error: --vectorized only runs with --no-gui and without --record.")
+    sys.exit(-1)
+  for contender in contenders:
+    if not issubclass(contender, critter_table.TableCritter):
+      print("Error: critter '%s' is not a TableCritter, so it cannot run with --vectorized." % contender.__name__)
+      sys.exit(-1)
+  # imported here, as it imports NumPy
+  import critter_vector
+  sim = critter_vector.VectorSim(args.width, args.height, args.seed)
+  for critter in contenders:
+    sim.add(critter, args.ncritters)
+  metrics = critter_metrics.Metrics(args.metrics, sim, args.metrics_interval) if args.metrics else None
+  headless(sim, args.iters, metrics=metrics)
+
+
+def parse_tiles(args):
+  """
+  Returns the number of tiles along each side of the board asked for with --tiles, or the default for --shards.
+  """
+  if args.tiles is None:
+    return critter_shard.default_tiles(args.shards), critter_shard.default_tiles(args.shards)
+  try:
+    tiles_x, tiles_y = (int(n) for n in args.tiles.lower().split('x'))
+  except ValueError:
+    print("Error: --tiles should be given as COLUMNSxROWS, e.g. 4x4.")
+    sys.exit(-1)
+  return tiles_x, tiles_y
+
+
+def sharded(contenders, args):
+  """
+  Runs the simulation headless across args.shards worker processes and prints the results at the end.
+  """
+  if not args.no_gui or args.record or args.profile or args.call_budget is not None or args.tick_budget is not None:
+    print("Error: --shards only runs with --no-gui, and without --record, --profile or budgets.")
+    sys.exit(-1)
+  if args.seed is not None:
+    random.seed(args.seed)
+  sim = critter_sim.CritterSim(args.width, args.height, threading.Lock(), args.seed)
+  sim.memo_size = args.memo_size
+  for critter in contenders:
+    sim.add(critter, args.ncritters)
+  tiles_x, tiles_y = parse_tiles(args)
+  try:
+    sim = critter_shard.ShardedSim(sim, tiles_x, tiles_y, args.shards)
+  except critter_sim.LocationException as e:
+    print(e)
+    sys.exit(-1)
+
+  stop = None
+  if args.until_one or args.quiet_window is not None or args.time_limit is not None:
+    stop = critter_sim.StopConditions(args.until_one, args.quiet_window, args.time_limit)
+  metrics = critter_metrics.Metrics(args.metrics, sim, args.metrics_interval) if args.metrics else None
+  try:
+    headless(sim, args.iters, stop, metrics=metrics)
+  finally:
+    sim.close()
+
+
 def main():
   # parse input flags and arguments
   args = handle_input()
 
-  # load all Critter subclasses and store them in a list
-  critters = import_critters()
+  if args.replay:
+    replay = critter_log.Replay(args.replay)
+    if args.no_gui:
+      replay.seek(sys.maxsize)
+      print(replay)
+    else:
+      import critter_gui
+      c = critter_gui.CritterGUI(replay, args.threaded)
+      input()
+      c.stop()
+    return
 
-  # collect contenders
-  
-  if args.exclude:
-    contenders = critters
-    for critter_name in args.exclude:
-      contender = get_critter(critter_name, critters)
-      if contender != None:
-        contenders.remove(contender)
-      else:
-        print("Error: critter with class name '%s' was not found." % critter_name)
-        sys.exit(-1)
-  elif args.include:
-    contenders = []
-    for critter_name in args.include:
-      contender = get_critter(critter_name, critters)
-      if contender != None:
-        contenders.append(contender)
-      else:
-        print("Error: critter with class name '%s' was not found." % critter_name)
-        sys.exit(-1)
+  if (args.isolate or args.vectorized or args.shards or args.tiles or args.remote) and (args.resume or args.checkpoint):
+    print("Error: --isolate, --vectorized, --shards, --tiles and --remote runs cannot be checkpointed or resumed.")
+    sys.exit(-1)
+  if args.remote and (args.batch or args.vectorized or args.shards):
+    print("Error: --remote cannot be used with --batch, --vectorized or --shards.")
+    sys.exit(-1)
+
+  sim = None
+  if args.resume:
+    # a checkpoint brings its own critters and board
+    sim = critter_checkpoint.load(args.resume, args.seed)
+    contenders = list(sim.critter_class_stats)
   else:
-    contenders = critters
+    # find all Critter subclasses without importing anything, then import only the contenders' modules
+    index = critter_index.CritterIndex()
+
+    # collect contenders
+  
+    if args.exclude:
+      names = index.names()
+      for critter_name in args.exclude:
+        if critter_name in names:
+          names.remove(critter_name)
+        else:
+          print("Error: critter with class name '%s' was not found." % critter_name)
+          sys.exit(-1)
+      contenders = [index.load(critter_name) for critter_name in names]
+    elif args.include:
+      contenders = []
+      for critter_name in args.include:
+        contender = index.load(critter_name)
+        if contender != None:
+          contenders.append(contender)
+        else:
+          print("Error: critter with class name '%s' was not found." % critter_name)
+          sys.exit(-1)
+    else:
+      contenders = index.load_all()
+
+  if (args.sweep or args.league) and args.resume:
+    print("Error: --sweep and --league runs cannot be resumed.")
+    sys.exit(-1)
+  if args.sweep:
+    sweep(index, contenders, args)
+    return
+  if args.league:
+    league(contenders, args)
+    return
+
+  if args.batch:
+    batch(contenders, args)
+    return
+
+  if args.vectorized:
+    vectorized(contenders, args)
+    return
+
+  if args.shards:
+    sharded(contenders, args)
+    return
 
   # build simulation and add critter contenders
-  sim = critter_sim.CritterSim(args.width, args.height, threading.Lock())
-  for critter in contenders:
-    sim.add(critter, args.ncritters)
+  if sim is None:
+    if args.seed is not None:
+      random.seed(args.seed)
+    sim = critter_sim.CritterSim(args.width, args.height, threading.Lock(), args.seed)
+  sim.memo_size = args.memo_size
+  call_budget = args.call_budget / 1000 if args.call_budget is not None else None
+  tick_budget = args.tick_budget / 1000 if args.tick_budget is not None else None
+  isolation = budget = None
+  if args.isolate:
+    isolation = critter_worker.Isolation(sim, call_budget, tick_budget, args.disqualify)
+    contenders = [isolation.isolate(critter) for critter in contenders]
+    isolation.install()
+  elif call_budget is not None or tick_budget is not None:
+    budget = critter_budget.Budget(sim, contenders, call_budget, tick_budget, args.disqualify)
+    budget.install()
+  remote = None
+  if args.remote:
+    remote = critter_remote.Remote(sim, args.remote_timeout / 1000 if args.remote_timeout is not None else None, args.remote_connections)
+    try:
+      for spec in args.remote:
+        name, at, address = spec.partition('@')
+        if not at:
+          print("Error: --remote takes NAME@ADDRESS, not '%s'." % spec)
+          sys.exit(-1)
+        contenders.append(remote.remote(name, address))
+    except critter_remote.RemoteException as e:
+      print(e)
+      sys.exit(-1)
+    remote.install()
+  if not args.resume:
+    for critter in contenders:
+      sim.add(critter, args.ncritters)
+  if args.tiles:
+    try:
+      critter_shard.TileOrder(sim, *parse_tiles(args)).install()
+    except critter_sim.LocationException as e:
+      print(e)
+      sys.exit(-1)
+  if args.record:
+    recorder = critter_log.Recorder(args.record, sim, args.keyframe_interval)
+
+  stop = checkpointer = metrics = None
+  if args.until_one or args.quiet_window is not None or args.time_limit is not None:
+    stop = critter_sim.StopConditions(args.until_one, args.quiet_window, args.time_limit)
+  if args.checkpoint:
+    checkpointer = critter_checkpoint.Checkpointer(args.checkpoint, args.checkpoint_interval)
+  if args.metrics and args.no_gui:
+    metrics = critter_metrics.Metrics(args.metrics, sim, args.metrics_interval)
 
   # show simulation
-  if args.no_gui:
-    headless(sim, args.iters)
+  if args.no_gui and args.profile:
+    profiler = critter_profile.Profiler(sim, contenders)
+    profiler.install()
+    headless(sim, args.iters, stop, checkpointer, metrics)
+    profiler.uninstall()
+    print()
+    print(profiler)
+    if args.profile_out:
+      profiler.save(args.profile_out)
+  elif args.no_gui:
+    headless(sim, args.iters, stop, checkpointer, metrics)
+    if sim.memo is not None:
+      print()
+      print(sim.memo)
   else:
-    c = critter_gui.CritterGUI(sim)
+    # imported only when needed, as it imports tkinter
+    import critter_gui
+    c = critter_gui.CritterGUI(sim, args.threaded)
     input()
+    c.stop()
+
+  # in reverse order of installation, so that every wrapper puts back what it found
+  if args.record:
+    recorder.close()
+  if remote:
+    for address, endpoint in remote.endpoints.items():
+      if endpoint.error:
+        print("Gave up on the critter service at %s: %s" % (address, endpoint.error))
+    remote.close()
+  if budget:
+    budget.uninstall()
+  if isolation:
+    isolation.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,332 @@
+import array
+import math
+import multiprocessing
+import pickle
+import random
+import threading
+import critter_sim
+
+# How far a turn reaches outside its tile: a critter moves at most one cell, and the CritterInfo of whoever it fights there can read the cells around that one.
+REACH = 2
+
+# Requests to a shard worker.
+PHASE = 'phase'  # phase index, pickled batches of (cell, critter, had its turn) -> (a batch or None per worker, (kills, alive) per class, fights, steps)
+CELLS = 'cells'  # -> (cell, class name) of every critter the worker holds
+QUIT = 'quit'
+
+
+class Tiling():
+  """
+  Splits a toroidal board into tiles_x by tiles_y tiles and colors them like a checkerboard in each direction that has more than one tile, for at most 4 colors, so that two tiles of the same color are always at least a whole tile apart. Every tick then runs in one phase per color, and the turns taken on the tiles of one phase reach (by REACH cells) only cells that no other tile of that phase reaches, so those tiles can be simulated in any order, or in parallel, with the same outcome.
+
+  For that, the number of tiles in each direction must be 1 or even, and tiles at least 2 * REACH cells wide and high.
+  """
+  def __init__(self, width, height, tiles_x, tiles_y):
+    for tiles, size, side in ((tiles_x, width, 'wide'), (tiles_y, height, 'high')):
+      if tiles < 1 or tiles > 1 and (tiles % 2 or size // tiles < 2 * REACH):
+        raise critter_sim.LocationException("Error: cannot split a board %d cells %s into %d tiles; use 1 or an even number of tiles, each at least %d cells %s." % (size, side, tiles, 2 * REACH, side))
+    self.width = width
+    self.height = height
+    self.tiles_x = tiles_x
+    self.tiles_y = tiles_y
+
+    # tile boundaries, and the tile column of every x and tile row of every y
+    self.xs = [width * i // tiles_x for i in range(tiles_x + 1)]
+    self.ys = [height * i // tiles_y for i in range(tiles_y + 1)]
+    self.column_tile = array.array('H', (tx for tx in range(tiles_x) for x in range(self.xs[tx], self.xs[tx + 1])))
+    self.row_tile = array.array('H', (ty for ty in range(tiles_y) for y in range(self.ys[ty], self.ys[ty + 1])))
+
+    # tiles are numbered in row-major order; phases[k] lists the tiles of color k
+    colors_x = 2 if tiles_x > 1 else 1
+    colors_y = 2 if tiles_y > 1 else 1
+    self.phases = [[] for i in range(colors_x * colors_y)]
+    self.phase_of = []
+    for ty in range(tiles_y):
+      for tx in range(tiles_x):
+        phase = tx % colors_x + colors_x * (ty % colors_y)
+        self.phase_of.append(phase)
+        self.phases[phase].append(ty * tiles_x + tx)
+
+  def __len__(self):
+    return self.tiles_x * self.tiles_y
+
+  def bounds(self, tile):
+    """Returns the cells of tile as (x0, y0, x1, y1), x1 and y1 excluded."""
+    tx, ty = tile % self.tiles_x, tile // self.tiles_x
+    return self.xs[tx], self.ys[ty], self.xs[tx + 1], self.ys[ty + 1]
+
+  def tile_of(self, cell):
+    return self.row_tile[cell // self.width] * self.tiles_x + self.column_tile[cell % self.width]
+
+  def band(self, tile):
+    """Returns the set of cells of tile that are less than REACH cells from its edge, the only ones the turns of a neighboring tile can reach."""
+    x0, y0, x1, y1 = self.bounds(tile)
+    cells = set()
+    for y in range(y0, y1):
+      columns = range(x0, x1) if y < y0 + REACH or y >= y1 - REACH else list(range(x0, x0 + REACH)) + list(range(x1 - REACH, x1))
+      cells.update(y * self.width + x for x in columns)
+    return cells
+
+  def ring(self, tile):
+    """Returns the set of cells outside tile that its turns can reach."""
+    x0, y0, x1, y1 = self.bounds(tile)
+    cells = set()
+    for y in range(y0 - REACH, y1 + REACH):
+      columns = range(x0 - REACH, x1 + REACH) if not y0 <= y < y1 else list(range(x0 - REACH, x0)) + list(range(x1, x1 + REACH))
+      cells.update((y % self.height) * self.width + x % self.width for x in columns)
+    # a direction with a single tile wraps around onto the tile itself
+    return {cell for cell in cells if self.tile_of(cell) != tile}
+
+  def reached_by(self, cell, phase):
+    """Returns the tile of phase whose turns can reach cell (the tile it is on, or a neighboring one), or None if there is none."""
+    x, y = cell % self.width, cell // self.width
+    for dy in (-REACH, 0, REACH):
+      for dx in (-REACH, 0, REACH):
+        tile = self.tile_of(((y + dy) % self.height) * self.width + (x + dx) % self.width)
+        if self.phase_of[tile] == phase:
+          return tile
+    return None
+
+
+def tile_randoms(sim, tiling):
+  """Returns a random.Random per tile of tiling, derived from the seed of sim (or, if it has none, from its generator)."""
+  seed = sim.seed if sim.seed is not None else sim.random.getrandbits(64)
+  return [random.Random(tile_seed) for tile_seed in critter_sim.split_seed(seed, len(tiling))]
+
+
+def tile_turns(sim, tiling, tile, rng, turned):
+  """
+  Gives every critter on tile its turn, except those in the set turned, which had theirs earlier in the tick on another tile, adds them to turned and returns how many critters were killed. The order is drawn with the tile's own generator rng from the critters in row-major order, and rng also decides the tile's fights and seeds the random module for its critters, so a tile's turns come out the same whichever process runs them.
+  """
+  x0, y0, x1, y1 = tiling.bounds(tile)
+  width = sim.width
+  find = sim.grid.occupancy.find
+  ids = sim.grid.ids
+  critters = sim.grid.critters
+  order = []
+  for y in range(y0, y1):
+    end = y * width + x1
+    i = find(1, y * width + x0, end)
+    while i != -1:
+      c = critters[ids[i]]
+      if c not in turned:
+        order.append(c)
+      i = find(1, i + 1, end)
+
+  rng.shuffle(order)
+  turned.update(order)
+  random.seed(rng.getrandbits(64))
+  sim.random = rng
+  return sim.take_turns(order)
+
+
+class TileOrder():
+  """
+  Runs a CritterSim in the order ShardedSim does, in this one process: every tick, the tiles of a Tiling take their turns phase by phase (see tile_turns) instead of all critters taking theirs in one shuffled order. Given the same seed and tiles, a simulation run in TileOrder has the same outcome as a ShardedSim, with any number of workers. install() makes it the simulation's turn_order and uninstall() takes it off, so the rest of a tick (prefetchers, the recorder, whatever wraps update) goes on as usual.
+  """
+  def __init__(self, sim, tiles_x, tiles_y):
+    self.sim = sim
+    self.tiling = Tiling(sim.width, sim.height, tiles_x, tiles_y)
+    self.randoms = tile_randoms(sim, self.tiling)
+    self.turned = set()
+
+  def install(self):
+    self.sim.turn_order = self
+
+  def uninstall(self):
+    self.sim.turn_order = None
+
+  def take_turns(self, sim):
+    """Gives every critter of sim its turn, tile by tile, and returns how many critters were killed."""
+    rng = sim.random
+    dead = 0
+    self.turned.clear()
+    for tiles in self.tiling.phases:
+      for tile in tiles:
+        dead += tile_turns(sim, self.tiling, tile, self.randoms[tile], self.turned)
+    sim.random = rng
+    return dead
+
+
+def serve(connection, index, tiling, worker_of, randoms, classes, memo_size):
+  """
+  The main loop of a shard worker, simulating the tiles worker_of assigns to it with randoms, the generators of those tiles. It holds the critters on its tiles in a CritterSim of the whole board, and before each phase it is also lent the critters around its tiles of that phase that their turns can reach. After the phase it sends away every critter that the next phase needs elsewhere, in one batch per worker.
+  """
+  sim = critter_sim.CritterSim(tiling.width, tiling.height, threading.Lock())
+  sim.memo_size = memo_size
+  # these only count what happens here: alive goes negative with every death
+  sim.critter_class_stats = {critter_class: critter_sim.ClassStats() for critter_class in classes}
+  for critter_class in classes:
+    if critter_class.pure:
+      sim.memoize(critter_class)
+  mine = [tile for tile in range(len(tiling)) if worker_of[tile] == index]
+  active = [[tile for tile in mine if tiling.phase_of[tile] == phase] for phase in range(len(tiling.phases))]
+
+  # exports[k]: (cell, worker) for every cell that may hold a critter after phase k, which the next phase needs another worker to have
+  exports = []
+  for phase in range(len(tiling.phases)):
+    next_phase = (phase + 1) % len(tiling.phases)
+    watched = set()
+    for tile in mine:
+      watched |= tiling.band(tile)
+    for tile in active[phase]:
+      watched |= tiling.ring(tile)
+    exports.append([])
+    for cell in sorted(watched):
+      tile = tiling.reached_by(cell, next_phase)
+      worker = worker_of[tile if tile is not None else tiling.tile_of(cell)]
+      if worker != index:
+        exports[phase].append((cell, worker))
+
+  grid = sim.grid
+  turned = set()
+  while True:
+    try:
+      request = connection.recv()
+    except EOFError:
+      return
+
+    if request[0] == PHASE:
+      phase, batches = request[1], request[2]
+      try:
+        if phase == 0:
+          turned.clear()
+        for batch in batches:
+          for cell, c, had_turn in pickle.loads(batch):
+            grid.set_cell(cell, c)
+            # a critter's turn last tick does not count
+            if had_turn and phase != 0:
+              turned.add(c)
+
+        for tile in active[phase]:
+          tile_turns(sim, tiling, tile, randoms[tile], turned)
+
+        outgoing = [[] for worker in range(max(worker_of) + 1)]
+        occupancy = grid.occupancy
+        for cell, worker in exports[phase]:
+          if occupancy[cell]:
+            c = grid.critters[grid.ids[cell]]
+            grid.clear_cell(cell)
+            grid.release(c)
+            outgoing[worker].append((cell, c, c in turned))
+        reply = ([pickle.dumps(batch, pickle.HIGHEST_PROTOCOL) if batch else None for batch in outgoing],
+                 [(stats.kills, stats.alive) for stats in sim.critter_class_stats.values()], sim.fight_count, sim.step_count)
+      except Exception as e:
+        # raised again by the simulation's end
+        reply = e
+
+    elif request[0] == CELLS:
+      reply = [(cell, c.__class__.__name__) for c, cell in sim.critter_cells.items()]
+
+    elif request[0] == QUIT:
+      return
+
+    connection.send(reply)
+
+
+class ShardedSim():
+  """
+  Runs a simulation across worker processes, for boards far bigger than one process can keep up with. The board is split into tiles (see Tiling), which are handed out to the workers so that every phase keeps as many of them busy as it has tiles; a tick is one round trip to all workers per phase, through which the critters on the edges of tiles move between workers (see serve).
+
+  Critters take their turns tile by tile, as with TileOrder, so given the same seed and tiles the outcome is that of a CritterSim run in TileOrder, whatever the number of workers, though not that of a plain CritterSim. Critters must be picklable, and class-level state they share does not carry across workers.
+
+  It is built from a CritterSim that already has its critters, and can then be run like one, headless: update() and the class stats, tick and fight and step counts are all there. close() stops the workers.
+  """
+  def __init__(self, sim, tiles_x, tiles_y, workers):
+    self.width = sim.width
+    self.height = sim.height
+    self.seed = sim.seed
+    self.move_count = sim.move_count
+    self.fight_count = sim.fight_count
+    self.step_count = sim.step_count
+    self.tiling = Tiling(sim.width, sim.height, tiles_x, tiles_y)
+    randoms = tile_randoms(sim, self.tiling)
+
+    # stats as they were handed over, which the workers' counts are added to
+    self.classes = list(sim.critter_class_stats)
+    self.base = [(stats.kills, stats.alive) for stats in sim.critter_class_stats.values()]
+    self.base_counts = (sim.fight_count, sim.step_count)
+    self.critter_class_stats = {critter_class: critter_sim.ClassStats(stats.kills, stats.alive, stats.count) for critter_class, stats in sim.critter_class_stats.items()}
+
+    # deal out the tiles of every phase in turn
+    self.worker_of = [0] * len(self.tiling)
+    for tiles in self.tiling.phases:
+      for i, tile in enumerate(tiles):
+        self.worker_of[tile] = i % workers
+    workers = max(self.worker_of) + 1
+
+    # every critter starts out where the first phase needs it
+    batches = [[] for worker in range(workers)]
+    for c, cell in sim.critter_cells.items():
+      tile = self.tiling.reached_by(cell, 0)
+      batches[self.worker_of[tile if tile is not None else self.tiling.tile_of(cell)]].append((cell, c, False))
+    self.incoming = [[pickle.dumps(batch, pickle.HIGHEST_PROTOCOL)] for batch in batches]
+
+    self.connections = []
+    self.processes = []
+    for worker in range(workers):
+      connection, child = multiprocessing.Pipe()
+      process = multiprocessing.Process(target=serve, args=(child, worker, self.tiling, self.worker_of, {tile: randoms[tile] for tile in range(len(self.tiling)) if self.worker_of[tile] == worker}, self.classes, sim.memo_size), daemon=True)
+      process.start()
+      child.close()
+      self.connections.append(connection)
+      self.processes.append(process)
+
+  def update(self):
+    """Runs one tick: every phase is a round trip to every worker, carrying the critters the phase needs moved between them."""
+    self.move_count += 1
+    for phase in range(len(self.tiling.phases)):
+      for connection, batches in zip(self.connections, self.incoming):
+        connection.send((PHASE, phase, batches))
+      self.incoming = [[] for connection in self.connections]
+      replies = [connection.recv() for connection in self.connections]
+      for reply in replies:
+        if isinstance(reply, Exception):
+          raise reply
+        for worker, batch in enumerate(reply[0]):
+          if batch is not None:
+            self.incoming[worker].append(batch)
+
+    # the workers report running totals
+    fights, steps = self.base_counts
+    for (kills, alive), stats in zip(self.base, self.critter_class_stats.values()):
+      stats.kills = kills
+      stats.alive = alive
+    for batches, stats, worker_fights, worker_steps in replies:
+      for (kills, alive), class_stats in zip(stats, self.critter_class_stats.values()):
+        class_stats.kills += kills
+        class_stats.alive += alive
+      fights += worker_fights
+      steps += worker_steps
+    self.fight_count = fights
+    self.step_count = steps
+
+  def cells(self):
+    """Returns the cell and class name of every critter on the board, sorted by cell."""
+    for connection in self.connections:
+      connection.send((CELLS,))
+    cells = [cell for connection in self.connections for cell in connection.recv()]
+    # and those on their way to the worker that needs them next
+    for batches in self.incoming:
+      for batch in batches:
+        cells.extend((cell, c.__class__.__name__) for cell, c, had_turn in pickle.loads(batch))
+    return sorted(cells)
+
+  def close(self):
+    for connection, process in zip(self.connections, self.processes):
+      try:
+        connection.send((QUIT,))
+      except OSError:
+        pass
+      process.join(1)
+      if process.is_alive():
+        process.kill()
+      connection.close()
+
+  def __str__(self):
+    return critter_sim.CritterSim.__str__(self)
+
+
+def default_tiles(workers):
+  """The number of tiles along each side of the board that gives every phase at least one tile per worker."""
+  return 2 * math.ceil(math.sqrt(workers))
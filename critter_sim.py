@@ -1,36 +1,88 @@
 import constants
+import array
 import collections
+import collections.abc
+import functools
+import hashlib
 import random
+import threading
+import time
 
 # Just an (x, y) pair, but more readable.
 Point = collections.namedtuple('Point', ['x', 'y'])
 
+# How the first attack of a fight fares against the second: 1 if it wins, -1 if it loses, 0 on a tie, which a coin flip decides.
+BEATS = {constants.ROAR: constants.SCRATCH, constants.SCRATCH: constants.POUNCE, constants.POUNCE: constants.ROAR}
+FIGHT_OUTCOMES = {(attack1, attack2): 1 if BEATS[attack1] == attack2 else -1 if BEATS[attack2] == attack1 else 0 for attack1 in constants.VALID_ATTACKS for attack2 in constants.VALID_ATTACKS}
+
+# How many decisions a DecisionCache remembers per pure critter class and callback.
+MEMO_SIZE = 4096
+
+# How many cells Grid.nth_free_cell counts the empty cells of at once.
+FREE_CHUNK = 4096
+
 class CritterSim():
   """
   The main Critter simulation. Takes care of all the logic of Critter fights.
   """
-  def __init__(self, width, height, list_lock):
+  def __init__(self, width, height, list_lock, seed=None):
     self.width = width
     self.height = height
     self.critters = []
     self.move_count = 0
     self.num_critters = 0
 
-    # a map of critters to (x, y) positions.
-    self.critter_positions = {}
+    # running totals of the fights fought and of the critters that moved onto another cell, kept as they happen for critter_metrics.
+    self.fight_count = 0
+    self.step_count = 0
+
+    # a map of critters to the flat grid index of their cell, y * width + x, read from the grid's critter store (see Grid), which the tick loop reads directly without building a Point.
+    self.critter_cells = Cells(self)
+
+    # the same, as (x, y) Points made on demand, for everyone else.
+    self.critter_positions = Positions(self)
+
+    # the CritterInfo view handed to the critter with each id (and to its opponents) every tick, made once per id and handed to whichever critter has it, and the same as a map of critters to their views.
+    self.infos = []
+    self.critter_infos = Infos(self)
 
     # a map of critter classes to the number alive of that class.
     self.critter_class_stats = {}
-    self.grid = [[None for x in range(height)] for y in range(width)]
+    self.grid = Grid(width, height)
+
+    # where every cell's neighbors are, shared by every simulation with the same board size.
+    self.neighbors = neighbor_table(width, height)
 
     # make sure nothing bad happens due to concurrent list access.
     self.list_lock = list_lock
 
+    # every random choice the simulation makes (turn order, placement, tie-breaks, constructor parameters) comes from its own generator, so a seeded run can be reproduced and simulations sharing a process don't perturb each other.
+    self.seed = seed
+    self.random = random.Random(seed)
+
+    # an optional critter_log.Recorder, told about every spawn, move, fight and death.
+    self.recorder = None
+
+    # flat indices of the cells that update() and add() changed since the last take_changed_cells(), by a move, fight, death, spawn or change of looks, or None if nobody asked for them.
+    self.changed_cells = None
+
+    # objects whose prefetch(sim) is called at the start of every tick, before any critter moves, e.g. to fetch every out-of-process critter's move in one round trip.
+    self.prefetchers = []
+
+    # an optional object whose take_turns(sim) gives every critter its turn in an order of its own rather than the shuffled one, and returns how many were killed, e.g. critter_shard.TileOrder.
+    self.turn_order = None
+
+    # the decisions of pure critter classes (see Critter.pure), or None until one is added. memo_size is how many it keeps per class and callback; 0 turns caching off.
+    self.memo = None
+    self.memo_size = MEMO_SIZE
+
 
   def add(self, critter, num):
     """
-    Adds a particular critter type num times. The critter should be a class, not an instantiated critter.
+    Adds a particular critter type num times. The critter should be a class, not an instantiated critter. Raises a LocationException, without adding anything, if there are fewer than num empty cells.
     """
+    cells = self.grid.sample_free_cells(num, self.random)
+
     # initialize stats
     if critter not in self.critter_class_stats:
       self.critter_class_stats[critter] = ClassStats(initial_count=num)
@@ -38,43 +90,81 @@ class CritterSim():
       self.critter_class_stats[critter].count += num
     self.critter_class_stats[critter].alive += num
     self.num_critters = num
+    if critter.pure:
+      self.memoize(critter)
 
     # initialize each critter
-    for i in range(num):
-      args = CritterSim.create_parameters(critter)
+    for cell in cells:
+      args = CritterSim.create_parameters(critter, self.random)
       c = critter(*args)
       self.critters.append(c)
-      pos = self.random_location()
-      self.critter_positions[c] = pos
-      self.grid[pos.x][pos.y] = c
+      self.grid.set_cell(cell, c)
+      if self.recorder is not None:
+        self.recorder.spawn(c)
+    if self.changed_cells is not None:
+      self.changed_cells.update(cells)
 
 
-  def create_parameters(critter):
+  def memoize(self, critter_class):
     """
-    Returns the appropriate parameters for critters with non-default constructors. Parameterss are returned as a tuple, which will be passed as *args to the critter's constructor.
+    Starts caching the decisions of critter_class, which has to be pure: its critters' get_move and fight are called only the first time a critter of the class is in a situation, and replayed from the cache after that.
+    """
+    if self.memo_size <= 0:
+      return
+    if self.memo is None:
+      self.memo = DecisionCache(self.memo_size)
+    self.memo.add(critter_class)
+
+
+  def create_parameters(critter, rng=random):
+    """
+    Returns the appropriate parameters for critters with non-default constructors. Parameterss are returned as a tuple, which will be passed as *args to the critter's constructor. Random parameters are drawn from rng.
     """
     if critter.__name__ == 'Mouse':
-      return (constants.Color(random.randint(0, 255), random.randint(0, 255), random.randint(0, 255)),)
+      return (constants.Color(rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255)),)
     elif critter.__name__ == 'Elephant':
-      return (random.randint(1, 15),)
+      return (rng.randint(1, 15),)
     elif critter.__name__ == 'OppositeElephant':
-      return (random.randint(1, 15),)
+      return (rng.randint(1, 15),)
     else:
       return ()
 
 
+  def track_changes(self):
+    """
+    Starts keeping track of the cells each update() changes, so that a renderer can redraw only those (see take_changed_cells). From then on, every critter's char and color are checked after its turn, against the grid's record of how it looked (see Grid.track_looks).
+    """
+    if self.changed_cells is None:
+      self.changed_cells = set()
+      self.grid.track_looks()
+
+
+  def take_changed_cells(self):
+    """
+    Returns the set of flat indices of the cells that moves, fights, deaths, spawns and changes of looks have changed since the last call, and starts a new one. Looks are checked after every turn, so a critter whose char or color changes outside its own callbacks only has its cell marked after its next turn.
+    """
+    with self.list_lock:
+      cells, self.changed_cells = self.changed_cells, set()
+    return cells
+
+
   def random_location(self):
     """
-    Calculate a random location for a Critter to be placed. This is not guaranteed to terminate by any means, but practically we (probably) don't need to be concerned. Returns a 2-tuple of integers.
+    Picks a random empty location for a Critter to be placed (see Grid.random_free_cell). Returns a Point, or raises a LocationException if the board is full.
     """
-    x = random.randint(0, self.width - 1)
-    y = random.randint(0, self.height - 1)
+    return self.point(self.grid.random_free_cell(self.random))
+
+
+  def random_locations(self, num):
+    """
+    Picks num distinct random empty locations in one go. Returns a list of Points, or raises a LocationException if there are fewer than num empty cells.
+    """
+    return [self.point(cell) for cell in self.grid.sample_free_cells(num, self.random)]
+
 
-    while self.grid[x][y] is not None:
-      x = random.randint(0, self.width - 1)
-      y = random.randint(0, self.height - 1)
-      
-    return Point(x, y)
+  def point(self, cell):
+    """Returns the Point for a flat grid index."""
+    return Point(cell % self.width, cell // self.width)
 
 
   def update(self):
@@ -82,50 +172,122 @@ class CritterSim():
     Takes care of updating all Critters. For each Critter, it firsts moves. If the position it moves to is occupied, the two critters fight, and the loser is destroyed while the winner moves into the position.
     """
     self.move_count += 1
-    random.shuffle(self.critters)
+    if self.turn_order is None:
+      self.random.shuffle(self.critters)
+    for prefetcher in self.prefetchers:
+      prefetcher.prefetch(self)
+    if self.turn_order is None:
+      dead = self.take_turns(self.critters)
+    else:
+      dead = self.turn_order.take_turns(self)
+
+    # drop this tick's dead from the turn order
+    if dead:
+      critter_ids = self.grid.critter_ids
+      with self.list_lock:
+        self.critters = [c for c in self.critters if c in critter_ids]
+
+    if self.recorder is not None:
+      self.recorder.end_tick()
+
 
-    # unclean while loop because we'll be removing any losing critters as we iterate through the list.
-    i = 0
-    l = len(self.critters)
-    while i < l:
-      critter1 = self.critters[i]
+  def take_turns(self, critters):
+    """
+    Gives every critter in the list critters its turn, in list order: it moves, and if the position it moves to is occupied, the two critters fight and the loser is destroyed while the winner moves into the position. Returns how many critters were killed.
 
-      # call critter's get_move() method
-      critter_info = CritterInfo(self, critter1)
-      direction = critter1.get_move(critter_info)
+    The list is left as it is, dead included: a critter killed before its turn comes is skipped, having no id on the grid any more, and removing the dead from the list is up to the caller. Nothing is allocated per critter: positions are read and written as flat grid indices in the grid's critter store, and the CritterInfo handed to each critter is the one kept for its id.
+    """
+    grid = self.grid
+    ids = grid.ids
+    cells = grid.cells
+    critter_ids = grid.critter_ids
+    infos = self.grow_infos()
+    width = self.width
+    around = self.neighbors.around
+    direction_slots = NeighborTable.SLOTS
+    recorder = self.recorder
+    changed = self.changed_cells
+    memo = self.memo
+    dead = 0
+    steps = 0
+    for critter1 in critters:
+      critter_id = critter_ids.get(critter1)
+      if critter_id is None:
+        # killed earlier this tick
+        continue
+      old_cell = cells[critter_id]
+
+      # call critter's get_move() method, unless it is pure and has been in the same situation before
+      if memo is not None and critter1.__class__ in memo.moves:
+        direction = memo.get_move(self, critter1, old_cell)
+      else:
+        direction = critter1.get_move(infos[critter_id])
 
       # move the critter
       CritterSim.verify_move(direction)
-      old_position = self.critter_positions[critter1]
-      position = self.move(direction, old_position)
+      if direction == constants.CENTER:
+        cell = old_cell
+      else:
+        cell = around[8 * old_cell + direction_slots[direction]]
 
       # fight, if necessary
       winner = critter1
-      critter2 = self.grid[position.x][position.y]
-      if critter2 and position != old_position and critter1 != critter2:
+      critter2 = grid.critters[ids[cell]]
+      if critter2 and cell != old_cell and critter1 != critter2:
         # fight
         winner = self.fight(critter1, critter2)
         loser = critter1 if winner == critter2 else critter2
-        self.critter_positions[winner] = position
 
         # get rid of the loser
         with self.list_lock:
-          index = self.critters.index(loser)
-          if index <= i:
-            i -= 1
-          self.critter_positions.pop(loser)
-          self.critters.remove(loser)
-          l -= 1
+          dead += 1
+          if recorder is not None:
+            recorder.death(critter_ids[loser])
+          grid.release(loser)
 
           # make sure we've got an accurate kill/alive count
           self.critter_class_stats[loser.__class__].alive -= 1
           self.critter_class_stats[winner.__class__].kills += 1
 
       # update positions
-      self.grid[old_position.x][old_position.y] = None
-      self.grid[position.x][position.y] = winner
-      self.critter_positions[winner] = position
-      i += 1
+      if winner == critter1:
+        grid.move_cell(old_cell, cell)
+        if cell != old_cell:
+          steps += 1
+          if recorder is not None:
+            recorder.move(ids[cell], cell)
+      else:
+        grid.clear_cell(old_cell)
+
+      # the winner, now on cell, may look different after its turn or fight
+      if changed is not None:
+        if grid.update_look(ids[cell], winner) or cell != old_cell:
+          changed.add(old_cell)
+          changed.add(cell)
+
+    self.step_count += steps
+    return dead
+
+
+  def grow_infos(self):
+    """Makes sure every critter id of the grid has the CritterInfo of the critter that has it now, replacing those of ids handed out again (see Grid.reused), and returns the list of them, indexed by id."""
+    infos = self.infos
+    grid = self.grid
+    for critter_id in range(len(infos), len(grid.critters)):
+      infos.append(CritterInfo(self, critter_id))
+    if grid.reused:
+      for critter_id in grid.reused:
+        if critter_id < len(infos):
+          infos[critter_id] = CritterInfo(self, critter_id)
+      grid.reused = []
+    return infos
+
+
+  def census(self):
+    """
+    Returns a map of every critter class on the board to how many of its critters are on it, counted from the grid's critter store with one array reduction per class rather than from critter_class_stats. The two agree in a simulation run by update().
+    """
+    return self.grid.census()
 
 
   def verify_move(move):
@@ -138,59 +300,41 @@ class CritterSim():
     """
     Returns the new position after moving in direction. This assumes that (0, 0) is the top-left.
     """
-    if direction == constants.NORTH:
-      return Point(pos.x, (pos.y - 1) % self.height)
-    elif direction == constants.SOUTH:
-      return Point(pos.x, (pos.y + 1) % self.height)
-    elif direction == constants.EAST:
-      return Point((pos.x + 1) % self.width, pos.y)
-    elif direction == constants.WEST:
-      return Point((pos.x - 1) % self.width, pos.y)
-    elif direction == constants.NORTHEAST:
-      return Point((pos.x + 1) % self.width, (pos.y - 1) % self.height)
-    elif direction == constants.NORTHWEST:
-      return Point((pos.x - 1) % self.width, (pos.y - 1) % self.height)
-    elif direction == constants.SOUTHEAST:
-      return Point((pos.x + 1) % self.width, (pos.y + 1) % self.height)
-    elif direction == constants.SOUTHWEST:
-      return Point((pos.x - 1) % self.width, (pos.y + 1) % self.height)
-    else:
+    slot = NeighborTable.SLOTS.get(direction)
+    if slot is None:
       return pos
+    cell = self.neighbors.around[8 * (pos.y * self.width + pos.x) + slot]
+    return Point(cell % self.width, cell // self.width)
 
 
   def fight(self, critter1, critter2):
     """
     Force poor innocent Critters to fight to the death for the entertainment of Oberlin students. Returns the glorious victor.
     """
-    # call critter's fight() method
-    critter2_info = CritterInfo(self, critter2)
-    attack1 = critter1.fight(critter2_info)
+    # call critter's fight() method, unless it is pure and has faced the same looks before
+    memo = self.memo
+    if memo is not None and critter1.__class__ in memo.fights:
+      attack1 = memo.fight(self, critter1, critter2)
+    else:
+      attack1 = critter1.fight(self.critter_infos[critter2])
     self.verify_attack(attack1)
 
-    critter1_info = CritterInfo(self, critter1)
-    attack2 = critter2.fight(critter1_info)
+    if memo is not None and critter2.__class__ in memo.fights:
+      attack2 = memo.fight(self, critter2, critter1)
+    else:
+      attack2 = critter2.fight(self.critter_infos[critter1])
     self.verify_attack(attack2)
 
     # determine winner and call critter's recover() method
-    if (attack1 == constants.ROAR and attack2 == constants.SCRATCH
-        or attack1 == constants.SCRATCH and attack2 == constants.POUNCE
-        or attack1 == constants.POUNCE and attack2 == constants.ROAR):
-      critter1.recover(True, attack2)
-      critter2.recover(False, attack1)
-      return critter1
-    elif attack1 == attack2:
-      if random.random() > .5:
-        critter1.recover(True, attack2)
-        critter2.recover(False, attack1)
-        return critter1
-      else:
-        critter1.recover(False, attack2)
-        critter2.recover(True, attack1)
-        return critter2
-    else:
-      critter1.recover(False, attack2)
-      critter2.recover(True, attack1)
-      return critter2
+    outcome = FIGHT_OUTCOMES[attack1, attack2]
+    won = outcome > 0 or outcome == 0 and self.random.random() > .5
+    critter1.recover(won, attack2)
+    critter2.recover(not won, attack1)
+    self.fight_count += 1
+
+    if self.recorder is not None:
+      self.recorder.fight(self.grid.id_of(critter1), self.grid.id_of(critter2), attack1, attack2, won)
+    return critter1 if won else critter2
 
 
   def verify_attack(self, attack):
@@ -205,23 +349,57 @@ class CritterSim():
     """
     Resets the model, clearing out the whole board and repopulating it with num_critters of the same Critter types.
     """
-    self.grid = [[None for x in range(self.height)] for y in range(self.width)]
-    self.critter_positions = {}
+    grid = Grid(self.width, self.height)
+    if self.changed_cells is not None:
+      grid.track_looks()
+    cells = iter(grid.sample_free_cells(self.num_critters * len(self.critter_class_stats), self.random))
+    self.grid = grid
+    self.infos = []
     self.critters = []
     self.move_count = 0
+    self.fight_count = 0
+    self.step_count = 0
     new_stats = {}
     for critter_class in self.critter_class_stats.keys():
       new_stats[critter_class] = ClassStats(initial_count=self.num_critters)
       new_stats[critter_class].alive += self.num_critters
       for i in range(self.num_critters):
-        args = CritterSim.create_parameters(critter_class)
+        args = CritterSim.create_parameters(critter_class, self.random)
         c = critter_class(*args)
         self.critters.append(c)
-        pos = self.random_location()
-        self.critter_positions[c] = pos
-        self.grid[pos.x][pos.y] = c
+        self.grid.set_cell(next(cells), c)
     self.critter_class_stats = new_stats
 
+    if self.recorder is not None:
+      self.recorder.keyframe()
+
+
+  def __getstate__(self):
+    """
+    What pickling a simulation keeps, for checkpoints (see critter_checkpoint): everything but its lock, recorder, change tracking, prefetchers and turn order, which belong to whoever runs it, the methods a Profiler or Budget wrapped, and the CritterInfo, Cells and Positions views and neighbor table, which are rebuilt on unpickling. Critters and their positions are kept in the grid's critter store.
+    """
+    state = self.__dict__.copy()
+    for name in ('list_lock', 'recorder', 'changed_cells', 'prefetchers', 'turn_order', 'infos', 'critter_infos', 'critter_cells', 'critter_positions', 'neighbors'):
+      del state[name]
+    state.pop('update', None)
+    state.pop('fight', None)
+    return state
+
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self.list_lock = threading.Lock()
+    self.recorder = None
+    self.changed_cells = None
+    self.grid.looks = None
+    self.prefetchers = []
+    self.turn_order = None
+    self.neighbors = neighbor_table(self.width, self.height)
+    self.critter_cells = Cells(self)
+    self.critter_positions = Positions(self)
+    self.infos = []
+    self.critter_infos = Infos(self)
+
 
   def __str__(self):
     """
@@ -229,6 +407,13 @@ class CritterSim():
     """
     results = sorted(self.critter_class_stats.items(), key=lambda stats: -(stats[1].kills + stats[1].alive))
 
+    # budget violations only get a column once there are any; disqualified classes are marked with DQ
+    if any(stats.violations or stats.disqualified for stats in self.critter_class_stats.values()):
+      header = "-" * 53 + '\n'
+      header += "%-20s %5s\t%5s\t%5s\t%5s\n" % ("Critter", "Wins", "Alive", "Total", "Late")
+      header += "-" * 53 + '\n'
+      return header + '\n'.join(['%-20s %5d\t%5d\t%5d\t%5d%s' % (critter.__name__, stats.kills, stats.alive, stats.kills + stats.alive, stats.violations, ' DQ' if stats.disqualified else '') for critter, stats in results])
+
     header = "-" * 45 + '\n'
     header += "%-20s %5s\t%5s\t%5s\n" % ("Critter", "Wins", "Alive", "Total")
     header += "-" * 45 + '\n'
@@ -236,54 +421,570 @@ class CritterSim():
     return header + '\n'.join(['%-20s %5d\t%5d\t%5d' % (critter.__name__, stats.kills, stats.alive, stats.kills + stats.alive) for critter, stats in results])
 
 
+def split_seed(seed, count):
+  """
+  Derives count independent seeds from seed, e.g. one per match of a batch or per worker, so that many simulations can run from a single reproducible seed without sharing a random stream. Returns a list of 64-bit ints.
+  """
+  return [int.from_bytes(hashlib.sha256(b'%d:%d' % (seed, i)).digest()[:8], 'little') for i in range(count)]
+
+
 class ClassStats():
   """
   This would be a named tuple, but they're immutable and that's somewhat unwieldy for this particular case.
   """
+  __slots__ = ('kills', 'alive', 'count', 'violations', 'disqualified')
+
   def __init__(self, kills=0, alive=0, initial_count=0):
     self.kills = kills
     self.alive = alive
     self.count = initial_count
 
+    # calls that ran over their time budget, and whether that got the class disqualified (see critter_budget)
+    self.violations = 0
+    self.disqualified = False
+
   def __repr__(self):
     return '%s %s %s' % (self.kills, self.alive, self.count)
 
 
+class DecisionCache():
+  """
+  Remembers what the critters of pure classes (see Critter.pure) decided, so the simulation can skip calling them when they are in a situation they have been in before. A move is keyed by the classes of the 8 neighbors, which is all a pure critter's get_move looks at, and an attack by the opponent's char and color. Every class and callback keeps its size most recently used decisions.
+
+  stats maps every class to its [move hits, move misses, fight hits, fight misses].
+  """
+  def __init__(self, size=MEMO_SIZE):
+    self.size = size
+    self.moves = {}
+    self.fights = {}
+    self.stats = {}
+
+  def add(self, critter_class):
+    if critter_class not in self.moves:
+      self.moves[critter_class] = collections.OrderedDict()
+      self.fights[critter_class] = collections.OrderedDict()
+      self.stats[critter_class] = [0, 0, 0, 0]
+
+  def get_move(self, sim, critter, cell):
+    """Returns the move of critter, standing on cell of sim, from the cache, or from calling it if it is not there yet."""
+    cache = self.moves[critter.__class__]
+    grid = sim.grid
+    ids = grid.ids
+    critters = grid.critters
+    base = 8 * cell
+    key = tuple([critters[ids[neighbor]].__class__ for neighbor in sim.neighbors.around[base:base + 8]])
+    move = cache.get(key)
+    if move is not None:
+      cache.move_to_end(key)
+      self.stats[critter.__class__][0] += 1
+      return move
+
+    move = critter.get_move(sim.critter_infos[critter])
+    self.stats[critter.__class__][1] += 1
+    cache[key] = move
+    if len(cache) > self.size:
+      cache.popitem(last=False)
+    return move
+
+  def fight(self, sim, critter, opponent):
+    """Returns the attack of critter against opponent in sim from the cache, or from calling it if it is not there yet."""
+    cache = self.fights[critter.__class__]
+    key = (opponent.get_char(), opponent.get_color())
+    attack = cache.get(key)
+    if attack is not None:
+      cache.move_to_end(key)
+      self.stats[critter.__class__][2] += 1
+      return attack
+
+    attack = critter.fight(sim.critter_infos[opponent])
+    self.stats[critter.__class__][3] += 1
+    cache[key] = attack
+    if len(cache) > self.size:
+      cache.popitem(last=False)
+    return attack
+
+  def __str__(self):
+    """Returns a table of every class's hit rates."""
+    header = "-" * 53 + '\n'
+    header += "%-20s %15s  %15s\n" % ("Pure critter", "Move hits", "Fight hits")
+    header += "-" * 53 + '\n'
+    rows = []
+    for critter_class, (move_hits, move_misses, fight_hits, fight_misses) in self.stats.items():
+      rows.append('%-20s %15s  %15s' % (critter_class.__name__, hit_rate(move_hits, move_misses), hit_rate(fight_hits, fight_misses)))
+    return header + '\n'.join(rows)
+
+
+def hit_rate(hits, misses):
+  return '%5.1f%% of %-6d' % (100 * hits / (hits + misses), hits + misses) if hits + misses else '-'
+
+
+class StopConditions():
+  """
+  Reasons to end a run before its last tick: only one critter class is left alive (single_survivor), nobody has been killed for quiet_window ticks, or time_limit seconds have passed since the conditions were made. Any of them may be left out.
+  """
+  def __init__(self, single_survivor=False, quiet_window=None, time_limit=None):
+    self.single_survivor = single_survivor
+    self.quiet_window = quiet_window
+    self.time_limit = time_limit
+    self.deadline = time.monotonic() + time_limit if time_limit is not None else None
+    self.kills = None
+    self.last_kill = 0
+
+  def reached(self, sim):
+    """Returns why sim should stop now, as a sentence, or None if it should go on. Meant to be called after every tick."""
+    stats = sim.critter_class_stats.values()
+    if self.single_survivor and sum(1 for class_stats in stats if class_stats.alive) <= 1:
+      return "Stopped after %d ticks: only one critter class is left." % sim.move_count
+
+    if self.quiet_window is not None:
+      kills = sum(class_stats.kills for class_stats in stats)
+      if kills != self.kills:
+        self.kills = kills
+        self.last_kill = sim.move_count
+      elif sim.move_count - self.last_kill >= self.quiet_window:
+        return "Stopped after %d ticks: no kills in the last %d." % (sim.move_count, self.quiet_window)
+
+    if self.deadline is not None and time.monotonic() >= self.deadline:
+      return "Stopped after %d ticks: the %g second time limit is up." % (sim.move_count, self.time_limit)
+    return None
+
+
+class Grid():
+  """
+  The game board, stored flat in row-major order: cell (x, y) is index y * width + x. Each cell holds the id of the critter standing on it (0 when empty) in a typed array, and an occupancy map with one byte per cell is kept alongside, so renderers, stats and neighbor queries can scan rows or the whole board with bulk reads instead of touching critter objects. grid[x][y] still reads and writes critters, through GridColumn.
+
+  Random empty cells are picked from the occupancy map itself, by drawing cells until an empty one comes up while at least a quarter of the board is empty, and by counting through the empty ones when it is fuller, so that picking them costs no memory beyond the occupancy map's one byte per cell.
+
+  The critters themselves are kept in a store of parallel arrays indexed by critter id: critters[id] is the critter, which its callbacks are called on, cells[id] the flat index of its cell and classes[id] the number of its class (see class_ids), 0 for an id nobody has, so that a million critters take a few bytes each on top of their own objects, and per-class counts are array reductions (see census). Ids are reused once their critters have left the board; generations[id] counts how many times that has happened, so that a CritterInfo made for an id can tell that its critter is gone.
+  """
+  def __init__(self, width, height):
+    self.width = width
+    self.height = height
+    self.ids = array.array('I', [0]) * (width * height)
+    self.occupancy = bytearray(width * height)
+
+    # how many cells are occupied, kept up to date on every write
+    self.occupied = 0
+
+    # the critter store: id 0 means "nobody", and critter_ids maps every critter on the board back to its id.
+    self.critters = [None]
+    self.cells = array.array('I', [0])
+    self.classes = array.array('H', [0])
+    self.generations = array.array('I', [0])
+    self.critter_ids = {}
+    self._free_ids = []
+    # ids handed out again since the simulation last caught up with them, see CritterSim.grow_infos
+    self.reused = []
+
+    # a map of critter classes to their numbers in classes, from 1, in the order they were first seen.
+    self.class_ids = {}
+
+    # the (char, color) every critter was last seen with, by id, once track_looks() is called, or None.
+    self.looks = None
+
+  def index(self, x, y):
+    """Returns the flat index of cell (x, y)."""
+    return y * self.width + x
+
+  def get(self, x, y):
+    """Returns the critter at (x, y), or None."""
+    return self.critters[self.ids[y * self.width + x]]
+
+  def set(self, x, y, critter):
+    """Puts critter at (x, y). Passing None empties the cell."""
+    self.set_cell(y * self.width + x, critter)
+
+  def set_cell(self, i, critter):
+    """Puts critter on flat index i. Passing None empties the cell."""
+    if critter is None:
+      self.clear_cell(i)
+    else:
+      if not self.occupancy[i]:
+        self.occupied += 1
+      critter_id = self.id_of(critter)
+      self.ids[i] = critter_id
+      self.cells[critter_id] = i
+      self.occupancy[i] = 1
+
+  def move_cell(self, src, dst):
+    """Moves the critter on flat index src to flat index dst, leaving src empty."""
+    if src != dst:
+      if self.occupancy[dst]:
+        # the critter on dst is replaced
+        self.occupied -= 1
+      critter_id = self.ids[src]
+      self.ids[dst] = critter_id
+      self.cells[critter_id] = dst
+      self.occupancy[dst] = 1
+      self.ids[src] = 0
+      self.occupancy[src] = 0
+
+  def clear_cell(self, i):
+    """Empties the cell at flat index i."""
+    if self.occupancy[i]:
+      self.occupied -= 1
+      self.ids[i] = 0
+      self.occupancy[i] = 0
+
+  def free_count(self):
+    """Returns how many cells are empty."""
+    return len(self.occupancy) - self.occupied
+
+  def random_free_cell(self, rng=random):
+    """Returns the flat index of a random empty cell, picked with rng, or raises a LocationException if there is none."""
+    cells = len(self.occupancy)
+    free = cells - self.occupied
+    if not free:
+      raise LocationException("Error: cannot place a critter, the %dx%d board is full." % (self.width, self.height))
+    if 4 * free >= cells:
+      # at most 4 draws on average
+      occupancy = self.occupancy
+      while True:
+        i = rng.randrange(cells)
+        if not occupancy[i]:
+          return i
+    return self.nth_free_cell(rng.randrange(free))
+
+  def sample_free_cells(self, k, rng=random):
+    """Returns the flat indices of k distinct random empty cells as a list, picked with rng, or raises a LocationException if there are fewer than k."""
+    cells = len(self.occupancy)
+    free = cells - self.occupied
+    if k > free:
+      raise LocationException("Error: cannot place %d critters, only %d of the %d cells on the %dx%d board are empty." % (k, free, cells, self.width, self.height))
+    if 8 * (free - k) < cells:
+      # too few empty cells left to find by chance: list them all
+      return rng.sample(list(self.free_cells()), k)
+
+    # every draw is of a cell that is empty and not yet picked at least 1 time in 8
+    occupancy = self.occupancy
+    picked = set()
+    sample = []
+    while len(sample) < k:
+      i = rng.randrange(cells)
+      if not occupancy[i] and i not in picked:
+        picked.add(i)
+        sample.append(i)
+    return sample
+
+  def free_cells(self):
+    """Yields the flat index of every empty cell, in row-major order."""
+    find = self.occupancy.find
+    i = find(0)
+    while i != -1:
+      yield i
+      i = find(0, i + 1)
+
+  def nth_free_cell(self, n):
+    """Returns the flat index of the empty cell n cells into the empty ones in row-major order, skipping FREE_CHUNK cells at a time by counting their empty cells in one go."""
+    occupancy = self.occupancy
+    start = 0
+    while True:
+      free = occupancy.count(0, start, start + FREE_CHUNK)
+      if n < free:
+        break
+      n -= free
+      start += FREE_CHUNK
+    i = occupancy.find(0, start)
+    for skip in range(n):
+      i = occupancy.find(0, i + 1)
+    return i
+
+  def id_of(self, critter):
+    """Returns the id of critter, handing it a new one the first time it is seen."""
+    critter_id = self.critter_ids.get(critter)
+    if critter_id is None:
+      if self._free_ids:
+        critter_id = self._free_ids.pop()
+        self.critters[critter_id] = critter
+        self.reused.append(critter_id)
+      else:
+        critter_id = len(self.critters)
+        self.critters.append(critter)
+        self.cells.append(0)
+        self.classes.append(0)
+        self.generations.append(0)
+        if self.looks is not None:
+          self.looks.append(None)
+      if self.looks is not None:
+        self.looks[critter_id] = None
+      self.classes[critter_id] = self.class_id(critter.__class__)
+      self.critter_ids[critter] = critter_id
+    return critter_id
+
+  def track_looks(self):
+    """Starts keeping how every critter looks, for update_look."""
+    if self.looks is None:
+      self.looks = [None] * len(self.critters)
+
+  def update_look(self, critter_id, critter):
+    """Returns whether critter, which has critter_id, looks different from when it was last seen (or was never seen), and remembers how it looks now. Only allocates when it does look different."""
+    char = critter.get_char()
+    color = critter.get_color()
+    look = self.looks[critter_id]
+    if look is not None and look[0] == char and look[1] == color:
+      return False
+    self.looks[critter_id] = (char, color)
+    return True
+
+  def class_id(self, critter_class):
+    """Returns the number of critter_class in classes, handing it a new one the first time it is seen."""
+    number = self.class_ids.get(critter_class)
+    if number is None:
+      number = self.class_ids[critter_class] = len(self.class_ids) + 1
+    return number
+
+  def release(self, critter):
+    """Frees the id of a critter that has left the board for good, so it can be reused, and starts the id's next generation. The critter's cell should be emptied or taken over straight after."""
+    critter_id = self.critter_ids.pop(critter)
+    self.critters[critter_id] = None
+    self.classes[critter_id] = 0
+    self.generations[critter_id] = (self.generations[critter_id] + 1) & 0xFFFFFFFF
+    self._free_ids.append(critter_id)
+
+  def census(self):
+    """Returns a map of every critter class seen to how many critters of it have an id, counted over classes."""
+    return {critter_class: self.classes.count(number) for critter_class, number in self.class_ids.items()}
+
+  def row(self, y):
+    """Returns the critter ids of row y as an array, from x = 0 to width - 1."""
+    return self.ids[y * self.width:(y + 1) * self.width]
+
+  def row_occupancy(self, y):
+    """Returns the occupancy map of row y as bytes, 1 for an occupied cell and 0 for an empty one."""
+    return bytes(self.occupancy[y * self.width:(y + 1) * self.width])
+
+  def occupied_cells(self):
+    """Yields the flat index of every occupied cell, in row-major order."""
+    find = self.occupancy.find
+    i = find(1)
+    while i != -1:
+      yield i
+      i = find(1, i + 1)
+
+  def __getitem__(self, x):
+    # like a list: negative x counts from the right edge
+    if x < 0:
+      x += self.width
+    if not 0 <= x < self.width:
+      raise IndexError("grid column %d is off the %dx%d board" % (x, self.width, self.height))
+    return GridColumn(self, x)
+
+  def __iter__(self):
+    for x in range(self.width):
+      yield GridColumn(self, x)
+
+  def __len__(self):
+    return self.width
+
+
+class GridColumn():
+  """
+  Column x of a Grid, so that grid[x][y] works like it did when the grid was a list of lists, down to negative indices counting from the end and the IndexError for a y off the board.
+  """
+  __slots__ = ('_grid', '_x')
+
+  def __init__(self, grid, x):
+    self._grid = grid
+    self._x = x
+
+  def __getitem__(self, y):
+    return self._grid.get(self._x, self._check(y))
+
+  def __setitem__(self, y, critter):
+    self._grid.set(self._x, self._check(y), critter)
+
+  def __iter__(self):
+    for y in range(self._grid.height):
+      yield self._grid.get(self._x, y)
+
+  def __len__(self):
+    return self._grid.height
+
+  def _check(self, y):
+    """Returns y as an index from the top, counting a negative y from the bottom, or raises an IndexError if it is off the board."""
+    if y < 0:
+      y += self._grid.height
+    if not 0 <= y < self._grid.height:
+      raise IndexError("grid row %d is off the %dx%d board" % (y, self._grid.width, self._grid.height))
+    return y
+
+
+class NeighborTable():
+  """
+  Precomputed wraparound neighbors of every cell of a width x height board, so finding a neighbor is a single index instead of a chain of comparisons and two modulos. The neighbor of flat index i in direction d is around[8 * i + SLOTS[d]], and the 8 neighbors of i are the slice around[8 * i:8 * i + 8], in the order of constants.VALID_DIRECTIONS. Takes 32 bytes per cell, so get one through neighbor_table(), which shares it between every simulation with the same board size.
+  """
+  # position of each direction among a cell's 8 neighbors
+  SLOTS = {direction: slot for slot, direction in enumerate(constants.VALID_DIRECTIONS)}
+
+  OFFSETS = {
+    constants.NORTHWEST: (-1, -1),
+    constants.NORTH: (0, -1),
+    constants.NORTHEAST: (1, -1),
+    constants.EAST: (1, 0),
+    constants.SOUTHEAST: (1, 1),
+    constants.SOUTH: (0, 1),
+    constants.SOUTHWEST: (-1, 1),
+    constants.WEST: (-1, 0),
+  }
+
+  def __init__(self, width, height):
+    self.width = width
+    self.height = height
+    self.around = array.array('I', bytes(4 * 8 * width * height))
+    for direction, slot in NeighborTable.SLOTS.items():
+      dx, dy = NeighborTable.OFFSETS[direction]
+      # the neighbors in this direction, one row at a time: the row above or below, rotated left or right
+      table = array.array('I')
+      for y in range(height):
+        row = array.array('I', range(((y + dy) % height) * width, ((y + dy) % height + 1) * width))
+        shift = dx % width
+        table += row[shift:]
+        table += row[:shift]
+      self.around[slot::8] = table
+
+  def neighbor(self, i, direction):
+    """Returns the flat index of the neighbor of flat index i in direction."""
+    return self.around[8 * i + NeighborTable.SLOTS[direction]]
+
+  def neighbors(self, i):
+    """Returns the flat indices of the 8 neighbors of flat index i, in the order of constants.VALID_DIRECTIONS."""
+    return self.around[8 * i:8 * i + 8]
+
+
+@functools.lru_cache(maxsize=4)
+def neighbor_table(width, height):
+  """Returns the NeighborTable for a width x height board, building it the first time it is asked for."""
+  return NeighborTable(width, height)
+
+
+class Cells(collections.abc.Mapping):
+  """
+  Read-only view of where every critter of a simulation is, as a map of critters to flat grid indices, read from the critter store of the simulation's current grid.
+  """
+  __slots__ = ('_sim',)
+
+  def __init__(self, sim):
+    self._sim = sim
+
+  def __getitem__(self, critter):
+    grid = self._sim.grid
+    return grid.cells[grid.critter_ids[critter]]
+
+  def __contains__(self, critter):
+    return critter in self._sim.grid.critter_ids
+
+  def __iter__(self):
+    return iter(self._sim.grid.critter_ids)
+
+  def __len__(self):
+    return len(self._sim.grid.critter_ids)
+
+
+class Positions(Cells):
+  """
+  Read-only view of where every critter of a simulation is, as a map of critters to (x, y) Points. The simulation itself keeps flat grid indices, so a Point is only built when one is asked for.
+  """
+  __slots__ = ()
+
+  def __getitem__(self, critter):
+    return self._sim.point(Cells.__getitem__(self, critter))
+
+
+class Infos(Cells):
+  """
+  Read-only view of the CritterInfo the simulation hands to every critter on the board, as a map of critters to CritterInfos.
+  """
+  __slots__ = ()
+
+  def __getitem__(self, critter):
+    sim = self._sim
+    grid = sim.grid
+    critter_id = grid.critter_ids[critter]
+    if critter_id >= len(sim.infos) or grid.reused:
+      sim.grow_infos()
+    return sim.infos[critter_id]
+
+
 class CritterInfo():
   """
-  Helper class for packaging up and providing access to useful information about a critter.
+  Read-only view of useful information about the critter with a given id. Nothing is copied or computed up front; every getter reads the live simulation when it is called, so the simulation can keep a single view per id and hand it out every tick to the critter that has the id. The view is of the id's generation when it was made (see Grid.generations): once that critter has left the board, every getter raises a LocationException rather than describe whoever has the id next.
   """
-  def __init__(self, sim_obj, critter_obj):
+  __slots__ = ('_sim', '_id', '_generation')
+
+  def __init__(self, sim_obj, critter_id):
     self._sim = sim_obj
-    self._pos = self._sim.critter_positions[critter_obj]
-    self._width = self._sim.width
-    self._height = self._sim.height
-    self._grid = self._sim.grid.copy()
-    self._char = critter_obj.get_char()
-    self._color = critter_obj.get_color()
+    self._id = critter_id
+    self._generation = sim_obj.grid.generations[critter_id]
 
   def get_pos(self):
-    return (self._pos.x, self._pos.y)
+    sim = self._sim
+    grid = sim.grid
+    if grid.generations[self._id] != self._generation:
+      self._gone()
+    cell = grid.cells[self._id]
+    return (cell % sim.width, cell // sim.width)
 
   def get_dimensions(self):
-    return (self._width, self._height)
+    return (self._sim.width, self._sim.height)
 
   def get_char(self):
-    return self._char
+    grid = self._sim.grid
+    if grid.generations[self._id] != self._generation:
+      self._gone()
+    return grid.critters[self._id].get_char()
 
   def get_color(self):
-    return self._color
+    grid = self._sim.grid
+    if grid.generations[self._id] != self._generation:
+      self._gone()
+    return grid.critters[self._id].get_color()
 
   def get_neighbor(self, direction):
-    self._verify_direction(direction)
-    neighbor_pos = self._sim.move(direction, self._pos)
-    neighbor = self._grid[neighbor_pos.x][neighbor_pos.y]
+    slot = NeighborTable.SLOTS.get(direction)
+    if slot is None:
+      self._invalid_direction(direction)
+    sim = self._sim
+    grid = sim.grid
+    if grid.generations[self._id] != self._generation:
+      self._gone()
+    neighbor = grid.critters[grid.ids[sim.neighbors.around[8 * grid.cells[self._id] + slot]]]
 
     return neighbor.__class__.__name__ if neighbor else '.'
 
-  def _verify_direction(self, direction):
-    if direction not in constants.VALID_DIRECTIONS:
-      raise LocationException("Error: %s is not a valid direction." % direction)
+  def get_neighbors(self, directions=constants.VALID_DIRECTIONS):
+    """
+    Returns what get_neighbor would for each of directions, as a list in the same order. By default, all 8 neighbors in the order of constants.VALID_DIRECTIONS.
+    """
+    sim = self._sim
+    grid = sim.grid
+    if grid.generations[self._id] != self._generation:
+      self._gone()
+    ids = grid.ids
+    critters = grid.critters
+    base = 8 * grid.cells[self._id]
+    if directions is constants.VALID_DIRECTIONS:
+      cells = sim.neighbors.around[base:base + 8]
+    else:
+      slots = NeighborTable.SLOTS
+      around = sim.neighbors.around
+      cells = []
+      for direction in directions:
+        slot = slots.get(direction)
+        if slot is None:
+          self._invalid_direction(direction)
+        cells.append(around[base + slot])
+
+    neighbors = []
+    for cell in cells:
+      neighbor = critters[ids[cell]]
+      neighbors.append(neighbor.__class__.__name__ if neighbor else '.')
+    return neighbors
+
+  def _invalid_direction(self, direction):
+    raise LocationException("Error: %s is not a valid direction." % direction)
+
+  def _gone(self):
+    raise LocationException("Error: the critter this CritterInfo was made for has left the board.")
 
 
 # These exceptions don't really need fancy names
@@ -0,0 +1,119 @@
+import collections
+import concurrent.futures
+import functools
+import hashlib
+import inspect
+import itertools
+import json
+import os
+import critter
+import critter_batch
+import critter_sim
+
+# Where match results are cached, inside the directory the sweep runs in. Bump CACHE_VERSION when a change to the engine changes the outcome of matches, so that results from before it are not reused.
+CACHE_DIR = '.critter_sweep'
+CACHE_VERSION = 2
+
+# One configuration of a sweep: the board size, the number of critters of each class, the ticks per match and the critter classes playing.
+Cell = collections.namedtuple('Cell', ['width', 'height', 'num', 'iterations', 'contenders'])
+
+
+@functools.lru_cache(maxsize=None)
+def critter_digest(critter_class):
+  """
+  Returns the sha256 of the source of critter_class and of every critter class it inherits from, so that a result stays valid for as long as the code of the critters that played it does. Module-level helpers a critter calls are not covered.
+  """
+  digest = hashlib.sha256()
+  for cls in critter_class.__mro__:
+    if issubclass(cls, critter.Critter):
+      digest.update(cls.__qualname__.encode())
+      try:
+        digest.update(inspect.getsource(cls).encode())
+      except (OSError, TypeError):
+        # made on the fly, like critter_worker's stand-ins: only the name is known
+        pass
+  return digest.hexdigest()
+
+
+def grid(widths, heights, nums, iterations, contender_sets):
+  """Returns every Cell of the grid spanned by the given lists of values, in order, the last list varying fastest."""
+  return [Cell(*values) for values in itertools.product(widths, heights, nums, iterations, [tuple(contenders) for contenders in contender_sets])]
+
+
+def match_key(cell, seed):
+  """Returns the configuration of the match of cell played with seed, as a dict that can be stored as JSON, and its cache key, the sha256 of that JSON."""
+  config = {
+    'version': CACHE_VERSION,
+    'width': cell.width,
+    'height': cell.height,
+    'num': cell.num,
+    'iterations': cell.iterations,
+    'seed': seed,
+    # by name and source, in the order they are added to the board, which the outcome depends on
+    'critters': [[contender.__name__, critter_digest(contender)] for contender in cell.contenders],
+  }
+  return config, hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+
+class ResultCache():
+  """
+  Match results on disk, one JSON file per match named after its key (see match_key) and holding its configuration next to its result, so a cached result is only found again for exactly the same match. Files are written next to their place first and then moved in, so an interrupted sweep never leaves a broken one behind.
+  """
+  def __init__(self, root=CACHE_DIR):
+    self.root = root
+
+  def path(self, key):
+    return os.path.join(self.root, key[:2], key + '.json')
+
+  def get(self, key):
+    """Returns the cached result of the match with key, or None."""
+    try:
+      with open(self.path(key)) as f:
+        return {name: tuple(counts) for name, counts in json.load(f)['result'].items()}
+    except (OSError, ValueError, KeyError):
+      return None
+
+  def put(self, key, config, result):
+    path = self.path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'w') as f:
+      json.dump({'config': config, 'result': result}, f)
+    os.replace(path + '.tmp', path)
+
+
+def run_sweep(cells, matches, seed, workers=None, cache=None):
+  """
+  Plays matches matches of every cell of a sweep across a pool of worker processes and returns a list of (cell, BatchResults, how many of its matches came from cache), in the order of cells. Every cell plays the same seeds, derived from seed, so cells differ only by their configuration, and its BatchResults holds their results in seed order. With cache, a ResultCache, matches already in it are not played again, and every match played is added to it as soon as it is done.
+  """
+  seeds = critter_sim.split_seed(seed, matches)
+  outcomes = [[None] * matches for cell in cells]
+  cached = [0] * len(cells)
+
+  jobs = []
+  for i, cell in enumerate(cells):
+    for j, match_seed in enumerate(seeds):
+      config, key = match_key(cell, match_seed)
+      result = cache.get(key) if cache is not None else None
+      if result is not None:
+        outcomes[i][j] = result
+        cached[i] += 1
+      else:
+        jobs.append((i, j, config, key, match_seed))
+
+  if jobs:
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+      futures = {pool.submit(critter_batch.run_match, cells[i].contenders, cells[i].width, cells[i].height, cells[i].num, cells[i].iterations, match_seed): (i, j, config, key)
+                 for i, j, config, key, match_seed in jobs}
+      for future in concurrent.futures.as_completed(futures):
+        i, j, config, key = futures[future]
+        outcomes[i][j] = future.result()
+        if cache is not None:
+          cache.put(key, config, outcomes[i][j])
+
+  sweep = []
+  for cell, cell_outcomes, cell_cached in zip(cells, outcomes, cached):
+    results = critter_batch.BatchResults([contender.__name__ for contender in cell.contenders])
+    for result in cell_outcomes:
+      results.add(result)
+    sweep.append((cell, results, cell_cached))
+  return sweep
@@ -0,0 +1,107 @@
+import random
+import constants
+import critter
+import critter_sim
+
+# Move and attack policies for TableCritters. Each one can make its choice one call at a time, like a critter's get_move() and fight() do, and also describes itself as data, which is all critter_vector.VectorSim looks at.
+
+
+class CycleMove():
+  """
+  Moves in each of directions in turn, one per tick, starting over after the last one.
+  """
+  is_random = False
+
+  def __init__(self, *directions):
+    if not directions:
+      raise critter_sim.LocationException("Error: a move cycle needs at least one direction.")
+    for direction in directions:
+      critter_sim.CritterSim.verify_move(direction)
+    self.directions = directions
+
+  def choose(self, turn):
+    return self.directions[turn % len(self.directions)]
+
+
+class FixedMove(CycleMove):
+  """
+  Always moves in direction.
+  """
+  def __init__(self, direction):
+    super().__init__(direction)
+
+
+class RandomMove():
+  """
+  Moves in one of directions picked uniformly at random every tick. Defaults to any valid move.
+  """
+  is_random = True
+
+  def __init__(self, *directions):
+    directions = directions or constants.VALID_MOVES
+    for direction in directions:
+      critter_sim.CritterSim.verify_move(direction)
+    self.directions = directions
+
+  def choose(self, turn):
+    return random.choice(self.directions)
+
+
+class RandomAttack():
+  """
+  Attacks with each attack with a fixed probability, given as a dict mapping attacks to relative weights. Attacks that are left out are never used.
+  """
+  def __init__(self, weights):
+    for attack in weights:
+      if attack not in constants.VALID_ATTACKS:
+        raise critter_sim.AttackException("Error: %s is not a valid attack." % attack)
+    total = sum(weights.values())
+    if total <= 0:
+      raise critter_sim.AttackException("Error: an attack distribution needs a positive total weight.")
+    self.attacks = tuple(weights)
+    self.weights = tuple(weights.values())
+
+    # the probability of each of constants.VALID_ATTACKS, in that order
+    self.probabilities = tuple(weights.get(attack, 0) / total for attack in constants.VALID_ATTACKS)
+
+  def choose(self):
+    return random.choices(self.attacks, self.weights)[0]
+
+
+class FixedAttack(RandomAttack):
+  """
+  Always attacks with attack.
+  """
+  def __init__(self, attack):
+    super().__init__({attack: 1})
+
+  def choose(self):
+    return self.attacks[0]
+
+
+class TableCritter(critter.Critter):
+  """
+  A critter whose behavior is data rather than code: it looks like char and color, moves according to move_policy and attacks according to attack_policy, never looking at the board or its opponent. Subclasses only set those four class attributes. Besides running in a CritterSim like any other critter, such critters can run in critter_vector.VectorSim, which plays whole ticks with array operations.
+  """
+  char = '?'
+  color = constants.BLACK
+  move_policy = FixedMove(constants.CENTER)
+  attack_policy = FixedAttack(constants.ROAR)
+
+  def __init__(self):
+    # number of moves made so far, for cycles
+    self.turn = 0
+
+  def get_char(self):
+    return self.char
+
+  def get_color(self):
+    return self.color
+
+  def get_move(self, self_info):
+    move = self.move_policy.choose(self.turn)
+    self.turn += 1
+    return move
+
+  def fight(self, opp_info):
+    return self.attack_policy.choose()
@@ -0,0 +1,194 @@
+import constants
+import critter_sim
+import critter_table
+
+try:
+  import numpy as np
+except ImportError:
+  np = None
+
+
+class VectorSim():
+  """
+  A second engine for TableCritters only, playing by the same rules as CritterSim but resolving whole ticks with NumPy array operations instead of one critter at a time, for boards with hundreds of thousands of critters.
+
+  Critters are rows of arrays (class id, cell, turn) rather than objects, and the board is an array mapping every cell to the row of its critter, or -1. Since a table critter's move does not depend on the board, every critter's target cell is drawn at the start of the tick. The tick is then played in waves: a critter's turn only involves its own cell and its target cell, so a critter whose cells are touched by no critter still waiting with an earlier turn can take its turn right away, alongside every other such critter, whose cells are necessarily disjoint from its own. Each wave therefore ends exactly where CritterSim, taking turns in the same random order, would have, so outcomes follow the same distribution; only the random draws differ.
+  """
+  # the offset (dx, dy) of every valid move
+  OFFSETS = {
+    constants.NORTH: (0, -1),
+    constants.EAST: (1, 0),
+    constants.SOUTH: (0, 1),
+    constants.WEST: (-1, 0),
+    constants.CENTER: (0, 0),
+  }
+
+  def __init__(self, width, height, seed=None):
+    if np is None:
+      raise ImportError("Error: the vectorized engine needs NumPy, which is not installed.")
+    self.width = width
+    self.height = height
+    self.move_count = 0
+    self.fight_count = 0
+    self.step_count = 0
+    self.seed = seed
+    self.random = np.random.default_rng(seed)
+
+    # a map of critter classes to their stats, as in CritterSim, and the classes in class id order.
+    self.critter_class_stats = {}
+    self.classes = []
+    self.num_critters = 0
+
+    # one row per critter: its class id, its flat cell index and the number of moves it made.
+    self.kind = np.zeros(0, np.int32)
+    self.cell = np.zeros(0, np.int64)
+    self.turn = np.zeros(0, np.int64)
+
+    # the row of the critter on every cell, or -1.
+    self.board = np.full(width * height, -1, np.int64)
+
+    # whether the first attack of a fight beats (1), ties (0) or loses to (-1) the second, indexed like constants.VALID_ATTACKS.
+    self.outcomes = np.array([[critter_sim.FIGHT_OUTCOMES[attack1, attack2] for attack2 in constants.VALID_ATTACKS] for attack1 in constants.VALID_ATTACKS], np.int8)
+
+  def add(self, critter, num):
+    """
+    Adds a particular TableCritter type num times. Raises a LocationException, without adding anything, if there are fewer than num empty cells.
+    """
+    if not issubclass(critter, critter_table.TableCritter):
+      raise TypeError("Error: %s is not a TableCritter, so it cannot run in the vectorized engine." % critter.__name__)
+    free = np.flatnonzero(self.board < 0)
+    if num > len(free):
+      raise critter_sim.LocationException("Error: cannot place %d critters, only %d of the %d cells on the %dx%d board are empty." % (num, len(free), self.width * self.height, self.width, self.height))
+    cells = self.random.choice(free, num, replace=False)
+
+    if critter not in self.critter_class_stats:
+      self.critter_class_stats[critter] = critter_sim.ClassStats(initial_count=num)
+      self.classes.append(critter)
+    else:
+      self.critter_class_stats[critter].count += num
+    self.critter_class_stats[critter].alive += num
+    self.num_critters = num
+
+    rows = np.arange(len(self.cell), len(self.cell) + num)
+    self.kind = np.concatenate((self.kind, np.full(num, self.classes.index(critter), np.int32)))
+    self.cell = np.concatenate((self.cell, cells))
+    self.turn = np.concatenate((self.turn, np.zeros(num, np.int64)))
+    self.board[cells] = rows
+
+  def reset(self):
+    """
+    Resets the model, clearing out the whole board and repopulating it with num_critters of the same Critter types.
+    """
+    classes = self.classes
+    num = self.num_critters
+    self.__init__(self.width, self.height, self.seed)
+    for critter in classes:
+      self.add(critter, num)
+
+  def targets(self):
+    """Draws every critter's move for this tick and returns the flat index of the cell it moves to."""
+    dx = np.zeros(len(self.cell), np.int64)
+    dy = np.zeros(len(self.cell), np.int64)
+    for class_id, critter in enumerate(self.classes):
+      rows = np.flatnonzero(self.kind == class_id)
+      policy = critter.move_policy
+      offsets = np.array([VectorSim.OFFSETS[direction] for direction in policy.directions], np.int64)
+      if policy.is_random:
+        moves = self.random.integers(len(offsets), size=len(rows))
+      else:
+        moves = self.turn[rows] % len(offsets)
+      dx[rows] = offsets[moves, 0]
+      dy[rows] = offsets[moves, 1]
+    x = (self.cell % self.width + dx) % self.width
+    y = (self.cell // self.width + dy) % self.height
+    return y * self.width + x
+
+  def attacks(self, rows):
+    """Draws an attack for each of rows, as an index into constants.VALID_ATTACKS."""
+    cumulative = np.cumsum([critter.attack_policy.probabilities for critter in self.classes], axis=1)
+    draws = self.random.random(len(rows))
+    return (draws[:, None] >= cumulative[self.kind[rows], :-1]).sum(axis=1)
+
+  def update(self):
+    """
+    Takes care of updating all Critters, with the same outcome distribution as CritterSim.update.
+    """
+    self.move_count += 1
+    count = len(self.cell)
+    board = self.board
+    cell = self.cell
+    target = self.targets()
+
+    # the order critters take their turns in, like CritterSim's shuffle
+    order = self.random.permutation(count)
+
+    # the earliest turn still waiting on each cell; count when none is
+    earliest = np.full(len(board), count, np.int64)
+
+    kills = np.zeros(len(self.classes), np.int64)
+    deaths = np.zeros(len(self.classes), np.int64)
+    waiting = np.arange(count)
+    while len(waiting):
+      turns = order[waiting]
+      origins = cell[waiting]
+      targets = target[waiting]
+      np.minimum.at(earliest, origins, turns)
+      np.minimum.at(earliest, targets, turns)
+      ready = (earliest[origins] == turns) & (earliest[targets] == turns)
+      earliest[origins] = count
+      earliest[targets] = count
+      rows = waiting[ready]
+      origins = origins[ready]
+      targets = targets[ready]
+      waiting = waiting[~ready]
+
+      # critters killed before their turn don't get one
+      alive = board[origins] == rows
+      rows = rows[alive]
+      origins = origins[alive]
+      targets = targets[alive]
+      self.turn[rows] += 1
+
+      moved = targets != origins
+      rows = rows[moved]
+      origins = origins[moved]
+      targets = targets[moved]
+      board[origins] = -1
+      opponents = board[targets]
+
+      # move onto empty cells
+      empty = opponents < 0
+      board[targets[empty]] = rows[empty]
+      cell[rows[empty]] = targets[empty]
+      self.step_count += int(empty.sum())
+
+      # fight for occupied ones
+      fights = ~empty
+      rows = rows[fights]
+      targets = targets[fights]
+      opponents = opponents[fights]
+      outcomes = self.outcomes[self.attacks(rows), self.attacks(opponents)]
+      won = (outcomes == 1) | ((outcomes == 0) & (self.random.random(len(rows)) > .5))
+      board[targets[won]] = rows[won]
+      cell[rows[won]] = targets[won]
+      self.fight_count += len(rows)
+      self.step_count += int(won.sum())
+      winners = np.where(won, rows, opponents)
+      losers = np.where(won, opponents, rows)
+      kills += np.bincount(self.kind[winners], minlength=len(self.classes))
+      deaths += np.bincount(self.kind[losers], minlength=len(self.classes))
+
+    for critter, killed, died in zip(self.classes, kills, deaths):
+      stats = self.critter_class_stats[critter]
+      stats.kills += int(killed)
+      stats.alive -= int(died)
+
+    # drop the rows of the dead
+    survivors = board[cell] == np.arange(count)
+    self.kind = self.kind[survivors]
+    self.cell = cell[survivors]
+    self.turn = self.turn[survivors]
+    board[self.cell] = np.arange(len(self.cell))
+
+  def __str__(self):
+    return critter_sim.CritterSim.__str__(self)
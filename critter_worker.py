@@ -0,0 +1,315 @@
+import multiprocessing
+import time
+import constants
+import critter
+import critter_budget
+import critter_sim
+
+# How much longer than its budgets a worker may take to answer before it is considered stuck, killed and its class disqualified, to allow for the round trip.
+HANG_GRACE = 0.5
+
+# Operations queued for a worker and sent ahead of its next request, in order.
+SPAWN = 'spawn'  # critter id, constructor args
+RECOVER = 'recover'  # critter id, won, opponent's attack
+FORGET = 'forget'  # critter id
+
+# Requests, each answered by one reply.
+LOOKS = 'looks'  # critter ids -> (id, char, color) per critter
+MOVES = 'moves'  # (critter id, snapshot) pairs -> (id, move or None, char, color, late) per critter
+FIGHT = 'fight'  # critter id, opponent snapshot -> (attack or None, char, color, late)
+QUIT = 'quit'
+
+
+def snapshot(info):
+  """Returns what a CritterInfo tells about its critter right now, as a plain tuple that can be sent to another process and read through a SnapshotInfo."""
+  return (info.get_pos(), info.get_dimensions(), info.get_char(), info.get_color(), tuple(info.get_neighbors()))
+
+
+class SnapshotInfo():
+  """
+  A CritterInfo read from a snapshot instead of a live simulation, handed to critters running out of process. It tells how the board looked when the snapshot was taken: for moves, at the start of the tick.
+  """
+  __slots__ = ('_pos', '_dimensions', '_char', '_color', '_neighbors')
+
+  def __init__(self, pos, dimensions, char, color, neighbors):
+    self._pos = pos
+    self._dimensions = dimensions
+    self._char = char
+    self._color = color
+    self._neighbors = neighbors
+
+  def get_pos(self):
+    return self._pos
+
+  def get_dimensions(self):
+    return self._dimensions
+
+  def get_char(self):
+    return self._char
+
+  def get_color(self):
+    return self._color
+
+  def get_neighbor(self, direction):
+    if direction not in constants.VALID_DIRECTIONS:
+      raise critter_sim.LocationException("Error: %s is not a valid direction." % direction)
+    return self._neighbors[constants.VALID_DIRECTIONS.index(direction)]
+
+  def get_neighbors(self, directions=constants.VALID_DIRECTIONS):
+    return [self.get_neighbor(direction) for direction in directions]
+
+
+def serve(connection, critter_class, call_budget, tick_budget):
+  """
+  The main loop of a worker process running every critter of critter_class. Applies the queued operations of each request, answers it and measures every get_move and fight call against the budgets; a call that runs over is answered with None and flagged late. Returns when asked to quit or when the simulation goes away.
+  """
+  critters = {}
+  spent = 0
+  while True:
+    try:
+      ops, request = connection.recv()
+    except EOFError:
+      return
+
+    for op in ops:
+      if op[0] == SPAWN:
+        critters[op[1]] = critter_class(*op[2])
+      elif op[0] == RECOVER:
+        critters[op[1]].recover(op[2], op[3])
+      elif op[0] == FORGET:
+        del critters[op[1]]
+
+    if request[0] == LOOKS:
+      reply = [(critter_id, critters[critter_id].get_char(), critters[critter_id].get_color()) for critter_id in request[1]]
+
+    elif request[0] == MOVES:
+      spent = 0
+      reply = []
+      for critter_id, info in request[1]:
+        c = critters[critter_id]
+        if tick_budget is not None and spent > tick_budget:
+          reply.append((critter_id, None, c.get_char(), c.get_color(), False))
+          continue
+        # the simulation only knows the looks the critter had after its last reply
+        pos, dimensions, char, color, neighbors = info
+        start = time.perf_counter()
+        move = c.get_move(SnapshotInfo(pos, dimensions, c.get_char(), c.get_color(), neighbors))
+        elapsed = time.perf_counter() - start
+        spent += elapsed
+        late = call_budget is not None and elapsed > call_budget or tick_budget is not None and spent > tick_budget
+        reply.append((critter_id, None if late else move, c.get_char(), c.get_color(), late))
+
+    elif request[0] == FIGHT:
+      c = critters[request[1]]
+      if tick_budget is not None and spent > tick_budget:
+        reply = (None, c.get_char(), c.get_color(), False)
+      else:
+        start = time.perf_counter()
+        attack = c.fight(SnapshotInfo(*request[2]))
+        elapsed = time.perf_counter() - start
+        spent += elapsed
+        late = call_budget is not None and elapsed > call_budget or tick_budget is not None and spent > tick_budget
+        reply = (None if late else attack, c.get_char(), c.get_color(), late)
+
+    elif request[0] == QUIT:
+      return
+
+    connection.send(reply)
+
+
+class Worker():
+  """
+  The simulation's end of a worker process running one critter class. Operations that need no answer (spawns, recovers, forgetting the dead) are queued and sent along with the next request, so a tick costs one round trip for all moves plus one per fight.
+  """
+  def __init__(self, isolation, critter_class):
+    self.isolation = isolation
+    self.critter_class = critter_class
+    self.proxy = None
+    self.connection, child = multiprocessing.Pipe()
+    self.process = multiprocessing.Process(target=serve, args=(child, critter_class, isolation.call_budget, isolation.tick_budget), daemon=True)
+    self.process.start()
+    child.close()
+
+    self.ops = []
+    self.critters = {}
+    self.next_id = 0
+    # proxies spawned since the last reply, whose looks are not known yet
+    self.stale = []
+    self.dead = False
+
+  def send(self, request):
+    self.connection.send((self.ops, request))
+    self.ops = []
+
+  def receive(self, deadline):
+    """Returns the reply to the last request, or None if the worker did not answer by deadline (a time.perf_counter() value, or None to wait forever), in which case it is killed and its class disqualified."""
+    timeout = None if deadline is None else max(0, deadline - time.perf_counter())
+    try:
+      if self.connection.poll(timeout):
+        return self.connection.recv()
+    except (EOFError, OSError):
+      pass
+    self.kill()
+    return None
+
+  def deadline(self, calls):
+    """When an answer to a request making calls budgeted calls is due."""
+    budgets = self.isolation
+    if budgets.tick_budget is None and budgets.call_budget is None:
+      return None
+    patience = budgets.tick_budget if budgets.tick_budget is not None else budgets.call_budget * calls
+    return time.perf_counter() + patience + HANG_GRACE
+
+  def kill(self):
+    self.dead = True
+    self.process.kill()
+    stats = self.isolation.sim.critter_class_stats.get(self.proxy)
+    if stats is not None:
+      stats.violations += 1
+      stats.disqualified = True
+
+  def fetch_looks(self):
+    stale, self.stale = self.stale, []
+    if self.dead:
+      return
+    self.send((LOOKS, [c.id for c in stale]))
+    reply = self.receive(self.deadline(0))
+    for critter_id, char, color in reply or ():
+      c = self.critters[critter_id]
+      c.char = char
+      c.color = color
+
+  def fight(self, c, opp_info):
+    if self.dead or self.isolation.sim.critter_class_stats[self.proxy].disqualified:
+      return critter_budget.DEFAULT_ATTACK
+    self.send((FIGHT, c.id, snapshot(opp_info)))
+    reply = self.receive(self.deadline(1))
+    if reply is None:
+      return critter_budget.DEFAULT_ATTACK
+    attack, c.char, c.color, late = reply
+    if late:
+      self.isolation.violation(self.proxy)
+    return attack if attack is not None else critter_budget.DEFAULT_ATTACK
+
+  def close(self):
+    if not self.dead:
+      try:
+        self.send((QUIT,))
+      except OSError:
+        pass
+      self.process.join(HANG_GRACE)
+      if self.process.is_alive():
+        self.process.kill()
+    self.connection.close()
+
+
+class RemoteCritter(critter.Critter):
+  """
+  Stands in for a critter running in a worker process. Isolation.isolate() makes a subclass of it per isolated class, named after it, so that it can be added to a simulation and shows up in the stats as that class. Moves are fetched for all critters at the start of each tick, and looks come back with every reply.
+  """
+  worker = None
+
+  def __init__(self, *args):
+    worker = self.worker
+    self.id = worker.next_id
+    worker.next_id += 1
+    worker.critters[self.id] = self
+    worker.ops.append((SPAWN, self.id, args))
+    worker.stale.append(self)
+
+    self.move = critter_budget.DEFAULT_MOVE
+    self.char = '?'
+    self.color = constants.BLACK
+
+  def get_char(self):
+    if self.worker.stale:
+      self.worker.fetch_looks()
+    return self.char
+
+  def get_color(self):
+    if self.worker.stale:
+      self.worker.fetch_looks()
+    return self.color
+
+  def get_move(self, self_info):
+    return self.move
+
+  def fight(self, opp_info):
+    return self.worker.fight(self, opp_info)
+
+  def recover(self, won, opp_attack):
+    if not self.worker.dead:
+      self.worker.ops.append((RECOVER, self.id, won, opp_attack))
+
+
+class Isolation():
+  """
+  Runs untrusted critter classes each in its own worker process, so that a critter that loops or sleeps cannot stall the simulation. Add the classes returned by isolate() to the simulation instead of the real ones.
+
+  At the start of every tick, every worker is sent all of its critters' CritterInfo snapshots in one request and answers with all of their moves, so workers think in parallel and a tick costs one round trip per class for moves. A consequence is that isolated critters decide their moves from how the board looked at the start of the tick. Fights cannot be batched and cost a round trip each.
+
+  Budgets work as with critter_budget.Budget, measured in the worker, except that a worker that does not answer in time is killed and its class disqualified: its critters stay on the board, making the default choices.
+  """
+  def __init__(self, sim, call_budget=None, tick_budget=None, disqualify=False):
+    self.sim = sim
+    self.call_budget = call_budget
+    self.tick_budget = tick_budget
+    self.disqualify = disqualify
+    self.workers = []
+
+  def isolate(self, critter_class):
+    """Starts a worker for critter_class and returns the RemoteCritter class to add to the simulation in its place."""
+    worker = Worker(self, critter_class)
+    worker.proxy = type(critter_class.__name__, (RemoteCritter,), {'worker': worker, '__module__': critter_class.__module__, '__doc__': critter_class.__doc__})
+    self.workers.append(worker)
+    return worker.proxy
+
+  def install(self):
+    self.sim.prefetchers.append(self)
+
+  def violation(self, proxy):
+    stats = self.sim.critter_class_stats[proxy]
+    stats.violations += 1
+    if self.disqualify:
+      stats.disqualified = True
+
+  def prefetch(self, sim):
+    """Fetches every isolated critter's move for this tick."""
+    batches = {worker: [] for worker in self.workers}
+    for c in sim.critters:
+      if isinstance(c, RemoteCritter):
+        batches[c.worker].append(c)
+
+    asked = []
+    for worker, critters in batches.items():
+      # forget the critters that died since the last tick
+      alive = {c.id for c in critters}
+      for critter_id in [critter_id for critter_id in worker.critters if critter_id not in alive]:
+        del worker.critters[critter_id]
+        worker.ops.append((FORGET, critter_id))
+
+      if worker.dead or not critters or sim.critter_class_stats[worker.proxy].disqualified:
+        for c in critters:
+          c.move = critter_budget.DEFAULT_MOVE
+        continue
+      worker.stale = []
+      worker.send((MOVES, [(c.id, snapshot(sim.critter_infos[c])) for c in critters]))
+      asked.append((worker, worker.deadline(len(critters))))
+
+    for worker, deadline in asked:
+      reply = worker.receive(deadline)
+      if reply is None:
+        for c in batches[worker]:
+          c.move = critter_budget.DEFAULT_MOVE
+        continue
+      for critter_id, move, char, color, late in reply:
+        c = worker.critters[critter_id]
+        c.move = move if move is not None else critter_budget.DEFAULT_MOVE
+        c.char = char
+        c.color = color
+        if late:
+          self.violation(worker.proxy)
+
+  def close(self):
+    for worker in self.workers:
+      worker.close()
@@ -0,0 +1,13 @@
+import importlib
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+# the engine imports constants, which this tree ships as constant.py
+try:
+  import constants
+except ImportError:
+  sys.modules['constants'] = importlib.import_module('constant')
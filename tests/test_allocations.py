@@ -0,0 +1,40 @@
+import random
+import threading
+import tracemalloc
+import pytest
+import critter_bench
+import critter_sim
+
+# Blocks a steady-state tick may leave allocated, whatever the number of critters: the rebuilt turn order and the odd cache entry, never an object per critter.
+MAX_BLOCKS_PER_TICK = 16
+
+# Memory a tick may take at its peak per critter, which is the rebuilt turn order (a pointer per critter) and the change in the free-cell pool.
+MAX_PEAK_PER_CRITTER = 32
+
+
+@pytest.mark.parametrize('num', [300, 3000])
+def test_steady_state_ticks_do_not_allocate_per_critter(num):
+  random.seed(1)
+  sim = critter_sim.CritterSim(200, 200, threading.Lock(), 1)
+  # the decision cache fills up as it goes, which is not what this is about
+  sim.memo_size = 0
+  for critter_class in (critter_bench.Walker, critter_bench.Statue, critter_bench.Lookout):
+    sim.add(critter_class, num)
+  ticks = 5
+  for i in range(3):
+    sim.update()
+
+  tracemalloc.start()
+  # only what the engine and the critters allocate, not whatever else the process is up to
+  engine = [tracemalloc.Filter(True, critter_sim.__file__), tracemalloc.Filter(True, critter_bench.__file__)]
+  before = tracemalloc.take_snapshot().filter_traces(engine)
+  current = tracemalloc.get_traced_memory()[0]
+  for i in range(ticks):
+    sim.update()
+  peak = tracemalloc.get_traced_memory()[1] - current
+  after = tracemalloc.take_snapshot().filter_traces(engine)
+  tracemalloc.stop()
+
+  blocks = sum(stat.count_diff for stat in after.compare_to(before, 'filename'))
+  assert blocks <= MAX_BLOCKS_PER_TICK * ticks
+  assert peak <= MAX_PEAK_PER_CRITTER * len(sim.critters) + 4096
@@ -0,0 +1,18 @@
+import critter_batch
+import critter_bench
+import critter_sim
+
+CONTENDERS = (critter_bench.Walker, critter_bench.Statue)
+WIDTH, HEIGHT, NUM, ITERATIONS = 20, 20, 30, 30
+
+
+def test_early_stop_counts_a_reproducible_prefix_of_seeds():
+  runs = [critter_batch.run_batch(CONTENDERS, WIDTH, HEIGHT, NUM, ITERATIONS, 60, 5, workers=2, min_matches=10) for run in range(2)]
+  assert runs[0].matches == runs[1].matches < 60
+  assert runs[0].wins == runs[1].wins and runs[0].alive == runs[1].alive
+
+  # exactly the first matches, in seed order
+  expected = critter_batch.BatchResults([critter_class.__name__ for critter_class in CONTENDERS])
+  for match_seed in critter_sim.split_seed(5, runs[0].matches):
+    expected.add(critter_batch.run_match(CONTENDERS, WIDTH, HEIGHT, NUM, ITERATIONS, match_seed))
+  assert runs[0].wins == expected.wins and runs[0].alive == expected.alive
@@ -0,0 +1,26 @@
+import threading
+import critter_bench
+import critter_budget
+import critter_profile
+import critter_sim
+
+
+def test_wrappers_come_off_in_reverse_order():
+  sim = critter_sim.CritterSim(10, 10, threading.Lock(), 0)
+  sim.add(critter_bench.Walker, 10)
+  get_move = critter_bench.Walker.get_move
+  budget = critter_budget.Budget(sim, [critter_bench.Walker], tick_budget=1)
+  budget.install()
+  budgeted_update = sim.update
+  profiler = critter_profile.Profiler(sim, [critter_bench.Walker])
+  profiler.install()
+  sim.update()
+
+  profiler.uninstall()
+  assert sim.update == budgeted_update
+  budget.uninstall()
+  for name in ('update', 'fight'):
+    assert name not in sim.__dict__
+  assert 'shuffle' not in sim.random.__dict__
+  assert critter_bench.Walker.get_move is get_move
+  sim.update()
@@ -0,0 +1,65 @@
+import importlib
+import os
+import critter_index
+import critter_sweep
+
+SOURCE = """import constants
+import critter
+
+
+class %s(critter.Critter):
+  def get_char(self):
+    return '%s'
+
+  def get_color(self):
+    return constants.BLACK
+
+  def get_move(self, info):
+    return constants.%s
+
+  def fight(self, info):
+    return constants.ROAR
+"""
+
+
+def write(path, source):
+  """Writes source to path, with an mtime a second on from the last, as a quick edit on a coarse clock would not get."""
+  mtime = os.stat(path).st_mtime + 1 if path.exists() else None
+  path.write_text(source)
+  if mtime is not None:
+    os.utime(path, (mtime, mtime))
+
+
+def test_index_rescans_a_rewritten_file(tmp_path):
+  path = tmp_path / 'cache_index_critters.py'
+  write(path, SOURCE % ('Mover', 'M', 'NORTH'))
+  assert critter_index.CritterIndex(str(tmp_path)).names() == ['Mover']
+  # read back from the index file this time
+  assert critter_index.CritterIndex(str(tmp_path)).names() == ['Mover']
+
+  write(path, SOURCE % ('Stayer', 'S', 'CENTER'))
+  assert critter_index.CritterIndex(str(tmp_path)).names() == ['Stayer']
+
+
+def test_sweep_replays_matches_of_a_rewritten_critter(tmp_path, monkeypatch):
+  root = tmp_path / 'critters'
+  root.mkdir()
+  path = root / 'cache_sweep_critters.py'
+  write(path, SOURCE % ('Mover', 'M', 'NORTH'))
+  monkeypatch.syspath_prepend(str(root))
+  module = importlib.import_module('cache_sweep_critters')
+  cache = critter_sweep.ResultCache(str(tmp_path / 'cache'))
+
+  def sweep():
+    cells = critter_sweep.grid([10], [10], [5], [20], [[module.Mover]])
+    (cell, results, cached), = critter_sweep.run_sweep(cells, 2, 1, workers=1, cache=cache)
+    return cached
+
+  assert sweep() == 0
+  assert sweep() == 2
+
+  # same name, new code
+  write(path, SOURCE % ('Mover', 'M', 'SOUTH'))
+  module = importlib.reload(module)
+  assert sweep() == 0
+  assert sweep() == 2
@@ -0,0 +1,68 @@
+import random
+import threading
+import critter_bench
+import critter_checkpoint
+import critter_sim
+
+TICKS = 100
+CHECKPOINT_TICK = 40
+
+
+def new_sim():
+  random.seed(6)
+  sim = critter_sim.CritterSim(30, 30, threading.Lock(), 6)
+  for critter_class in (critter_bench.Walker, critter_bench.Walker2, critter_bench.Lookout):
+    sim.add(critter_class, 60)
+  return sim
+
+
+def state(sim):
+  """Returns every class's kills and alive count, and the class and char of the critter on every occupied cell."""
+  grid = sim.grid
+  stats = sorted((critter_class.__name__, stats.kills, stats.alive) for critter_class, stats in sim.critter_class_stats.items())
+  board = [(cell, grid.critters[grid.ids[cell]].__class__.__name__, grid.critters[grid.ids[cell]].get_char()) for cell in grid.occupied_cells()]
+  return sim.move_count, stats, board
+
+
+def test_resumed_run_matches_a_straight_run(tmp_path):
+  path = str(tmp_path / 'run.ckpt')
+  sim = new_sim()
+  for i in range(CHECKPOINT_TICK):
+    sim.update()
+  critter_checkpoint.save(sim, path)
+  for i in range(TICKS - CHECKPOINT_TICK):
+    sim.update()
+  straight = state(sim)
+
+  # the random module is left somewhere else entirely, as in a new process
+  random.seed(99)
+  resumed = critter_checkpoint.load(path)
+  assert resumed.move_count == CHECKPOINT_TICK
+  for i in range(TICKS - CHECKPOINT_TICK):
+    resumed.update()
+  assert state(resumed) == straight
+
+
+def test_stop_conditions():
+  sim = critter_sim.CritterSim(10, 10, threading.Lock(), 1)
+  sim.add(critter_bench.Statue, 5)
+  sim.add(critter_bench.Walker, 5)
+
+  # a new game, with both classes alive and plenty of time left
+  assert critter_sim.StopConditions().reached(sim) is None
+  assert critter_sim.StopConditions(single_survivor=True).reached(sim) is None
+  assert 'time limit' in critter_sim.StopConditions(time_limit=0).reached(sim)
+
+  # only statues left
+  sim.critter_class_stats[critter_bench.Walker].alive = 0
+  assert 'one critter class' in critter_sim.StopConditions(single_survivor=True).reached(sim)
+
+  quiet = critter_sim.StopConditions(quiet_window=3)
+  stats = sim.critter_class_stats[critter_bench.Statue]
+  for tick in range(1, 8):
+    sim.move_count = tick
+    if tick == 2:
+      stats.kills += 1
+    reason = quiet.reached(sim)
+    assert (reason is None) == (tick < 5), tick
+  assert 'no kills in the last 3' in reason
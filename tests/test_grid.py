@@ -0,0 +1,114 @@
+import random
+import threading
+import pytest
+import constants
+import critter_bench
+import critter_sim
+
+
+def make_grid():
+  sim = critter_sim.CritterSim(4, 3, threading.Lock(), 0)
+  sim.add(critter_bench.Statue, 5)
+  return sim.grid
+
+
+def test_columns_match_cells():
+  grid = make_grid()
+  columns = list(grid)
+  assert len(columns) == 4
+  for x, column in enumerate(columns):
+    assert list(column) == [grid.get(x, y) for y in range(3)]
+
+
+def test_negative_indices_count_from_the_end():
+  grid = make_grid()
+  critter = critter_bench.Statue()
+  grid[-1][-1] = critter
+  assert grid.get(3, 2) is critter
+  assert grid[-1][-1] is grid[3][2] is critter
+  assert grid[-4][-3] is grid.get(0, 0)
+
+
+def test_off_board_raises():
+  grid = make_grid()
+  for x in (-5, 4):
+    with pytest.raises(IndexError):
+      grid[x]
+  for y in (-4, 3):
+    with pytest.raises(IndexError):
+      grid[0][y]
+    with pytest.raises(IndexError):
+      grid[0][y] = None
+
+
+def test_set_through_columns():
+  grid = make_grid()
+  critter = critter_bench.Statue()
+  grid[3][2] = critter
+  assert grid.get(3, 2) is critter
+  assert grid[3][2] is critter
+
+
+def test_overfull_board_raises():
+  sim = critter_sim.CritterSim(4, 3, threading.Lock(), 0)
+  sim.add(critter_bench.Statue, 10)
+  with pytest.raises(critter_sim.LocationException):
+    sim.add(critter_bench.Walker, 3)
+  # nothing was added
+  assert len(sim.critters) == 10
+  sim.add(critter_bench.Walker, 2)
+  with pytest.raises(critter_sim.LocationException):
+    sim.random_location()
+
+
+@pytest.mark.parametrize('num', [10, 4000, 9990])
+def test_free_cells_are_empty_and_distinct(num):
+  sim = critter_sim.CritterSim(100, 100, threading.Lock(), 0)
+  sim.add(critter_bench.Statue, num)
+  grid = sim.grid
+  assert grid.free_count() == 10000 - num == grid.occupancy.count(0)
+  cells = grid.sample_free_cells(grid.free_count() // 2, sim.random)
+  assert len(set(cells)) == len(cells)
+  assert not any(grid.occupancy[i] for i in cells)
+  for i in range(50):
+    assert not grid.occupancy[grid.random_free_cell(sim.random)]
+  assert list(grid.free_cells()) == [i for i in range(10000) if not grid.occupancy[i]]
+
+
+def test_occupied_count_follows_the_game():
+  random.seed(2)
+  sim = critter_sim.CritterSim(30, 30, threading.Lock(), 2)
+  sim.add(critter_bench.Walker, 300)
+  sim.add(critter_bench.Walker2, 300)
+  for i in range(20):
+    sim.update()
+    assert sim.grid.occupied == sim.grid.occupancy.count(1) == len(sim.critters)
+
+
+def test_info_of_a_reused_id_does_not_describe_the_new_critter():
+  random.seed(2)
+  sim = critter_sim.CritterSim(10, 10, threading.Lock(), 2)
+  sim.add(critter_bench.Walker, 5)
+  sim.update()
+  grid = sim.grid
+  gone = sim.critters[0]
+  info = sim.critter_infos[gone]
+  info.get_pos()
+  critter_id = grid.critter_ids[gone]
+
+  grid.clear_cell(grid.cells[critter_id])
+  grid.release(gone)
+  for getter in (info.get_pos, info.get_char, info.get_color, info.get_neighbors, lambda: info.get_neighbor(constants.NORTH)):
+    with pytest.raises(critter_sim.LocationException):
+      getter()
+
+  # the id goes to the next critter, with an info of its own
+  sim.add(critter_bench.Statue, 1)
+  statue = sim.critters[-1]
+  assert grid.critter_ids[statue] == critter_id
+  with pytest.raises(critter_sim.LocationException):
+    info.get_char()
+  assert sim.critter_infos[statue] is not info
+  assert sim.critter_infos[statue].get_char() == 'S'
+  assert sim.critter_infos[statue].get_pos() == sim.critter_positions[statue]
+  sim.update()
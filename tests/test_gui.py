@@ -0,0 +1,114 @@
+import random
+import threading
+import critter_bench
+import critter_gui
+import critter_suite
+import critter_sim
+
+
+def test_publish_merges_pending_frame():
+  random.seed(3)
+  sim = critter_sim.CritterSim(20, 20, threading.Lock(), 3)
+  sim.add(critter_bench.Walker, 40)
+  sim.add(critter_bench.Walker2, 40)
+  thread = critter_gui.SimulationThread(sim)
+
+  # two frames published before the GUI takes the first, as on a STEP while a frame is pending
+  thread.publish(everything=True)
+  for i in range(5):
+    sim.update()
+    thread.publish()
+  frame = thread.take_frame()
+
+  assert frame.move_count == 5
+  assert len(frame.looks) == sim.width * sim.height
+  grid = sim.grid
+  for cell, look in frame.looks.items():
+    critter = grid.critters[grid.ids[cell]]
+    assert look[0] == (critter.get_char() if critter else critter_gui.EMPTY_CHAR)
+  assert thread.take_frame() is None
+
+
+class RecordingImage(critter_suite.StubWidget):
+  """A PhotoImage that remembers what was done to it."""
+
+  def __init__(self, *args, **kwargs):
+    super().__init__()
+    self.calls = []
+    self.puts = []
+
+  def blank(self):
+    self.calls.append('blank')
+
+  def put(self, data, to=None):
+    self.calls.append('put')
+    self.puts.append((data, to))
+
+  def call(self, image, command, *args):
+    self.calls.append(command)
+
+
+class RecordingTk(critter_suite.StubTk):
+  PhotoImage = RecordingImage
+
+
+def test_bitmap_display_clears_the_zoomed_image(monkeypatch):
+  random.seed(3)
+  sim = critter_sim.CritterSim(20, 20, threading.Lock(), 3)
+  sim.add(critter_bench.Statue, 40)
+  monkeypatch.setattr(critter_gui, 'tk', RecordingTk)
+  gui = critter_gui.CritterGUI(sim, bitmap=True)
+  assert gui.image is not gui.board
+  assert gui.image.calls[-1] == 'copy'
+
+  # a reset leaving nobody on the board
+  sim.num_critters = 0
+  sim.reset()
+  gui.display()
+  assert gui.image.calls[-1] == 'blank'
+
+
+class Blinker(critter_bench.Statue):
+  """Never moves, but changes its char every turn."""
+  pure = False
+
+  def __init__(self):
+    super().__init__()
+    self.turns = 0
+
+  def get_char(self):
+    return 'SB'[self.turns % 2]
+
+  def get_move(self, self_info):
+    self.turns += 1
+    return super().get_move(self_info)
+
+
+def test_display_changes_redraws_changed_looks(monkeypatch):
+  random.seed(3)
+  sim = critter_sim.CritterSim(20, 20, threading.Lock(), 3)
+  sim.add(Blinker, 40)
+  monkeypatch.setattr(critter_gui, 'tk', critter_suite.StubTk)
+  gui = critter_gui.CritterGUI(sim)
+  grid = sim.grid
+  for i in range(3):
+    sim.update()
+    changed = set(sim.changed_cells)
+    gui.display_changes()
+    # nobody moved, so only the new looks marked the cells
+    assert changed == set(grid.occupied_cells())
+    for cell in changed:
+      assert gui.drawn[cell][0] == 'SB'[(i + 1) % 2]
+  assert sim.take_changed_cells() == set()
+
+
+def test_bitmap_flush_writes_only_the_changed_columns(monkeypatch):
+  random.seed(3)
+  sim = critter_sim.CritterSim(20, 20, threading.Lock(), 3)
+  sim.add(Blinker, 1)
+  monkeypatch.setattr(critter_gui, 'tk', RecordingTk)
+  gui = critter_gui.CritterGUI(sim, bitmap=True)
+  (cell,) = sim.grid.occupied_cells()
+  sim.update()
+  gui.display_changes()
+  assert gui.board.puts[-1] == ('{%s}' % gui.pixels[cell], (cell % sim.width, cell // sim.width))
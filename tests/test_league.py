@@ -0,0 +1,26 @@
+import pytest
+import critter_bench
+import critter_league
+
+
+def test_add_updates_both_sides():
+  league = critter_league.League(['Walker', 'Statue'])
+  league.add({'Walker': (3, 2), 'Statue': (0, 1)})
+  assert league.ratings['Walker'] > critter_league.ELO_START > league.ratings['Statue']
+  assert league.ratings['Walker'] + league.ratings['Statue'] == 2 * critter_league.ELO_START
+  assert league.records == {'Walker': [1, 0, 0], 'Statue': [0, 0, 1]}
+
+
+def test_add_rejects_anything_but_two_classes():
+  league = critter_league.League(['Walker', 'Statue', 'Lookout'])
+  for result in ({'Walker': (3, 2)}, {'Walker': (3, 2), 'Statue': (0, 1), 'Lookout': (1, 1)}, {'Walker': (3, 2), 'Mouse': (0, 1)}):
+    with pytest.raises(critter_league.LeagueException):
+      league.add(result)
+  assert league.records['Walker'] == [0, 0, 0]
+
+
+def test_a_class_cannot_play_itself():
+  with pytest.raises(critter_league.LeagueException, match='Walker'):
+    critter_league.fixtures([critter_bench.Walker, critter_bench.Statue, critter_bench.Walker])
+  with pytest.raises(critter_league.LeagueException):
+    critter_league.run_league([critter_bench.Walker, critter_bench.Walker], 10, 10, 5, 10, 2, 0)
@@ -0,0 +1,32 @@
+import random
+import threading
+import critter_bench
+import critter_sim
+
+TICKS = 150
+
+
+def run(memo_size):
+  """Plays a seeded game with the given memo size, returning the board after every tick and the sim. Walker draws from the random module, so only one of these may run at a time."""
+  random.seed(11)
+  sim = critter_sim.CritterSim(30, 30, threading.Lock(), 11)
+  sim.memo_size = memo_size
+  for critter_class in (critter_bench.Walker, critter_bench.Statue, critter_bench.Lookout):
+    sim.add(critter_class, 60)
+  boards = []
+  for i in range(TICKS):
+    sim.update()
+    boards.append((bytes(sim.grid.occupancy), [sim.grid.classes[critter_id] for critter_id in sim.grid.ids]))
+  return boards, sim
+
+
+def test_memo_does_not_change_the_game():
+  plain, plain_sim = run(0)
+  memoized, memoized_sim = run(critter_sim.MEMO_SIZE)
+  assert plain_sim.memo is None
+  move_hits, move_misses, fight_hits, fight_misses = memoized_sim.memo.stats[critter_bench.Lookout]
+  assert move_hits > 0
+
+  for tick, (expected, board) in enumerate(zip(plain, memoized), 1):
+    assert board == expected, tick
+  assert [(stats.kills, stats.alive) for stats in memoized_sim.critter_class_stats.values()] == [(stats.kills, stats.alive) for stats in plain_sim.critter_class_stats.values()]
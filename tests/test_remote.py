@@ -0,0 +1,180 @@
+import asyncio
+import os
+import threading
+import time
+import constants
+import critter
+import critter_remote
+import critter_sim
+
+CRITTER_MODULE = """import constants
+import critter
+
+
+class Elsewhere(critter.Critter):
+  def get_char(self):
+    return 'E'
+
+  def get_color(self):
+    return constants.BLACK
+
+  def get_move(self, info):
+    return constants.CENTER
+
+  def fight(self, info):
+    return constants.ROAR
+"""
+
+
+class Pacer(critter.Critter):
+  """Steps north and south in turn."""
+
+  def __init__(self):
+    self.steps = 0
+
+  def get_char(self):
+    return 'P'
+
+  def get_color(self):
+    return constants.BLACK
+
+  def get_move(self, info):
+    self.steps += 1
+    return constants.NORTH if self.steps % 2 else constants.SOUTH
+
+  def fight(self, info):
+    return constants.ROAR
+
+
+class Picky(Pacer):
+  """Cannot be built without an argument the simulation does not give."""
+
+  def __init__(self, size):
+    super().__init__()
+
+
+def wait_for_socket(address):
+  deadline = time.monotonic() + 10
+  while not os.path.exists(address[len('unix:'):]) and time.monotonic() < deadline:
+    time.sleep(0.01)
+
+
+def start_server(tmp_path, name):
+  """Serves Pacer and Picky on a unix socket, on a thread of its own, and returns the StubServer and its address."""
+  server = critter_remote.StubServer({'Pacer': Pacer, 'Picky': Picky}.get)
+  address = 'unix:%s' % (tmp_path / name)
+  loop = asyncio.new_event_loop()
+  threading.Thread(target=loop.run_until_complete, args=(server.serve(address),), daemon=True).start()
+  wait_for_socket(address)
+  return server, address
+
+
+def test_serve_imports_from_root(tmp_path):
+  root = tmp_path / 'critters'
+  root.mkdir()
+  (root / 'remote_root_critters.py').write_text(CRITTER_MODULE)
+  address = 'unix:%s' % (tmp_path / 'critters.sock')
+  threading.Thread(target=critter_remote.serve, args=(address, str(root)), daemon=True).start()
+  wait_for_socket(address)
+
+  sim = critter_sim.CritterSim(10, 10, threading.Lock(), 0)
+  remote = critter_remote.Remote(sim)
+  try:
+    # raised a RemoteException when the service could not import it
+    elsewhere = remote.remote('Elsewhere', address)
+    sim.add(elsewhere, 5)
+    remote.install()
+    sim.update()
+    assert sim.critter_class_stats[elsewhere].alive == 5
+    assert not remote.endpoints[address].dead
+  finally:
+    remote.close()
+
+
+def test_bad_spawn_is_answered_with_an_error(tmp_path):
+  server, address = start_server(tmp_path, 'critters.sock')
+
+  async def talk():
+    reader, writer = await critter_remote.open_connection(address)
+    connection = critter_remote.Connection(reader, writer)
+    await connection.exchange((critter_remote.HELLO, 'session', 10, 10))
+    connection.ops.append((critter_remote.SPAWN, 0, 'Nobody', []))
+    try:
+      await connection.exchange((critter_remote.HAS, 'Pacer'))
+    except critter_remote.RemoteException as e:
+      unknown = str(e)
+    connection.ops.append((critter_remote.SPAWN, 1, 'Picky', []))
+    try:
+      await connection.exchange((critter_remote.HAS, 'Pacer'))
+    except critter_remote.RemoteException as e:
+      bad_args = str(e)
+    # the session goes on
+    connection.ops.append((critter_remote.SPAWN, 2, 'Pacer', []))
+    found = await connection.exchange((critter_remote.LOOKS, [2]))
+    await connection.close()
+    return unknown, bad_args, found
+
+  unknown, bad_args, found = asyncio.run(talk())
+  assert 'no critter called Nobody' in unknown
+  assert 'TypeError' in bad_args
+  assert found == [[2, 'P', 0, 0, 0]]
+
+  # a simulation that sends a bad spawn gives up on the service, and says why
+  sim = critter_sim.CritterSim(10, 10, threading.Lock(), 0)
+  remote = critter_remote.Remote(sim, timeout=10)
+  try:
+    picky = remote.remote('Picky', address)
+    sim.add(picky, 3)
+    remote.install()
+    sim.update()
+    endpoint = remote.endpoints[address]
+    assert endpoint.dead
+    assert 'TypeError' in endpoint.error
+    assert sim.critter_class_stats[picky].disqualified
+  finally:
+    remote.close()
+
+
+def test_one_round_trip_per_endpoint_per_tick(tmp_path):
+  addresses = [start_server(tmp_path, name)[1] for name in ('a.sock', 'b.sock')]
+  sim = critter_sim.CritterSim(20, 20, threading.Lock(), 0)
+  remote = critter_remote.Remote(sim, timeout=10)
+  try:
+    for address in addresses:
+      sim.add(remote.remote('Pacer', address), 30)
+    remote.install()
+    sim.update()
+    before = remote.round_trips()
+    ticks = 10
+    for i in range(ticks):
+      sim.update()
+    after = remote.round_trips()
+    for address in addresses:
+      round_trips, fights = after[address][0] - before[address][0], after[address][1] - before[address][1]
+      # however many critters there are, one for all of their moves, plus one per fight
+      assert round_trips - fights == ticks
+  finally:
+    remote.close()
+
+
+def test_pooled_connections_share_one_session(tmp_path):
+  server, address = start_server(tmp_path, 'critters.sock')
+  sim = critter_sim.CritterSim(20, 20, threading.Lock(), 0)
+  remote = critter_remote.Remote(sim, timeout=10, pool_size=3)
+  try:
+    pacer = remote.remote('Pacer', address)
+    sim.add(pacer, 30)
+    remote.install()
+    for i in range(3):
+      sim.update()
+    endpoint = remote.endpoints[address]
+    assert len(endpoint.connections) == 3
+    assert not endpoint.dead
+    (critters, connections, dimensions), = server.sessions.values()
+    assert connections == 3
+    assert sorted(critters) == sorted(c.id for c in sim.critters)
+    # every connection had its share of the critters
+    assert {c.id % 3 for c in sim.critters} == {0, 1, 2}
+    assert all(c.get_char() == 'P' for c in sim.critters)
+  finally:
+    remote.close()
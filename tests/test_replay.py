@@ -0,0 +1,55 @@
+import random
+import threading
+import critter_bench
+import critter_log
+import critter_sim
+
+TICKS = 90
+KEYFRAME_INTERVAL = 20
+
+
+def state(sim):
+  """Returns what a replay should reproduce of sim: every class's kills and alive count, and the class and char of the critter on every occupied cell."""
+  grid = sim.grid
+  stats = sorted((critter_class.__name__, stats.kills, stats.alive) for critter_class, stats in sim.critter_class_stats.items())
+  board = [(cell, grid.critters[grid.ids[cell]].__class__.__name__, grid.critters[grid.ids[cell]].get_char()) for cell in grid.occupied_cells()]
+  return sim.move_count, stats, board
+
+
+def record(path):
+  """Runs and records a seeded game, returning its state before the first tick and after every tick."""
+  random.seed(4)
+  sim = critter_sim.CritterSim(30, 30, threading.Lock(), 4)
+  for critter_class in (critter_bench.Walker, critter_bench.Walker2, critter_bench.Statue, critter_bench.Lookout):
+    sim.add(critter_class, 50)
+  recorder = critter_log.Recorder(str(path), sim, KEYFRAME_INTERVAL)
+  states = [state(sim)]
+  for i in range(TICKS):
+    sim.update()
+    states.append(state(sim))
+  recorder.close()
+  return states
+
+
+def test_replay_follows_the_run_tick_by_tick(tmp_path):
+  states = record(tmp_path / 'game.log')
+  replay = critter_log.Replay(str(tmp_path / 'game.log'))
+  try:
+    assert state(replay) == states[0]
+    for tick in range(1, TICKS + 1):
+      replay.update()
+      assert state(replay) == states[tick]
+  finally:
+    replay.close()
+
+
+def test_seek_between_keyframes(tmp_path):
+  states = record(tmp_path / 'game.log')
+  replay = critter_log.Replay(str(tmp_path / 'game.log'))
+  try:
+    # forwards and backwards, onto and between keyframes
+    for tick in (37, 80, 13, KEYFRAME_INTERVAL, 61, 0, TICKS):
+      replay.seek(tick)
+      assert state(replay) == states[tick]
+  finally:
+    replay.close()
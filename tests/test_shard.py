@@ -0,0 +1,73 @@
+import random
+import threading
+import critter_bench
+import critter_budget
+import critter_shard
+import critter_sim
+
+
+class CountingPrefetcher():
+  def __init__(self):
+    self.ticks = []
+
+  def prefetch(self, sim):
+    self.ticks.append(sim.move_count)
+
+
+def make_sim(seed):
+  random.seed(seed)
+  sim = critter_sim.CritterSim(24, 24, threading.Lock(), seed)
+  sim.add(critter_bench.Walker, 60)
+  sim.add(critter_bench.Walker2, 60)
+  return sim
+
+
+def test_tile_order_keeps_the_rest_of_the_tick():
+  sim = make_sim(4)
+  budget = critter_budget.Budget(sim, [critter_bench.Walker, critter_bench.Walker2], tick_budget=1)
+  budget.install()
+  budgeted_update = sim.update
+  prefetcher = CountingPrefetcher()
+  sim.prefetchers.append(prefetcher)
+  critter_shard.TileOrder(sim, 2, 2).install()
+
+  assert sim.update == budgeted_update
+  for i in range(5):
+    budget.spent[critter_bench.Walker] = 10
+    sim.update()
+    # the budget's per-tick reset ran before the turns
+    assert budget.spent[critter_bench.Walker] < 10
+  assert prefetcher.ticks == [1, 2, 3, 4, 5]
+
+
+def test_tile_order_is_reproducible():
+  boards = []
+  for run in range(2):
+    sim = make_sim(9)
+    critter_shard.TileOrder(sim, 2, 2).install()
+    for i in range(30):
+      sim.update()
+    boards.append(sorted((cell, c.__class__.__name__) for c, cell in sim.critter_cells.items()))
+    assert len(sim.critters) == len(sim.critter_cells)
+  assert boards[0] == boards[1]
+
+
+def test_two_workers_match_tile_order():
+  ticks = 20
+  sim = make_sim(7)
+  critter_shard.TileOrder(sim, 4, 4).install()
+  for i in range(ticks):
+    sim.update()
+  expected = sorted((cell, c.__class__.__name__) for c, cell in sim.critter_cells.items())
+  expected_stats = [(stats.kills, stats.alive) for stats in sim.critter_class_stats.values()]
+
+  sharded = critter_shard.ShardedSim(make_sim(7), 4, 4, 2)
+  try:
+    assert len(sharded.connections) == 2
+    for i in range(ticks):
+      sharded.update()
+    assert sharded.cells() == expected
+    assert [(stats.kills, stats.alive) for stats in sharded.critter_class_stats.values()] == expected_stats
+    assert (sharded.fight_count, sharded.step_count) == (sim.fight_count, sim.step_count)
+  finally:
+    sharded.close()
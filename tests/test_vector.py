@@ -0,0 +1,41 @@
+import random
+import threading
+import pytest
+import critter_batch
+import critter_bench
+import critter_sim
+import critter_vector
+
+pytest.importorskip('numpy')
+
+# a crowded board, where most turns end in a fight
+MATCHES, WIDTH, HEIGHT, NUM, TICKS = 100, 20, 20, 60, 40
+SEED = 11
+
+
+def play(engine, seed):
+  random.seed(seed)
+  if engine == 'CritterSim':
+    sim = critter_sim.CritterSim(WIDTH, HEIGHT, threading.Lock(), seed)
+  else:
+    sim = critter_vector.VectorSim(WIDTH, HEIGHT, seed)
+  for critter_class in critter_bench.TABLE_CRITTERS:
+    sim.add(critter_class, NUM)
+  for i in range(TICKS):
+    sim.update()
+  return {critter_class.__name__: (stats.kills, stats.alive) for critter_class, stats in sim.critter_class_stats.items()}
+
+
+def test_vector_sim_agrees_with_critter_sim():
+  """The engines draw different random numbers, so single matches differ, but the 95% confidence intervals of every class's wins and alive count over many matches should overlap."""
+  names = [critter_class.__name__ for critter_class in critter_bench.TABLE_CRITTERS]
+  results = {engine: critter_batch.BatchResults(names) for engine in ('CritterSim', 'VectorSim')}
+  for seed in critter_sim.split_seed(SEED, MATCHES):
+    for engine in results:
+      results[engine].add(play(engine, seed))
+
+  for name in names:
+    for label in ('wins', 'alive'):
+      mean1, half1 = critter_batch.confidence_interval(getattr(results['CritterSim'], label)[name])
+      mean2, half2 = critter_batch.confidence_interval(getattr(results['VectorSim'], label)[name])
+      assert mean1 - half1 <= mean2 + half2 and mean2 - half2 <= mean1 + half1, (name, label, (mean1, half1), (mean2, half2))